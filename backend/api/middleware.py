@@ -1,15 +1,23 @@
 """
 API中间件模块
-提供统一的异常处理、请求日志等功能
+提供统一的异常处理、请求日志、接口限流等功能
 """
 
+import ipaddress
 import logging
+import math
+import socket
 import time
-from typing import Callable
+from email.utils import formatdate, parsedate_to_datetime
+from ipaddress import IPv4Network, IPv6Network
+from typing import Callable, Dict, List, Optional, Union
 
+from core.config import JWT_CONFIG, app_settings
 from fastapi import Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+from services.common.rate_limit_service import RateLimitService
 from services.exceptions import ServiceException
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
@@ -30,6 +38,49 @@ class APIResponse:
         return {"success": False, "message": message, "code": code, "data": data}
 
 
+def _parse_etags(header: str) -> List[str]:
+    """解析 If-None-Match 中的 ETag 列表（弱比较，忽略 W/ 前缀）"""
+    tags = [tag.strip() for tag in header.split(",") if tag.strip()]
+    return [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def conditional_headers(
+    etag: str, last_modified: Optional[float] = None, cache_control: str = "no-cache"
+) -> Dict[str, str]:
+    """
+    构建条件请求相关的响应头
+
+    Args:
+        etag: 强 ETag（含双引号）
+        last_modified: 最后修改时间戳（秒）
+        cache_control: Cache-Control 取值
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float] = None) -> bool:
+    """
+    判断条件请求是否可以返回 304
+
+    If-None-Match 优先；没有该请求头时比较 If-Modified-Since（HTTP 日期精度为秒）
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = _parse_etags(if_none_match)
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
 async def exception_handler(request: Request, exc: Exception) -> JSONResponse:
     """全局异常处理器"""
     if isinstance(exc, ServiceException):
@@ -89,3 +140,115 @@ async def logging_middleware(request: Request, call_next: Callable):
             exc_info=True,
         )
         raise
+
+
+# 受信代理主机名重新解析的间隔（秒），容器重启后IP变化时能够跟上
+TRUSTED_PROXY_RESOLVE_INTERVAL = 60
+
+_trusted_proxies: Dict[str, object] = {"expires": 0.0, "networks": []}
+
+
+def _trusted_proxy_networks() -> List[Union[IPv4Network, IPv6Network]]:
+    """解析 rate_limit_trusted_proxies（IP/CIDR 直接使用，主机名解析为地址），结果定期刷新"""
+    now = time.monotonic()
+    if now < _trusted_proxies["expires"]:
+        return _trusted_proxies["networks"]
+
+    networks = []
+    for entry in app_settings.rate_limit_trusted_proxies:
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+            continue
+        except ValueError:
+            pass
+        try:
+            addresses = {info[4][0] for info in socket.getaddrinfo(entry, None)}
+        except OSError as e:
+            logger.warning(f"受信代理主机名解析失败: {entry}, 错误: {e}")
+            continue
+        networks.extend(ipaddress.ip_network(address) for address in addresses)
+
+    _trusted_proxies.update(expires=now + TRUSTED_PROXY_RESOLVE_INTERVAL, networks=networks)
+    return networks
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    """连接地址是否为受信代理"""
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_proxy_networks())
+
+
+def _client_identity(request: Request) -> str:
+    """限流使用的调用方标识：携带有效 token 时按用户，否则按客户端IP"""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            payload = jwt.decode(
+                authorization[7:], JWT_CONFIG["secret_key"], algorithms=[JWT_CONFIG["algorithm"]]
+            )
+            if payload.get("sub"):
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    peer = request.client.host if request.client else "unknown"
+    if app_settings.rate_limit_trust_proxy and _is_trusted_proxy(peer):
+        # 取最右侧的地址：由紧邻的受信代理追加，客户端无法伪造
+        forwarded = request.headers.get("x-forwarded-for", "").split(",")[-1].strip()
+        if forwarded:
+            return f"ip:{forwarded}"
+    return f"ip:{peer}"
+
+
+async def _submitted_email(request: Request) -> Optional[str]:
+    """读取请求体中提交的邮箱（请求体会被缓存，后续路由仍可读取）"""
+    try:
+        body = await request.json()
+    except Exception:
+        return None
+    email = body.get("email") if isinstance(body, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+async def rate_limit_middleware(request: Request, call_next: Callable):
+    """接口限流中间件（只对 app_settings.rate_limit_rules 中配置的路径生效）"""
+    path = request.url.path
+    rule = RateLimitService.get_rule(path)
+    if not app_settings.rate_limit_enabled or rule is None or request.method == "OPTIONS":
+        return await call_next(request)
+
+    identity = _client_identity(request)
+    allowed, remaining, wait = RateLimitService.hit(path, identity)
+    headers = {"X-RateLimit-Limit": str(rule[0]), "X-RateLimit-Remaining": str(remaining)}
+
+    # 调用方预算之外，再按提交的邮箱计数：换邮箱不能绕过调用方预算，
+    # 换IP也不能对同一邮箱无限发送；任一预算超限即拒绝
+    email_rule = RateLimitService.get_email_rule(path)
+    if allowed and email_rule is not None:
+        email = await _submitted_email(request)
+        if email:
+            allowed, email_remaining, wait = RateLimitService.hit(
+                path, f"email:{email}", email_rule
+            )
+            if email_remaining < remaining:
+                headers = {
+                    "X-RateLimit-Limit": str(email_rule[0]),
+                    "X-RateLimit-Remaining": str(email_remaining),
+                }
+            if not allowed:
+                identity = f"{identity} 邮箱: {email}"
+
+    if not allowed:
+        logger.info(f"请求被限流: {request.method} {path} 调用方: {identity}")
+        headers["Retry-After"] = str(max(1, math.ceil(wait)))
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content=APIResponse.error("请求过于频繁，请稍后再试", code=429),
+            headers=headers,
+        )
+
+    response = await call_next(request)
+    response.headers.update(headers)
+    return response
@@ -2,36 +2,59 @@
 AI分析路由模块
 """
 
+import asyncio
 import json
 import sys
-from typing import Optional
+from typing import List, Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from core.config import app_settings
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
+from services.ai.conversation_memory import ConversationMemory
+from services.ai.multi_table import (
+    build_multi_table_message,
+    load_table_digests,
+    map_table_digests,
+    should_map_reduce,
+    slim_flow_data,
+)
+from services.common.chat_service import ChatService
+from services.exceptions import ValidationException
 
+from api.middleware import APIResponse
 from api.v1.endpoints.auth import get_current_user
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
 
-async def generate_stream_response(flow_data, user_message, style, history=None):
+async def generate_stream_response(
+    flow_data, user_message, style, history=None, on_complete=None, summary=None
+):
     """
     生成流式响应的异步生成器函数
     使用 SSE (Server-Sent Events) 格式
+
+    on_complete: 可选，流正常结束后以完整回答文本调用（用于保存服务端聊天历史）
+    summary: 可选，较早对话的摘要
     """
     try:
         from services.ai.deepseek import DeepseekAgent
 
         # 使用流式分析方法
         stream = DeepseekAgent.analyze_stream(
-            flow_data, user_message=user_message, history=history, style=style
+            flow_data, user_message=user_message, history=history, style=style, summary=summary
         )
 
+        answer = []
         for chunk in stream:
+            if chunk.get("type") == "text":
+                answer.append(chunk["content"])
             # 将数据格式化为 SSE 格式
             data = json.dumps(chunk, ensure_ascii=False)
             yield f"data: {data}\n\n"
 
+        if on_complete and answer:
+            on_complete("".join(answer))
         # 发送结束标记
         yield "data: [DONE]\n\n"
     except Exception as e:
@@ -44,12 +67,90 @@ async def generate_stream_response(flow_data, user_message, style, history=None)
         yield "data: [DONE]\n\n"
 
 
+async def generate_multi_table_stream_response(
+    table_names,
+    user_message,
+    style,
+    history=None,
+    map_reduce=None,
+    on_complete=None,
+    summary=None,
+):
+    """
+    多表联合分析的流式响应生成器（fan-out/fan-in）
+
+    1. 并发加载各表并构建摘要
+    2. 摘要过长（或显式要求）时并发做 map 压缩
+    3. 将合并后的摘要交给推理模型，输出一条合并的 SSE 流
+    """
+    try:
+        from services.ai.deepseek import DeepseekAgent
+
+        def progress(stage, **extra):
+            chunk = {"type": "progress", "stage": stage, **extra}
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        yield progress("loading", tables=table_names)
+        digests = await asyncio.to_thread(load_table_digests, table_names)
+
+        missing = [d["table"] for d in digests if d.get("missing")]
+        available = [d for d in digests if not d.get("missing")]
+        if not available:
+            error_chunk = {
+                "type": "error",
+                "content": f"数据库中未找到表 {'、'.join(missing)} 或无数据，请检查表名或采集流程。",
+            }
+            yield f"data: {json.dumps(error_chunk, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+            return
+        yield progress("loaded", tables=[d["table"] for d in available], missing=missing)
+
+        if map_reduce is None:
+            map_reduce = should_map_reduce(available)
+        if map_reduce:
+            yield progress("summarizing", tables=[d["table"] for d in available])
+            available = await asyncio.to_thread(map_table_digests, available)
+
+        yield progress("analyzing")
+        stream = DeepseekAgent.analyze_stream(
+            available,
+            user_message=build_multi_table_message(user_message, [d["table"] for d in available]),
+            history=history,
+            style=style,
+            summary=summary,
+        )
+        answer = []
+        for chunk in stream:
+            if chunk.get("type") == "text":
+                answer.append(chunk["content"])
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        if on_complete and answer:
+            on_complete("".join(answer))
+        yield "data: [DONE]\n\n"
+    except Exception as e:
+        import traceback
+
+        error_msg = f"多表流式输出错误: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg, file=sys.stderr, flush=True)
+        error_chunk = {"type": "error", "content": str(e)}
+        yield f"data: {json.dumps(error_chunk, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+
+
 @router.post("/advice")
 async def ai_advice(
     message: str = Body(..., description="用户问题"),
     context: Optional[dict] = Body(None, description="上下文信息"),
     table_name: Optional[str] = Body(None, description="可选，指定要分析的数据库表名"),
-    history: Optional[list] = Body(None, description="历史对话记录"),
+    table_names: Optional[List[str]] = Body(None, description="可选，多表联合分析的表名列表"),
+    map_reduce: Optional[bool] = Body(
+        None, description="多表分析是否先压缩各表摘要，默认按上下文长度自动判断"
+    ),
+    history: Optional[list] = Body(
+        None, description="历史对话记录（旧客户端兼容，省略时使用服务端保存的会话历史）"
+    ),
+    conversation_id: Optional[str] = Body(None, description="会话ID，默认会话为 default"),
     stream: bool = Body(False, description="是否使用流式输出"),
     user=Depends(get_current_user),
 ):
@@ -58,9 +159,28 @@ async def ai_advice(
 
     - **message**: 用户问题
     - **table_name**: 可选，指定要分析的数据库表名
-    - **history**: 可选，历史对话记录
+    - **table_names**: 可选，多表联合分析（对比市场/周期），与 table_name 合并去重
+    - **map_reduce**: 可选，多表分析时是否先用快速模型压缩各表摘要
+    - **history**: 可选，历史对话记录；省略时由服务端按会话读取，客户端只需发送新问题
+    - **conversation_id**: 可选，会话ID
     - **stream**: 是否使用流式输出（默认False）
     """
+    # 多表模式：合并 table_name 与 table_names 并去重
+    multi_tables = list(dict.fromkeys(([table_name] if table_name else []) + (table_names or [])))
+    if table_names and len(multi_tables) > app_settings.ai_multi_table_max_tables:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多分析 {app_settings.ai_multi_table_max_tables} 张表",
+        )
+
+    # 服务端保存会话历史：客户端未传 history 时读取会话摘要和最近的问答
+    summary = None
+    if history is None:
+        try:
+            summary, history = ConversationMemory.load(user.id, conversation_id)
+        except ValidationException as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+
     try:
         print(
             f"AI advice called with message: {message}, user_id: {user.id}, table_name: {table_name}, stream: {stream}",
@@ -68,14 +188,42 @@ async def ai_advice(
             flush=True,
         )
 
-        from services.flow.flow_data_query import query_table_data
+        from services.flow.flow_data_query import aload_table_data
 
         style = "专业"
         flow_data = []
 
+        # 回答完成后将本轮问答追加到服务端会话历史
+        def save_answer(answer: str) -> None:
+            try:
+                total = ChatService.append(
+                    user.id, {"question": message, "answer": {"advice": answer}}, conversation_id
+                )
+                # 较早的问答在后台增量压缩进会话摘要，不阻塞本次响应
+                ConversationMemory.schedule_update(user.id, conversation_id, total)
+            except Exception as e:
+                print(f"保存聊天历史失败: {e}", file=sys.stderr, flush=True)
+
+        # 场景零：多表联合分析，并发加载后合并为一条流
+        if table_names and len(multi_tables) > 1:
+            return StreamingResponse(
+                generate_multi_table_stream_response(
+                    multi_tables, message, style, history, map_reduce, save_answer, summary
+                ),
+                media_type="text/event-stream",
+                headers={
+                    "Cache-Control": "no-cache",
+                    "Connection": "keep-alive",
+                    "X-Accel-Buffering": "no",
+                },
+            )
+        if multi_tables:
+            table_name = multi_tables[0]
+
         # 场景一：前端传了表名，查该表
         if table_name:
-            flow_data = query_table_data(table_name, limit=50)
+            # 优先读取采集后写入的分组缓存，未命中时查询数据库
+            flow_data = await aload_table_data(table_name, limit=50)
             if not flow_data:
                 error_response = {
                     "advice": "数据缺失",
@@ -104,30 +252,13 @@ async def ai_advice(
                 )
 
             # 只传递核心字段，防止token溢出
-            slim_data = []
-            for d in flow_data:
-                # Use .get() for safer access, provide defaults if needed
-                item_data = d.get("data", {})
-                slim_data.append(
-                    {
-                        "type": d.get("type"),
-                        "flow_type": d.get("flow_type"),
-                        "market_type": d.get("market_type"),
-                        "period": d.get("period"),
-                        "data": {
-                            "code": item_data.get("code"),
-                            "name": item_data.get("name"),
-                            "main_flow_net_amount": item_data.get("main_flow_net_amount"),
-                            "main_flow_net_percentage": item_data.get("main_flow_net_percentage"),
-                            "change_percentage": item_data.get("change_percentage"),
-                            "crawl_time": item_data.get("crawl_time"),
-                        },
-                    }
-                )
+            slim_data = slim_flow_data(flow_data)
             user_message = message or f"请帮我分析一下表 {table_name} 的资金流情况"
 
             return StreamingResponse(
-                generate_stream_response(slim_data, user_message, style, history),
+                generate_stream_response(
+                    slim_data, user_message, style, history, save_answer, summary
+                ),
                 media_type="text/event-stream",
                 headers={
                     "Cache-Control": "no-cache",
@@ -140,7 +271,7 @@ async def ai_advice(
         user_message = message
 
         return StreamingResponse(
-            generate_stream_response(flow_data, user_message, style, history),
+            generate_stream_response(flow_data, user_message, style, history, save_answer, summary),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -155,3 +286,23 @@ async def ai_advice(
         error_msg = f"AI advice error: {str(e)}\n{traceback.format_exc()}"
         print(error_msg, file=sys.stderr, flush=True)
         raise HTTPException(status_code=500, detail={"error": str(e)}) from e
+
+
+@router.get("/history")
+def get_chat_history(
+    conversation_id: Optional[str] = Query(None, description="会话ID，默认会话为 default"),
+    user=Depends(get_current_user),
+):
+    """获取服务端保存的会话历史"""
+    history = ChatService.get_history(user.id, conversation_id)
+    return APIResponse.success(data=history, message="获取聊天历史成功")
+
+
+@router.delete("/history")
+def clear_chat_history(
+    conversation_id: Optional[str] = Query(None, description="会话ID，默认会话为 default"),
+    user=Depends(get_current_user),
+):
+    """清除服务端保存的会话历史"""
+    ChatService.clear_history(user.id, conversation_id)
+    return APIResponse.success(message="聊天历史已清除")
@@ -10,7 +10,7 @@ from models.models import User
 from pydantic import BaseModel, EmailStr
 from services.auth.email_service import EmailService
 from services.auth.user_service import UserService
-from services.exceptions import UserServiceException
+from services.exceptions import ServiceBusyException, UserServiceException
 from sqlalchemy.orm import Session
 
 from api.middleware import APIResponse
@@ -40,7 +40,8 @@ def get_current_user(
         email = payload.get("sub")
         if email is None:
             raise HTTPException(status_code=401, detail="无效token")
-        user = UserService.get_user(email)
+        # 身份解析走缓存（进程内 + Redis），避免每个请求都查询数据库
+        user = UserService.get_principal(email)
         if not user:
             raise HTTPException(status_code=401, detail="用户不存在")
         return user
@@ -135,8 +136,13 @@ def send_code(data: ForgotModel, session: Session = Depends(get_db_session_depen
 
 
 @router.post("/login")
-def login(data: LoginModel):
-    if not UserService.verify_password(data.email, data.password):
+async def login(data: LoginModel):
+    try:
+        ok = await UserService.averify_password(data.email, data.password)
+    except ServiceBusyException as e:
+        # 登录高峰时快速失败，避免请求堆积拖垮其他接口
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"}) from e
+    if not ok:
         raise HTTPException(status_code=401, detail="邮箱或密码错误")
     access_token = create_access_token({"sub": data.email})
     return APIResponse.success(data={"access_token": access_token, "token_type": "bearer"})
@@ -219,8 +225,8 @@ def update_username(data: UpdateUsernameModel, current_user: User = Depends(get_
             raise HTTPException(status_code=400, detail="用户名长度不能超过64个字符")
 
         UserService.update_username(current_user.id, username)
-        # 重新获取用户信息
-        updated_user = UserService.get_user(current_user.email)
+        # 重新获取用户信息（读主库，避免副本延迟读到旧用户名）
+        updated_user = UserService.get_user(current_user.email, use_replica=False)
         user_data = UserService.user_to_dict(updated_user)
         return APIResponse.success(data=user_data, message="用户名更新成功")
     except UserServiceException as e:
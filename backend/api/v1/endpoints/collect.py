@@ -2,6 +2,8 @@
 数据采集路由模块
 """
 
+import asyncio
+
 from crawler.crawler import run_collect, run_collect_all
 from fastapi import APIRouter, BackgroundTasks, Body, Depends
 
@@ -39,7 +41,10 @@ async def collect_v2(
     # 统一使用验证函数进行参数校验
     validate_collect_params(flow_choice, market_choice, detail_choice, day_choice)
 
-    result = run_collect(flow_choice, market_choice, detail_choice, day_choice, pages)
+    # 采集包含网络请求和数据库写入，放到线程中执行，避免阻塞事件循环
+    result = await asyncio.to_thread(
+        run_collect, flow_choice, market_choice, detail_choice, day_choice, pages
+    )
     return APIResponse.success(data=result, message="采集成功")
 
 
@@ -1,11 +1,18 @@
 """
 数据状态路由模块
+按表返回采集新鲜度（版本、采集时间、行数、内容哈希），支持 ETag / Last-Modified 条件请求
 """
 
-from fastapi import APIRouter
-from services.common.cache_service import get_data_ready
+import hashlib
 
-from api.middleware import APIResponse
+from fastapi import APIRouter, Request, Response
+from services.common.cache_service import (
+    get_all_freshness,
+    get_data_ready,
+    get_table_freshness,
+)
+
+from api.middleware import APIResponse, conditional_headers, is_not_modified
 
 router = APIRouter(prefix="/data", tags=["data"])
 
@@ -15,6 +22,45 @@ def data_ready():
     """
     检查数据是否就绪
 
-    返回数据采集状态
+    返回数据采集状态（任意一张表完成过采集即为就绪，各表状态见 /data/freshness）
     """
     return APIResponse.success(data={"data_ready": get_data_ready()}, message="获取数据状态成功")
+
+
+@router.get("/freshness")
+def data_freshness(request: Request, response: Response):
+    """
+    获取所有资金流表的新鲜度
+
+    每张表包含 version、rows、crawled_at、changed_at、etag；
+    整体 ETag 由各表 ETag 组合而成，任意表完成新一轮采集时改变，未变化时返回 304
+    """
+    tables = get_all_freshness()
+    digest = hashlib.sha1(
+        "|".join(f"{name}:{entry['etag']}" for name, entry in tables.items()).encode("utf-8")
+    ).hexdigest()
+    etag = f'"{digest[:32]}"'
+    last_modified = max((entry["crawled_at"] for entry in tables.values()), default=None)
+    headers = conditional_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return APIResponse.success(data=tables, message="获取数据新鲜度成功")
+
+
+@router.get("/freshness/{table_name}")
+def table_freshness(table_name: str, request: Request, response: Response):
+    """
+    获取单张资金流表的新鲜度，ETag 由内容版本和采集时间组成，未变化时返回 304
+
+    - **table_name**: 表名（{flow_type}_{market_type}_{period}）
+    """
+    entry = get_table_freshness(table_name)
+    if entry is None:
+        response.status_code = 404
+        return APIResponse.error(message="该表尚未完成采集", code=404)
+    headers = conditional_headers(entry["etag"], entry["crawled_at"])
+    if is_not_modified(request, entry["etag"], entry["crawled_at"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return APIResponse.success(data=entry, message="获取数据新鲜度成功")
@@ -5,11 +5,14 @@
 
 import logging
 
-from core.config import DATABASE_CONFIG
-from fastapi import APIRouter, Query
-from services.flow.flow_data_query import query_table_data
+from core.config import DATABASE_CONFIG, app_settings
+from fastapi import APIRouter, Query, Request, Response
+from services.common.cache_loader import MISS, CacheLoader
+from services.common.cache_service import get_table_freshness
+from services.flow.flow_chart_service import CHART_FORMATS, FlowChartService
+from services.flow.flow_data_query import aquery_table_data
 
-from api.middleware import APIResponse
+from api.middleware import APIResponse, conditional_headers, is_not_modified
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/flow", tags=["flow"])
@@ -17,6 +20,8 @@ router = APIRouter(prefix="/flow", tags=["flow"])
 
 @router.get("")
 async def get_flow(
+    request: Request,
+    response: Response,
     flow_type: str = Query(..., description="资金流类型"),
     market_type: str = Query(..., description="市场类型"),
     period: str = Query(..., description="周期"),
@@ -30,6 +35,9 @@ async def get_flow(
     - **period**: 周期（如 Today, 3_Day, 5_Day, 10_Day）
     - **limit**: 查询条数限制，默认100，最大1000
     注意：period格式需与爬虫创建的表名格式一致
+
+    响应带有由该表最近一次采集生成的 ETag 和 Last-Modified，
+    支持 If-None-Match / If-Modified-Since，两次采集之间的轮询返回 304
     """
     try:
         table_name = f"{flow_type}_{market_type}_{period}".replace("-", "_")
@@ -41,8 +49,34 @@ async def get_flow(
 
         logger.info(f"查询表: {table_name}, 数据库: {db_name}")
 
-        # 统一使用flow_data_query模块的查询函数
-        flow_data = query_table_data(table_name, limit=limit)
+        # 表内容未变化时直接返回 304，不查询缓存和数据库
+        # Redis 不可用时按未登记处理：不带条件请求头，直接查询
+        try:
+            freshness = get_table_freshness(table_name)
+        except Exception as e:
+            logger.warning(f"获取表新鲜度失败: {table_name}, 错误: {e}")
+            freshness = None
+        headers = None
+        # 响应包含每行的 crawl_time，ETag 与缓存 key 均按采集时间区分（不只是内容版本）
+        tag = "v0"
+        if freshness is not None:
+            tag = freshness["etag"].strip('"')
+            # ETag 包含 limit：同一次采集不同条数是不同的响应
+            etag = f'"{tag}-{limit}"'
+            headers = conditional_headers(
+                etag,
+                freshness["crawled_at"],
+                f"public, max-age={app_settings.flow_http_max_age}, must-revalidate",
+            )
+            if is_not_modified(request, etag, freshness["crawled_at"]):
+                return Response(status_code=304, headers=headers)
+
+        # 统一使用flow_data_query模块的查询函数；缓存过期时并发请求合并为一次查询
+        # 缓存 key 带采集标识，新一轮采集完成后立即读取新数据
+        flow_data, cache_state = await CacheLoader.aget_or_load(
+            f"flowtable:{table_name}:{tag}:{limit}",
+            lambda: aquery_table_data(table_name, limit=limit),
+        )
 
         if not flow_data:
             logger.warning(f"表 {table_name} 不存在或无数据")
@@ -60,8 +94,36 @@ async def get_flow(
             row["period"] = item["period"]
             rows.append(row)
 
-        logger.info(f"查询到 {len(rows)} 条数据")
-        return APIResponse.success(data={"data": rows, "cached": False}, message="查询成功")
+        logger.info(f"查询到 {len(rows)} 条数据（缓存: {cache_state}）")
+        if headers:
+            response.headers.update(headers)
+        return APIResponse.success(
+            data={"data": rows, "cached": cache_state != MISS}, message="查询成功"
+        )
     except Exception as e:
         logger.error(f"查询表异常: {e}", exc_info=True)
         return APIResponse.error(message=str(e), code=500, data={"data": [], "cached": False})
+
+
+@router.get("/chart")
+def get_flow_chart(
+    flow_type: str = Query(..., description="资金流类型"),
+    market_type: str = Query(..., description="市场类型"),
+    period: str = Query(..., description="周期"),
+    fmt: str = Query("png", description="图片格式：png 或 svg"),
+):
+    """
+    获取服务端渲染的资金流图表（各档位资金净流入柱状图）
+
+    参数与 /flow 一致；返回图片下载地址，适合轻量客户端和报告直接引用
+    """
+    if fmt not in CHART_FORMATS:
+        return APIResponse.error(message=f"不支持的图片格式: {fmt}", code=400)
+    try:
+        url = FlowChartService.get_chart_url(flow_type, market_type, period, fmt)
+        if not url:
+            return APIResponse.error(message="图表尚未生成", code=404)
+        return APIResponse.success(data={"url": url, "fmt": fmt}, message="查询成功")
+    except Exception as e:
+        logger.error(f"查询资金流图表异常: {e}", exc_info=True)
+        return APIResponse.error(message=str(e), code=500)
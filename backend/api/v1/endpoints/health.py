@@ -1,6 +1,11 @@
-from fastapi import APIRouter
+from core.database import get_pool_metrics, get_replica_status
+from fastapi import APIRouter, Depends
+from services.auth.email_queue import email_queue
+from services.auth.password_service import PasswordService
+from services.common.cache_loader import CacheLoader
 
 from api.middleware import APIResponse
+from api.v1.endpoints.auth import get_admin_user
 
 router = APIRouter(tags=["health"])
 
@@ -8,3 +13,37 @@ router = APIRouter(tags=["health"])
 @router.get("/health")
 async def health():
     return APIResponse.success(data={"status": "ok"}, message="服务正常")
+
+
+@router.get("/health/db_pool")
+def db_pool_metrics(
+    admin_user=Depends(get_admin_user),  # 需要管理员权限
+):
+    """数据库连接池指标（使用中/溢出连接数、取连接等待时间等）及只读副本状态，用于容量评估"""
+    data = get_pool_metrics()
+    data["replicas"] = get_replica_status()
+    return APIResponse.success(data=data, message="获取连接池指标成功")
+
+
+@router.get("/health/password_hash")
+def password_hash_metrics(
+    admin_user=Depends(get_admin_user),  # 需要管理员权限
+):
+    """密码哈希线程池指标（排队深度、拒绝/超时次数、排队耗时），用于评估登录高峰容量"""
+    return APIResponse.success(data=PasswordService.get_metrics(), message="获取密码哈希指标成功")
+
+
+@router.get("/health/email_queue")
+def email_queue_metrics(
+    admin_user=Depends(get_admin_user),  # 需要管理员权限
+):
+    """邮件发送队列指标（排队数、已发送、重试、失败次数）"""
+    return APIResponse.success(data=email_queue.get_metrics(), message="获取邮件队列指标成功")
+
+
+@router.get("/health/flow_cache")
+def flow_cache_metrics(
+    admin_user=Depends(get_admin_user),  # 需要管理员权限
+):
+    """资金流缓存指标（命中、旧值命中、合并的并发请求、实际查询次数）"""
+    return APIResponse.success(data=CacheLoader.get_metrics(), message="获取缓存指标成功")
@@ -2,13 +2,28 @@
 报告管理路由模块
 """
 
+import asyncio
 import json
 import logging
+import urllib.parse
+from email.utils import formatdate
+from typing import Optional, Set
 
-from core.cache import get_redis_client
+from core.config import app_settings
 from core.storage import minio_storage
-from fastapi import APIRouter, Body, Depends, Header, Query
-from services.ai import report
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from minio.error import S3Error
+from services.common.chat_service import ChatService
+from services.exceptions import ServiceException
+from services.report.download_service import (
+    CONTENT_ENCODINGS,
+    ReportDownloadService,
+    choose_encoding,
+    parse_range,
+)
+from services.report.render_service import ReportRenderService
+from services.report.report_job_service import JOB_TERMINAL_STATUSES, ReportJobService
 from services.report.report_service import ReportService
 
 from api.middleware import APIResponse
@@ -22,43 +37,130 @@ router = APIRouter(prefix="/report", tags=["report"])
 @router.post("/generate")
 def generate_report_api(
     table_name: str = Body(..., description="表名"),
-    chat_history: list = Body(..., description="聊天历史"),
+    chat_history: Optional[list] = Body(
+        None, description="聊天历史，省略时使用服务端保存的会话历史"
+    ),
+    conversation_id: Optional[str] = Body(None, description="会话ID，默认会话为 default"),
     user=Depends(get_current_user),
 ):
     """
     生成报告
 
     - **table_name**: 表名
-    - **chat_history**: 聊天历史记录
+    - **chat_history**: 聊天历史记录（可选）
+    - **conversation_id**: 会话ID（未传 chat_history 时使用）
     """
     try:
-        file_path, file_name, md_content, file_url = report.generate_report(
-            table_name, chat_history, user_id=user.id
-        )
-        ReportService.add_report(user.id, "markdown", file_url, file_name)
-        data = {"file_url": file_url, "file_name": file_name}
+        # 与异步任务共用有界执行器，保护 DeepSeek 配额；此接口同步等待结果以兼容旧客户端
+        if chat_history is None:
+            chat_history = ChatService.get_history(user.id, conversation_id)
+        job_id = ReportJobService.submit(table_name, chat_history, user_id=user.id)
+        data = ReportJobService.wait(job_id)
         return APIResponse.success(data=data, message="报告生成成功")
     except Exception as e:
         logger.error(f"生成报告失败: {e}", exc_info=True)
         return APIResponse.error(message=f"生成报告失败: {str(e)}", code=500)
 
 
+def _get_owned_job(job_id: str, user) -> dict:
+    """获取任务并校验归属（管理员可查看所有任务）"""
+    job = ReportJobService.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="报告任务不存在或已过期")
+    if job.get("user_id") != user.id and not is_admin_user(user):
+        raise HTTPException(status_code=403, detail="无权查看该报告任务")
+    return job
+
+
+@router.post("/jobs")
+def create_report_job(
+    table_name: str = Body(..., description="表名"),
+    chat_history: Optional[list] = Body(
+        None, description="聊天历史，省略时使用服务端保存的会话历史"
+    ),
+    conversation_id: Optional[str] = Body(None, description="会话ID，默认会话为 default"),
+    user=Depends(get_current_user),
+):
+    """
+    提交报告生成任务（后台排队执行，立即返回任务ID）
+
+    - **table_name**: 表名
+    - **chat_history**: 聊天历史记录（可选）
+    - **conversation_id**: 会话ID（未传 chat_history 时使用）
+    """
+    if chat_history is None:
+        chat_history = ChatService.get_history(user.id, conversation_id)
+    try:
+        job_id = ReportJobService.submit(table_name, chat_history, user_id=user.id)
+    except ServiceException as e:
+        return APIResponse.error(message=str(e), code=429)
+    return APIResponse.success(data={"job_id": job_id}, message="报告任务已提交")
+
+
+@router.get("/jobs/{job_id}")
+def get_report_job(job_id: str, user=Depends(get_current_user)):
+    """
+    查询报告生成任务状态（轮询）
+
+    status: queued / prompting / generating / uploading / done / failed
+    """
+    job = _get_owned_job(job_id, user)
+    return APIResponse.success(data=job, message="获取报告任务成功")
+
+
+@router.get("/jobs/{job_id}/events")
+async def report_job_events(job_id: str, user=Depends(get_current_user)):
+    """
+    以 SSE 推送报告生成任务进度与实时生成内容，任务结束后发送 [DONE]
+
+    - progress 事件：任务状态变化
+    - text 事件：报告正文片段（与写入MinIO的内容一致）
+    """
+    _get_owned_job(job_id, user)
+
+    async def event_stream():
+        last_status = None
+        token_index = 0
+        while True:
+            job = await asyncio.to_thread(ReportJobService.get_job, job_id)
+            if not job:
+                error_chunk = {"type": "error", "content": "报告任务不存在或已过期"}
+                yield f"data: {json.dumps(error_chunk, ensure_ascii=False)}\n\n"
+                break
+            # 先推送新生成的内容，再推送状态变化，保证 done 之前内容已完整
+            parts = await asyncio.to_thread(ReportJobService.get_tokens, job_id, token_index)
+            token_index += len(parts)
+            for part in parts:
+                yield f"data: {json.dumps({'type': 'text', 'content': part}, ensure_ascii=False)}\n\n"
+            if job.get("status") != last_status:
+                last_status = job.get("status")
+                yield f"data: {json.dumps({'type': 'progress', **job}, ensure_ascii=False)}\n\n"
+            if last_status in JOB_TERMINAL_STATUSES:
+                break
+            await asyncio.sleep(0.5)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @router.get("/history")
-def report_history(user=Depends(get_current_user)):
+def report_history(
+    limit: int = Query(20, ge=1, description="返回条数"),
+    user=Depends(get_current_user),
+):
     """
-    获取报告历史记录（从Redis）
+    获取最近的报告记录（Redis 索引，未命中时从数据库重建）
     """
     try:
-        r = get_redis_client()
-        key = f"report:{user.id}"
-        reports = r.lrange(key, 0, 19)  # 只取最近20条
-        result = []
-        for item in reports:
-            try:
-                result.append(json.loads(item))
-            except (json.JSONDecodeError, TypeError):
-                logger.warning(f"解析报告历史记录失败: {item}")
-                continue
+        result = ReportService.get_history(user.id, limit=limit)
         return APIResponse.success(data=result, message="获取报告历史成功")
     except Exception as e:
         logger.error(f"获取报告历史失败: {e}", exc_info=True)
@@ -66,61 +168,41 @@ def report_history(user=Depends(get_current_user)):
 
 
 @router.get("/minio_list")
-def report_minio_list(user=Depends(get_current_user)):
+async def report_minio_list(
+    response: Response,
+    limit: int = Query(None, ge=1, description="每页条数"),
+    cursor: str = Query(None, description="分页游标（上一页响应头 X-Next-Cursor）"),
+    user=Depends(get_current_user),
+):
     """
-    获取报告文件列表
+    获取报告文件列表（按创建时间倒序，keyset 分页）
     - 管理员：返回所有用户的报告，包含用户信息
     - 普通用户：只返回自己的报告
+    - 下一页游标通过响应头 X-Next-Cursor 返回，data 仍为报告列表以兼容旧客户端
     """
     try:
         admin_flag = is_admin_user(user)
-
-        # 根据权限获取报告列表
-        if admin_flag:
-            reports = ReportService.list_all_reports()
-        else:
-            reports = ReportService.list_reports(user.id)
-
-        # 获取用户信息映射（管理员需要显示报告所有者）
-        user_map = {}
-        if admin_flag:
-            user_ids = {r.user_id for r in reports}
-            user_map = ReportService.get_user_info_map(user_ids)
-
-        result = []
-        for r in reports:
-            try:
-                url = minio_storage.get_image_url(r.file_name)
-            except Exception as e:
-                logger.warning(f"获取文件URL失败: {r.file_name}, 错误: {e}")
-                url = f"error: {e}"
-
-            # 使用统一的转换函数
-            report_dict = ReportService.report_to_dict(
-                r, include_user=admin_flag, user_map=user_map
-            )
-            report_item = {
-                "file_name": report_dict["file_name"],
-                "url": url,
-                "created_at": report_dict["created_at"],
-            }
-
-            # 管理员可以看到报告所有者信息
-            if admin_flag:
-                report_item["user_id"] = report_dict.get("user_id")
-                report_item["user_email"] = report_dict.get("user_email")
-                report_item["username"] = report_dict.get("username")
-
-            result.append(report_item)
-
-        return APIResponse.success(data=result, message="获取报告列表成功")
+        page_size = min(
+            limit or app_settings.report_list_page_size, app_settings.report_list_max_page_size
+        )
+        reports, next_cursor = await ReportService.alist_reports(
+            user_id=None if admin_flag else user.id,
+            limit=page_size,
+            cursor=cursor,
+            include_user=admin_flag,
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return APIResponse.success(data=reports, message="获取报告列表成功")
+    except ServiceException as e:
+        return APIResponse.error(message=str(e), code=400)
     except Exception as e:
         logger.error(f"[report_minio_list] 错误: {e}", exc_info=True)
         return APIResponse.success(data=[], message="获取报告列表成功")
 
 
 @router.delete("/delete")
-def report_delete(
+async def report_delete(
     file_name: str = Query(..., description="文件名"),
     user=Depends(get_current_user),
 ):
@@ -136,17 +218,16 @@ def report_delete(
 
         # 验证权限并删除数据库记录
         try:
-            ReportService.delete_report(file_name, user.id, admin_flag)
+            await asyncio.to_thread(ReportService.delete_report, file_name, user.id, admin_flag)
         except PermissionError as e:
             return APIResponse.error(message=str(e), code=403)
         except Exception as e:
             logger.error(f"删除数据库记录失败: {e}", exc_info=True)
             return APIResponse.error(message=f"删除数据库记录失败: {str(e)}", code=500)
 
-        # 删除MinIO中的文件
+        # 删除MinIO中的文件（在存储线程池中执行，不阻塞事件循环）
         try:
-            bucket = minio_storage.bucket
-            minio_storage.client.remove_object(bucket, file_name)
+            await minio_storage.aremove_object(file_name)
         except Exception as e:
             # 即使MinIO删除失败，数据库记录已删除，记录错误但不返回失败
             logger.error(f"删除MinIO文件失败: {file_name}, 错误: {e}", exc_info=True)
@@ -157,8 +238,62 @@ def report_delete(
         return APIResponse.error(message=str(e), code=500)
 
 
+@router.get("/render")
+def report_render(
+    file_name: str = Query(..., description="文件名"),
+    fmt: str = Query("html", description="输出格式：html 或 pdf"),
+    user=Depends(get_current_user),
+):
+    """
+    将Markdown报告渲染为HTML或PDF（内嵌资金流图表）
+    - 管理员：可以渲染任何报告
+    - 普通用户：只能渲染自己的报告
+
+    - **file_name**: 报告文件名
+    - **fmt**: 输出格式（html/pdf，默认html）
+    """
+    report_record = ReportService.get_report_by_filename(file_name)
+    if not report_record:
+        return APIResponse.error(message="报告不存在", code=404)
+    if report_record.user_id != user.id and not is_admin_user(user):
+        return APIResponse.error(message="无权查看该报告", code=403)
+
+    try:
+        content, media_type, output_name = ReportRenderService.render(file_name, fmt)
+    except ServiceException as e:
+        return APIResponse.error(message=str(e), code=400)
+    except Exception as e:
+        logger.error(f"渲染报告失败: {e}", exc_info=True)
+        return APIResponse.error(message=f"渲染报告失败: {str(e)}", code=500)
+
+    import urllib.parse
+
+    disposition = "inline" if fmt == "html" else "attachment"
+    headers = {
+        "Content-Disposition": f"{disposition}; filename*=UTF-8''{urllib.parse.quote(output_name)}"
+    }
+    if fmt == "html":
+        # 纵深防御：HTML 在 API 源下内联展示，禁止脚本执行并隔离为唯一源
+        headers["Content-Security-Policy"] = (
+            "sandbox; default-src 'none'; img-src data:; style-src 'unsafe-inline'"
+        )
+        headers["X-Content-Type-Options"] = "nosniff"
+    return Response(content, media_type=media_type, headers=headers)
+
+
+def _representation_etag(etag: str, encoding: Optional[str]) -> str:
+    """下载响应的 ETag：压缩后的内容与原始内容字节不同，强 ETag 带编码后缀"""
+    return f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+
+
+def _representation_etags(etag: str) -> Set[str]:
+    """同一对象版本所有编码表示的 ETag（条件请求命中任一即未修改）"""
+    return {_representation_etag(etag, encoding) for encoding in (None, *CONTENT_ENCODINGS)}
+
+
 @router.get("/download")
 def report_download(
+    request: Request,
     file_name: str = Query(..., description="文件名"),
     token: str = Query(None, description="认证Token"),
     authorization: str = Header(None, description="Authorization Header"),
@@ -166,6 +301,7 @@ def report_download(
     """
     下载报告文件（后端代理下载，解决签名和跨域问题）
     支持通过 query parameter 或 Authorization Header 传递 token
+    支持 Range 断点续传、ETag 条件请求，小文件走内存缓存并按需压缩
     """
     from jose import JWTError, jwt
 
@@ -191,21 +327,87 @@ def report_download(
         return APIResponse.error(message="Token已过期或无效", code=401)
 
     try:
-        import urllib.parse
+        meta = ReportDownloadService.stat(file_name)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            return APIResponse.error(message="文件不存在", code=404)
+        logger.error(f"获取文件信息失败: {e}", exc_info=True)
+        return APIResponse.error(message=f"下载文件失败: {str(e)}", code=500)
 
-        from core.storage import minio_storage
-        from fastapi.responses import StreamingResponse
+    # 小对象整体缓存在内存，文本类内容按客户端支持情况压缩；
+    # 每种编码是不同的表示，ETag 带编码后缀，Range 也作用于所选编码的内容
+    size = meta["size"]
+    cacheable = ReportDownloadService.is_cacheable(size)
+    encoding = (
+        choose_encoding(request.headers.get("accept-encoding"), file_name) if cacheable else None
+    )
+    etag = _representation_etag(meta["etag"], encoding)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{urllib.parse.quote(file_name)}",
+    }
+    if cacheable:
+        headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if meta["last_modified"]:
+        headers["Last-Modified"] = formatdate(meta["last_modified"].timestamp(), usegmt=True)
+
+    # 条件请求：客户端已有最新版本（任一编码）时直接返回 304
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().split("W/", 1)[-1] for tag in if_none_match.split(",")}
+        if "*" in tags or tags & _representation_etags(meta["etag"]):
+            return Response(status_code=304, headers=headers)
+
+    # If-Range 与当前表示的 ETag 不一致时忽略 Range，返回完整内容
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
+
+    try:
+        content = (
+            ReportDownloadService.get_content(file_name, meta["etag"], encoding)
+            if cacheable
+            else None
+        )
+        total = len(content) if content is not None else size
+        try:
+            byte_range = parse_range(range_header, total)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{total}"
+            return Response(status_code=416, headers=headers)
+
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+            headers["Content-Length"] = str(length)
+            if content is not None:
+                return Response(
+                    content[start : end + 1],
+                    status_code=206,
+                    media_type="application/octet-stream",
+                    headers=headers,
+                )
+            return StreamingResponse(
+                ReportDownloadService.iter_object(file_name, offset=start, length=length),
+                status_code=206,
+                media_type="application/octet-stream",
+                headers=headers,
+            )
 
-        # 获取文件对象
-        response = minio_storage.client.get_object(minio_storage.bucket, file_name)
+        if content is not None:
+            return Response(content, media_type="application/octet-stream", headers=headers)
 
-        # 生成流式响应
+        headers["Content-Length"] = str(size)
         return StreamingResponse(
-            response,
+            ReportDownloadService.iter_object(file_name),
             media_type="application/octet-stream",
-            headers={
-                "Content-Disposition": f"attachment; filename*=UTF-8''{urllib.parse.quote(file_name)}"
-            },
+            headers=headers,
         )
     except Exception as e:
         logger.error(f"下载文件失败: {e}", exc_info=True)
@@ -3,14 +3,19 @@ import os
 from contextlib import asynccontextmanager
 from threading import Thread
 
-from api.middleware import exception_handler, logging_middleware
+from api.middleware import exception_handler, logging_middleware, rate_limit_middleware
 from api.v1.router import api_router
+from core.database import dispose_async_engine
 from core.logging import setup_logging
+from core.storage import minio_storage
 from crawler.crawler import start_crawler_job
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from services.auth.email_queue import shutdown_email_queue
+from services.flow.flow_chart_service import shutdown_chart_pool
 from services.init_db import init_db
+from services.report.render_service import shutdown_render_pool
 from services.scheduler import init_scheduler
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
@@ -53,6 +58,11 @@ async def lifespan(app: FastAPI):
         logger.info("应用关闭中...")
         if scheduler:
             scheduler.shutdown()
+        shutdown_render_pool()
+        shutdown_chart_pool()
+        shutdown_email_queue()
+        minio_storage.close()
+        await dispose_async_engine()
 
 
 app = FastAPI(
@@ -69,6 +79,7 @@ app.add_exception_handler(StarletteHTTPException, exception_handler)
 app.add_exception_handler(Exception, exception_handler)
 
 # 注册中间件（顺序很重要：先注册的会后执行）
+app.middleware("http")(rate_limit_middleware)
 app.middleware("http")(logging_middleware)
 
 # CORS配置
@@ -78,6 +89,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 报告列表的分页游标通过响应头返回，需要允许前端读取
+    expose_headers=["X-Next-Cursor"],
 )
 
 # ==================== 注册所有路由模块 ====================
@@ -3,53 +3,373 @@
 提供统一的数据库会话管理，避免资源泄漏
 """
 
+import asyncio
 import logging
-from contextlib import contextmanager
-from typing import Generator
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, List, Optional, Sequence
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc, make_url, text
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 from core.config import database_settings
 
 logger = logging.getLogger(__name__)
 
 
+class _PoolStats:
+    """连接池指标（取连接等待时间、超时次数等）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float, timed_out: bool = False) -> None:
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录取连接等待时间的 QueuePool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = _PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return conn
+
+
+# 异步引擎对应的驱动（按数据库后端）
+_ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+
+
 # 创建数据库引擎
-def create_db_engine():
-    """创建数据库引擎"""
+def build_db_url() -> str:
+    """构造主库连接URL（设置了 MYSQL_URL 时直接使用）"""
+    if database_settings.url:
+        return database_settings.url
     db_config = database_settings.config_dict
-    db_url = (
+    return (
         f"mysql+pymysql://{db_config['user']}:"
         f"{db_config['password']}@"
         f"{db_config['host']}:"
         f"{db_config['port']}/"
         f"{db_config['database']}?charset={db_config['charset']}"
     )
-    return create_engine(db_url, echo=False, pool_pre_ping=True)
+
+
+def to_async_url(url: str) -> str:
+    """将同步连接URL转换为异步驱动URL（pymysql -> aiomysql，sqlite -> aiosqlite）"""
+    parsed = make_url(url)
+    drivername = _ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def _pool_options() -> Dict[str, Any]:
+    """连接池参数（主库、副本、异步引擎共用）"""
+    return {
+        "pool_size": database_settings.pool_size,
+        "max_overflow": database_settings.max_overflow,
+        "pool_recycle": database_settings.pool_recycle,
+        "pool_timeout": database_settings.pool_timeout,
+        "pool_pre_ping": database_settings.pool_pre_ping,
+    }
+
+
+def create_db_engine(url: Optional[str] = None):
+    """创建数据库引擎（连接池参数来自 DatabaseSettings）"""
+    return create_engine(
+        url or build_db_url(),
+        echo=False,
+        poolclass=InstrumentedQueuePool,
+        **_pool_options(),
+    )
 
 
 engine = create_db_engine()
 SessionLocal = sessionmaker(bind=engine)
 
 
+def get_raw_connection():
+    """
+    从共享连接池获取 DBAPI（pymysql）连接，供需要原生游标的代码（如爬虫）使用
+
+    调用 close() 时连接归还连接池而不是真正断开
+    """
+    return engine.raw_connection()
+
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """
+    获取连接池指标
+
+    Returns:
+        包含 size、checked_in、in_use、overflow、checkouts、timeouts、平均/最大等待时间的字典
+    """
+    pool = engine.pool
+    metrics: Dict[str, Any] = {}
+    if isinstance(pool, QueuePool):
+        metrics.update(
+            {
+                "size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "checked_in": pool.checkedin(),
+                "in_use": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+            }
+        )
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        with stats.lock:
+            total = stats.checkouts + stats.timeouts
+            metrics.update(
+                {
+                    "checkouts": stats.checkouts,
+                    "timeouts": stats.timeouts,
+                    "wait_avg_ms": round(stats.wait_total / total * 1000, 3) if total else 0,
+                    "wait_max_ms": round(stats.wait_max * 1000, 3),
+                }
+            )
+    return metrics
+
+
+# ==================== 只读副本路由 ====================
+
+
+def measure_replica_lag(connection) -> Optional[float]:
+    """
+    查询副本的复制延迟（秒）
+
+    Args:
+        connection: 副本上的连接
+
+    Returns:
+        延迟秒数；复制线程中断时返回 None（视为不可用）。
+        非 MySQL（如本地 SQLite 替身）或未配置复制的实例视为无延迟
+    """
+    if connection.dialect.name != "mysql":
+        return 0.0
+    # MySQL 8.0.22+ 使用 REPLICA 语法，旧版本回退到 SLAVE 语法
+    for statement, column in (
+        ("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+        ("SHOW SLAVE STATUS", "Seconds_Behind_Master"),
+    ):
+        try:
+            row = connection.execute(text(statement)).mappings().first()
+        except exc.DBAPIError:
+            continue
+        if row is None:
+            return 0.0
+        value = row.get(column)
+        return float(value) if value is not None else None
+    return None
+
+
+class _Replica:
+    """单个只读副本（引擎按需创建，不在初始化时连接）"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.engine = create_db_engine(url)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.async_engine = None
+        self.async_session_factory = None
+        # 首次检查通过前不接收读请求
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def get_async_session_factory(self):
+        """获取副本的异步会话工厂（首次使用时创建异步引擎）"""
+        if self.async_session_factory is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+            self.async_engine = create_async_engine(
+                to_async_url(self.url), echo=False, **_pool_options()
+            )
+            self.async_session_factory = async_sessionmaker(
+                bind=self.async_engine, expire_on_commit=False
+            )
+        return self.async_session_factory
+
+
+class ReplicaRouter:
+    """
+    只读副本路由：按检查间隔探测各副本的可用性与复制延迟，
+    读请求在健康副本间轮询，延迟超限或全部不可用时回退到主库
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        max_lag: float,
+        check_interval: float,
+        lag_probe: Callable[[Any], Optional[float]] = measure_replica_lag,
+    ):
+        self.replicas = [_Replica(url) for url in urls]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag_probe = lag_probe
+        self._lock = threading.Lock()
+        self._checking = False
+        self._checked_at: Optional[float] = None
+        self._next = 0
+
+    def needs_check(self) -> bool:
+        """是否到了下一次检查时间"""
+        return bool(self.replicas) and (
+            self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval
+        )
+
+    def check(self) -> None:
+        """探测全部副本的可用性与复制延迟"""
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as connection:
+                    lag = self.lag_probe(connection)
+                error = None if lag is not None else "复制已中断"
+            except Exception as e:
+                lag, error = None, str(e)
+            if lag is not None and lag > self.max_lag:
+                error = f"复制延迟 {lag:.1f}s 超过 {self.max_lag:.1f}s"
+            healthy = error is None
+            if healthy != replica.healthy:
+                if healthy:
+                    logger.info(f"只读副本恢复可用: {replica.name}")
+                else:
+                    logger.warning(f"只读副本不可用，读请求回退到主库: {replica.name}, {error}")
+            replica.lag, replica.error, replica.healthy = lag, error, healthy
+
+    def refresh_if_stale(self) -> None:
+        """到达检查间隔时执行一次检查（同一时间只有一个线程检查，其余沿用上次结果）"""
+        if not self.needs_check():
+            return
+        with self._lock:
+            if self._checking:
+                return
+            self._checking = True
+        try:
+            self.check()
+        finally:
+            with self._lock:
+                self._checked_at = time.monotonic()
+                self._checking = False
+
+    def choose(self) -> Optional[_Replica]:
+        """轮询选择一个健康副本，没有时返回 None（使用主库）"""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        with self._lock:
+            index = self._next
+            self._next += 1
+        return healthy[index % len(healthy)]
+
+    def mark_failed(self, replica: _Replica, error: Exception) -> None:
+        """读请求连接副本失败时立即摘除，等待下次检查恢复"""
+        if replica.healthy:
+            logger.warning(f"只读副本连接失败，读请求回退到主库: {replica.name}, {error}")
+        replica.healthy = False
+        replica.error = str(error)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """各副本状态（用于健康检查接口）"""
+        return [
+            {
+                "name": replica.name,
+                "healthy": replica.healthy,
+                "lag_seconds": replica.lag,
+                "error": replica.error,
+            }
+            for replica in self.replicas
+        ]
+
+    def dispose(self) -> None:
+        """释放全部副本的同步连接池"""
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+    async def dispose_async(self) -> None:
+        """释放全部副本的异步连接池"""
+        for replica in self.replicas:
+            if replica.async_engine is not None:
+                await replica.async_engine.dispose()
+                replica.async_engine = None
+                replica.async_session_factory = None
+
+
+replica_router = ReplicaRouter(
+    database_settings.replica_urls,
+    max_lag=database_settings.replica_max_lag,
+    check_interval=database_settings.replica_check_interval,
+)
+
+
+def get_replica_status() -> List[Dict[str, Any]]:
+    """获取只读副本状态（未配置副本时为空列表）"""
+    return replica_router.status()
+
+
+def _open_read_session() -> Session:
+    """打开只读会话：优先使用健康副本，副本连接失败时回退到主库"""
+    replica_router.refresh_if_stale()
+    replica = replica_router.choose()
+    if replica is not None:
+        session = replica.session_factory()
+        try:
+            # 立即取出连接，连接失败时还能透明地回退到主库
+            session.connection()
+            return session
+        except exc.DBAPIError as e:
+            session.close()
+            replica_router.mark_failed(replica, e)
+    return SessionLocal()
+
+
 @contextmanager
-def get_db_session(auto_commit: bool = True) -> Generator[Session, None, None]:
+def get_db_session(
+    auto_commit: bool = True, readonly: bool = False
+) -> Generator[Session, None, None]:
     """
     数据库会话上下文管理器
 
     Args:
         auto_commit: 是否自动提交事务，默认为True
+        readonly: 只读查询，路由到只读副本（副本不可用或延迟过大时使用主库），不提交事务
 
     使用示例:
         with get_db_session() as session:
             user = session.query(User).first()
             # 自动提交
     """
-    session = SessionLocal()
+    session = _open_read_session() if readonly else SessionLocal()
     try:
         yield session
-        if auto_commit:
+        if auto_commit and not readonly:
             session.commit()
     except Exception:
         session.rollback()
@@ -72,3 +392,138 @@ def get_db_session_dependency():
         raise
     finally:
         session.close()
+
+
+# ==================== 异步引擎与会话 ====================
+
+_async_engine = None
+_async_session_factory = None
+
+
+def create_async_db_engine():
+    """创建异步数据库引擎（aiomysql），连接池参数与同步引擎一致"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    return create_async_engine(to_async_url(build_db_url()), echo=False, **_pool_options())
+
+
+def get_async_engine():
+    """获取异步引擎（首次使用时创建，未安装异步驱动时不影响同步代码）"""
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_engine = create_async_db_engine()
+        # 异步会话中访问已过期属性会触发隐式IO，提交后不过期对象
+        _async_session_factory = async_sessionmaker(bind=_async_engine, expire_on_commit=False)
+    return _async_engine
+
+
+async def _open_async_read_session():
+    """打开异步只读副本会话，没有可用副本时返回 None"""
+    if replica_router.needs_check():
+        # 副本检查使用同步连接，放到线程中执行
+        await asyncio.to_thread(replica_router.refresh_if_stale)
+    replica = replica_router.choose()
+    if replica is None:
+        return None
+    session = replica.get_async_session_factory()()
+    try:
+        await session.connection()
+        return session
+    except exc.DBAPIError as e:
+        await session.close()
+        replica_router.mark_failed(replica, e)
+        return None
+
+
+@asynccontextmanager
+async def get_async_db_session(
+    auto_commit: bool = True, readonly: bool = False
+) -> AsyncGenerator[Any, None]:
+    """
+    异步数据库会话上下文管理器
+
+    Args:
+        auto_commit: 是否自动提交事务，默认为True
+        readonly: 只读查询，路由到只读副本（规则同 get_db_session），不提交事务
+
+    使用示例:
+        async with get_async_db_session(auto_commit=False) as session:
+            result = await session.execute(select(User))
+    """
+    session = await _open_async_read_session() if readonly else None
+    if session is None:
+        get_async_engine()
+        session = _async_session_factory()
+    try:
+        yield session
+        if auto_commit and not readonly:
+            await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+async def dispose_async_engine() -> None:
+    """释放异步引擎连接池（应用关闭时调用）"""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
+    await replica_router.dispose_async()
+
+
+def bulk_upsert(
+    session: Session,
+    model: Any,
+    rows: List[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+    update_columns: Sequence[str],
+    batch_size: int = 500,
+) -> int:
+    """
+    批量插入或更新（每批一条多行 INSERT 语句）
+
+    MySQL 使用 INSERT ... ON DUPLICATE KEY UPDATE；SQLite 使用 ON CONFLICT DO UPDATE（便于测试）
+
+    Args:
+        session: 数据库会话
+        model: ORM 模型类
+        rows: 行字典列表
+        conflict_columns: 唯一索引列（SQLite 冲突目标）
+        update_columns: 冲突时需要更新的列
+        batch_size: 每条语句包含的行数
+
+    Returns:
+        处理的行数
+
+    Raises:
+        ValueError: 如果数据库方言不是 MySQL 或 SQLite
+    """
+    if not rows:
+        return 0
+
+    dialect = session.get_bind().dialect.name
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start : start + batch_size]
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert
+
+            stmt = insert(model).values(batch)
+            stmt = stmt.on_duplicate_key_update({col: stmt.inserted[col] for col in update_columns})
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+
+            stmt = insert(model).values(batch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(conflict_columns),
+                set_={col: stmt.excluded[col] for col in update_columns},
+            )
+        else:
+            raise ValueError(f"不支持的数据库方言: {dialect}")
+        session.execute(stmt)
+    return len(rows)
@@ -1,38 +1,225 @@
+import asyncio
+import functools
+import io
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+import urllib3
 from dotenv import load_dotenv
 from minio import Minio
+from minio.error import S3Error
 
 load_dotenv()
 
+# MinIO 分片上传的最小分片大小为 5MiB，未知长度上传时按此大小缓冲并逐片发送
+STREAM_PART_SIZE = 5 * 1024 * 1024
+
+
+class IterableReader(io.RawIOBase):
+    """
+    将字符串/字节迭代器包装为只读文件对象，供 put_object 按需拉取数据
+
+    每读出一个片段时调用 on_chunk(片段)，便于在上传的同时把内容转发给客户端。
+    仅在内存中保留尚未被读取的剩余字节，不落盘。
+    """
+
+    def __init__(self, iterable, on_chunk=None, encoding="utf-8"):
+        self._iterator = iter(iterable)
+        self._on_chunk = on_chunk
+        self._encoding = encoding
+        self._leftover = b""
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._leftover:
+            try:
+                chunk = next(self._iterator)
+            except StopIteration:
+                return 0
+            if self._on_chunk:
+                self._on_chunk(chunk)
+            self._leftover = chunk.encode(self._encoding) if isinstance(chunk, str) else chunk
+        size = min(len(buffer), len(self._leftover))
+        buffer[:size] = self._leftover[:size]
+        self._leftover = self._leftover[size:]
+        self.bytes_read += size
+        return size
+
 
 class MinioStorage:
+    """
+    MinIO 存储封装
+
+    客户端在首次使用时才创建（并检查/创建存储桶），导入本模块不会产生网络调用；
+    底层使用可配置的 urllib3 连接池，异步方法在专用线程池中执行，不阻塞事件循环。
+    """
+
     def __init__(self):
-        self.client = Minio(
-            os.getenv("MINIO_ENDPOINT", "localhost:9000"),
+        self.endpoint = os.getenv("MINIO_ENDPOINT", "localhost:9000")
+        self.bucket = os.getenv("MINIO_BUCKET", "data")
+        # 公共端点：用于生成浏览器可访问的URL（如果设置了则使用，否则使用MINIO_ENDPOINT）
+        self.public_endpoint = os.getenv("MINIO_PUBLIC_ENDPOINT", self.endpoint)
+        self.pool_maxsize = int(os.getenv("MINIO_POOL_MAXSIZE", "20"))
+        self.connect_timeout = float(os.getenv("MINIO_CONNECT_TIMEOUT", "5"))
+        self.read_timeout = float(os.getenv("MINIO_READ_TIMEOUT", "60"))
+        self.multipart_part_size = int(
+            os.getenv("MINIO_MULTIPART_PART_SIZE", str(16 * 1024 * 1024))
+        )
+        self._client = None
+        self._http = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _create_client(self):
+        """创建 MinIO 客户端（连接池大小、超时、重试可通过环境变量调整）"""
+        self._http = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=self.pool_maxsize,
+            block=True,
+            timeout=urllib3.Timeout(connect=self.connect_timeout, read=self.read_timeout),
+            retries=urllib3.Retry(
+                total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]
+            ),
+        )
+        return Minio(
+            self.endpoint,
             access_key=os.getenv("MINIO_ACCESS_KEY", "minioadmin"),
             secret_key=os.getenv("MINIO_SECRET_KEY", "minioadmin"),
             secure=os.getenv("MINIO_SECURE", "False").lower() in ["true", "1", "t"],
+            http_client=self._http,
         )
-        self.bucket = os.getenv("MINIO_BUCKET", "data")
-        # 公共端点：用于生成浏览器可访问的URL（如果设置了则使用，否则使用MINIO_ENDPOINT）
-        self.public_endpoint = os.getenv(
-            "MINIO_PUBLIC_ENDPOINT", os.getenv("MINIO_ENDPOINT", "localhost:9000")
+
+    @property
+    def client(self):
+        """延迟初始化的 MinIO 客户端，首次访问时确保存储桶存在"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    client = self._create_client()
+                    if not client.bucket_exists(self.bucket):
+                        client.make_bucket(self.bucket)
+                    self._client = client
+        return self._client
+
+    def _get_executor(self):
+        """延迟创建用于异步方法的线程池（大小与连接池一致）"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.pool_maxsize, thread_name_prefix="minio"
+                    )
+        return self._executor
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), functools.partial(func, *args, **kwargs)
         )
-        # 确保存储桶存在
-        if not self.client.bucket_exists(self.bucket):
-            self.client.make_bucket(self.bucket)
+
+    def close(self):
+        """关闭线程池并释放连接池（应用关闭时调用）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._http is not None:
+            self._http.clear()
+        self._client = None
 
     def upload_image(self, file_path, object_name=None):
         if not object_name:
             object_name = os.path.basename(file_path)
-        file_stat = os.stat(file_path)
-        with open(file_path, "rb") as f:
-            self.client.put_object(
-                self.bucket, object_name, f, file_stat.st_size, content_type="image/png"
-            )
+        return self.upload_file(file_path, object_name, content_type="image/png")
+
+    def upload_file(self, file_path, object_name, content_type="application/octet-stream"):
+        """
+        上传本地文件，超过分片大小时自动使用分片上传
+
+        Args:
+            file_path: 本地文件路径
+            object_name: 对象名
+            content_type: 内容类型
+
+        Returns:
+            对象名
+        """
+        self.client.fput_object(
+            self.bucket,
+            object_name,
+            file_path,
+            content_type=content_type,
+            part_size=self.multipart_part_size,
+        )
+        return object_name
+
+    def upload_bytes(self, data, object_name, content_type="application/octet-stream"):
+        """
+        直接从内存上传字节内容，无需临时文件
+
+        Args:
+            data: 字节内容
+            object_name: 对象名
+            content_type: 内容类型
+
+        Returns:
+            对象名
+        """
+        self.client.put_object(
+            self.bucket,
+            object_name,
+            io.BytesIO(data),
+            len(data),
+            content_type=content_type,
+            part_size=self.multipart_part_size,
+        )
+        return object_name
+
+    def upload_stream(
+        self, data, object_name, content_type="application/octet-stream", part_size=None
+    ):
+        """
+        以未知长度流式上传（MinIO multipart upload），从内存中的可读对象拉取数据，无需临时文件
+
+        Args:
+            data: 具有 read() 方法的对象（如 IterableReader）
+            object_name: 对象名
+            content_type: 内容类型
+            part_size: 分片大小，默认 STREAM_PART_SIZE
+
+        Returns:
+            对象名
+        """
+        self.client.put_object(
+            self.bucket,
+            object_name,
+            data,
+            length=-1,
+            part_size=part_size or STREAM_PART_SIZE,
+            content_type=content_type,
+        )
         return object_name
 
+    def get_bytes(self, object_name):
+        """
+        读取对象的完整内容（适用于报告等小对象），读取后释放连接
+
+        Args:
+            object_name: 对象名
+
+        Returns:
+            字节内容
+        """
+        response = self.client.get_object(self.bucket, object_name)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
     def get_image_url(self, object_name):
         """
         [已弃用预签名URL] 改为返回后端代理下载地址
@@ -53,10 +240,44 @@ class MinioStorage:
         # 返回相对路径，前端配合API_BASE或直接使用
         return f"/api/v1/report/download?file_name={encoded_name}"
 
-    def list_files(self, bucket=None):
+    def list_files(self, bucket=None, prefix=None):
         bucket = bucket or self.bucket
-        objects = self.client.list_objects(bucket, recursive=True)
+        objects = self.client.list_objects(bucket, prefix=prefix, recursive=True)
         return [obj.object_name for obj in objects]
 
+    def remove_object(self, object_name):
+        """删除对象"""
+        self.client.remove_object(self.bucket, object_name)
+
+    def object_exists(self, object_name):
+        """判断对象是否存在"""
+        try:
+            self.client.stat_object(self.bucket, object_name)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return False
+            raise
+
+    # ==================== 异步接口（在线程池中执行，不阻塞事件循环） ====================
+
+    async def aupload_bytes(self, data, object_name, content_type="application/octet-stream"):
+        return await self._run(self.upload_bytes, data, object_name, content_type)
+
+    async def aupload_file(self, file_path, object_name, content_type="application/octet-stream"):
+        return await self._run(self.upload_file, file_path, object_name, content_type)
+
+    async def aget_bytes(self, object_name):
+        return await self._run(self.get_bytes, object_name)
+
+    async def alist_files(self, bucket=None, prefix=None):
+        return await self._run(self.list_files, bucket, prefix)
+
+    async def aremove_object(self, object_name):
+        return await self._run(self.remove_object, object_name)
+
+    async def aobject_exists(self, object_name):
+        return await self._run(self.object_exists, object_name)
+
 
 minio_storage = MinioStorage()
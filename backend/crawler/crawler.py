@@ -2,7 +2,6 @@ import json
 import sys
 from datetime import datetime, timedelta, timezone
 
-import pymysql
 import requests
 
 # 东方财富API参数配置
@@ -310,7 +309,7 @@ def get_db_config():
     """
     获取数据库配置
     统一使用core.config中的配置，但保留此函数以兼容现有代码
-    注意：爬虫模块使用PyMySQL直接连接，因为需要动态创建表
+    注意：爬虫写库已改用 core.database 的共享连接池（get_raw_connection），此函数仅供外部脚本使用
     """
     from core.config import database_settings
 
@@ -324,74 +323,82 @@ def get_db_config():
 def store_data_to_db(data, table_name):
     if not data:
         return
-    db_config = get_db_config()
-    conn = pymysql.connect(**db_config)
-    cursor = conn.cursor()
-    cursor.execute(f"""
-        CREATE TABLE IF NOT EXISTS `{table_name}` (
-            `Index` INT PRIMARY KEY AUTO_INCREMENT,
-            `code` VARCHAR(10),
-            `name` VARCHAR(50),
-            `flow_type` VARCHAR(32),
-            `market_type` VARCHAR(32),
-            `period` VARCHAR(16),
-            `latest_price` FLOAT,
-            `change_percentage` FLOAT,
-            `main_flow_net_amount` FLOAT,
-            `main_flow_net_percentage` FLOAT,
-            `extra_large_order_flow_net_amount` FLOAT,
-            `extra_large_order_flow_net_percentage` FLOAT,
-            `large_order_flow_net_amount` FLOAT,
-            `large_order_flow_net_percentage` FLOAT,
-            `medium_order_flow_net_amount` FLOAT,
-            `medium_order_flow_net_percentage` FLOAT,
-            `small_order_flow_net_amount` FLOAT,
-            `small_order_flow_net_percentage` FLOAT,
-            `crawl_time` DATETIME
-        ) DEFAULT CHARSET=utf8mb4;
-    """)
-    # 新增：每次采集前清空表
-    cursor.execute(f"TRUNCATE TABLE `{table_name}`;")
-    for record in data:
-        cursor.execute(
-            f"""
-            INSERT INTO `{table_name}` (
-                `code`, `name`, `flow_type`, `market_type`, `period`, `latest_price`,
-                `change_percentage`, `main_flow_net_amount`, `main_flow_net_percentage`,
-                `extra_large_order_flow_net_amount`, `extra_large_order_flow_net_percentage`,
-                `large_order_flow_net_amount`, `large_order_flow_net_percentage`,
-                `medium_order_flow_net_amount`, `medium_order_flow_net_percentage`,
-                `small_order_flow_net_amount`, `small_order_flow_net_percentage`,
-                `crawl_time`
-            ) VALUES (
-                %(code)s, %(name)s, %(flow_type)s, %(market_type)s, %(period)s, %(latest_price)s,
-                %(change_percentage)s, %(main_flow_net_amount)s, %(main_flow_net_percentage)s,
-                %(extra_large_order_flow_net_amount)s, %(extra_large_order_flow_net_percentage)s,
-                %(large_order_flow_net_amount)s, %(large_order_flow_net_percentage)s,
-                %(medium_order_flow_net_amount)s, %(medium_order_flow_net_percentage)s,
-                %(small_order_flow_net_amount)s, %(small_order_flow_net_percentage)s,
-                %(crawl_time)s
+    from core.config import app_settings
+    from core.database import get_raw_connection
+
+    # 使用与 API 共享的连接池，close() 时归还连接
+    conn = get_raw_connection()
+    # 异常时也要归还连接，否则每次失败的采集都会占住一个池连接
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{table_name}` (
+                `Index` INT PRIMARY KEY AUTO_INCREMENT,
+                `code` VARCHAR(10),
+                `name` VARCHAR(50),
+                `flow_type` VARCHAR(32),
+                `market_type` VARCHAR(32),
+                `period` VARCHAR(16),
+                `latest_price` FLOAT,
+                `change_percentage` FLOAT,
+                `main_flow_net_amount` FLOAT,
+                `main_flow_net_percentage` FLOAT,
+                `extra_large_order_flow_net_amount` FLOAT,
+                `extra_large_order_flow_net_percentage` FLOAT,
+                `large_order_flow_net_amount` FLOAT,
+                `large_order_flow_net_percentage` FLOAT,
+                `medium_order_flow_net_amount` FLOAT,
+                `medium_order_flow_net_percentage` FLOAT,
+                `small_order_flow_net_amount` FLOAT,
+                `small_order_flow_net_percentage` FLOAT,
+                `crawl_time` DATETIME
+            ) DEFAULT CHARSET=utf8mb4;
+        """)
+        # 新增：每次采集前清空表
+        cursor.execute(f"TRUNCATE TABLE `{table_name}`;")
+        # executemany 将每批记录合并为一条多行 INSERT，替代逐行执行
+        batch_size = app_settings.flow_data_upsert_batch_size
+        for start in range(0, len(data), batch_size):
+            cursor.executemany(
+                f"""
+                INSERT INTO `{table_name}` (
+                    `code`, `name`, `flow_type`, `market_type`, `period`, `latest_price`,
+                    `change_percentage`, `main_flow_net_amount`, `main_flow_net_percentage`,
+                    `extra_large_order_flow_net_amount`, `extra_large_order_flow_net_percentage`,
+                    `large_order_flow_net_amount`, `large_order_flow_net_percentage`,
+                    `medium_order_flow_net_amount`, `medium_order_flow_net_percentage`,
+                    `small_order_flow_net_amount`, `small_order_flow_net_percentage`,
+                    `crawl_time`
+                ) VALUES (
+                    %(code)s, %(name)s, %(flow_type)s, %(market_type)s, %(period)s, %(latest_price)s,
+                    %(change_percentage)s, %(main_flow_net_amount)s, %(main_flow_net_percentage)s,
+                    %(extra_large_order_flow_net_amount)s, %(extra_large_order_flow_net_percentage)s,
+                    %(large_order_flow_net_amount)s, %(large_order_flow_net_percentage)s,
+                    %(medium_order_flow_net_amount)s, %(medium_order_flow_net_percentage)s,
+                    %(small_order_flow_net_amount)s, %(small_order_flow_net_percentage)s,
+                    %(crawl_time)s
+                )
+                ON DUPLICATE KEY UPDATE
+                    `latest_price`=VALUES(`latest_price`),
+                    `change_percentage`=VALUES(`change_percentage`),
+                    `main_flow_net_amount`=VALUES(`main_flow_net_amount`),
+                    `main_flow_net_percentage`=VALUES(`main_flow_net_percentage`),
+                    `extra_large_order_flow_net_amount`=VALUES(`extra_large_order_flow_net_amount`),
+                    `extra_large_order_flow_net_percentage`=VALUES(`extra_large_order_flow_net_percentage`),
+                    `large_order_flow_net_amount`=VALUES(`large_order_flow_net_amount`),
+                    `large_order_flow_net_percentage`=VALUES(`large_order_flow_net_percentage`),
+                    `medium_order_flow_net_amount`=VALUES(`medium_order_flow_net_amount`),
+                    `medium_order_flow_net_percentage`=VALUES(`medium_order_flow_net_percentage`),
+                    `small_order_flow_net_amount`=VALUES(`small_order_flow_net_amount`),
+                    `small_order_flow_net_percentage`=VALUES(`small_order_flow_net_percentage`),
+                    `crawl_time`=VALUES(`crawl_time`)
+            """,
+                data[start : start + batch_size],
             )
-            ON DUPLICATE KEY UPDATE
-                `latest_price`=VALUES(`latest_price`),
-                `change_percentage`=VALUES(`change_percentage`),
-                `main_flow_net_amount`=VALUES(`main_flow_net_amount`),
-                `main_flow_net_percentage`=VALUES(`main_flow_net_percentage`),
-                `extra_large_order_flow_net_amount`=VALUES(`extra_large_order_flow_net_amount`),
-                `extra_large_order_flow_net_percentage`=VALUES(`extra_large_order_flow_net_percentage`),
-                `large_order_flow_net_amount`=VALUES(`large_order_flow_net_amount`),
-                `large_order_flow_net_percentage`=VALUES(`large_order_flow_net_percentage`),
-                `medium_order_flow_net_amount`=VALUES(`medium_order_flow_net_amount`),
-                `medium_order_flow_net_percentage`=VALUES(`medium_order_flow_net_percentage`),
-                `small_order_flow_net_amount`=VALUES(`small_order_flow_net_amount`),
-                `small_order_flow_net_percentage`=VALUES(`small_order_flow_net_percentage`),
-                `crawl_time`=VALUES(`crawl_time`)
-        """,
-            record,
-        )
-    conn.commit()
-    cursor.close()
-    conn.close()
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
 
 
 def run_collect(flow_choice, market_choice, detail_choice, day_choice, pages):
@@ -442,6 +449,21 @@ def run_collect(flow_choice, market_choice, detail_choice, day_choice, pages):
     else:
         return {"error": "参数错误"}
     store_data_to_db(data, table_name)
+    if data:
+        from core.config import app_settings
+        from services.common.cache_service import CacheService, record_table_freshness
+
+        # 登记本表的采集时间、行数、内容哈希和版本（内容变化时版本号加一）
+        try:
+            record_table_freshness(table_name, data)
+        except Exception as e:
+            print(f"登记数据新鲜度失败: {table_name}, {e}", file=sys.stderr, flush=True)
+        # 整表写入按市场/周期分组的缓存（一次 MULTI 整组替换），AI 分析优先从这里读取
+        if app_settings.cache_warm_after_crawl:
+            try:
+                CacheService.cache_flow_data_many(data, grouped=True)
+            except Exception as e:
+                print(f"资金流缓存预热失败: {table_name}, {e}", file=sys.stderr, flush=True)
     return {
         "table": table_name,
         "count": len(data),
@@ -469,7 +491,7 @@ def run_collect_all():
 def start_crawler_job():
     print("start_crawler_job called", file=sys.stderr, flush=True)
     from apscheduler.schedulers.background import BackgroundScheduler
-    from services.common.cache_service import set_data_ready
+    from services.flow.flow_chart_service import FlowChartService
 
     # 全局计数器
     start_crawler_job.crawl_count = 0
@@ -477,7 +499,7 @@ def start_crawler_job():
     def crawl_and_save():
         print("crawl_and_save called", file=sys.stderr, flush=True)
         try:
-            set_data_ready(False)
+            results = []
             # 个股资金流 Stock_Flow
             for market_choice in range(1, 9):
                 for day_choice in range(1, 5):
@@ -485,6 +507,7 @@ def start_crawler_job():
                     detail_choice = None
                     pages = 1
                     res = run_collect(flow_choice, market_choice, detail_choice, day_choice, pages)
+                    results.append(res)
                     print(
                         f"Stock_Flow | 市场: {market_names[market_choice - 1]} | 周期: {['today', '3d', '5d', '10d'][day_choice - 1]} | 采集条数: {res['count']}",
                         file=sys.stderr,
@@ -497,12 +520,18 @@ def start_crawler_job():
                     market_choice = None
                     pages = 1
                     res = run_collect(flow_choice, market_choice, detail_choice, day_choice, pages)
+                    results.append(res)
                     print(
                         f"Sector_Flow | 板块: {detail_flows_names[detail_choice - 1]} | 周期: {['today', '5d', '10d'][day_choice - 1]} | 采集条数: {res['count']}",
                         file=sys.stderr,
                         flush=True,
                     )
-            set_data_ready(True)
+            # 服务端渲染各市场/周期的资金流图表（不影响数据就绪状态）
+            try:
+                charts = FlowChartService.render_after_crawl(results)
+                print(f"资金流图表渲染完成: {charts} 张表", file=sys.stderr, flush=True)
+            except Exception as e:
+                print("资金流图表渲染异常:", e, file=sys.stderr, flush=True)
             # 采集次数+1
             start_crawler_job.crawl_count += 1
             print(
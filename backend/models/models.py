@@ -127,3 +127,8 @@ class Report(Base):
     file_name = Column(String(128), nullable=False)
     created_at = Column(DateTime, default=beijing_now)
     # 可扩展字段：摘要、状态等
+    __table_args__ = (
+        # 按用户/全局倒序的 keyset 分页（InnoDB 二级索引隐含主键 id）
+        Index("idx_report_user_created", "user_id", "created_at"),
+        Index("idx_report_created", "created_at"),
+    )
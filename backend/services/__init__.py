@@ -8,12 +8,20 @@ from core.database import SessionLocal, get_db_session, get_db_session_dependenc
 
 from services.auth.email_service import EmailService
 from services.auth.user_service import UserService
-from services.common.cache_service import CacheService, get_data_ready, set_data_ready
+from services.common.cache_service import (
+    CacheService,
+    get_all_freshness,
+    get_data_ready,
+    get_table_freshness,
+    record_table_freshness,
+)
 from services.common.chat_service import ChatService
 from services.common.task_service import TaskService
 from services.flow.flow_data_service import FlowDataService
 from services.flow.flow_image_service import FlowImageService
 from services.init_db import init_db
+from services.report.daily_report_service import DailyReportService
+from services.report.report_job_service import ReportJobService
 from services.report.report_service import ReportService
 
 # 导出所有服务类和函数
@@ -25,12 +33,16 @@ __all__ = [
     "FlowDataService",
     "FlowImageService",
     "ReportService",
+    "ReportJobService",
+    "DailyReportService",
     "ChatService",
     "CacheService",
     # 函数
     "init_db",
-    "set_data_ready",
     "get_data_ready",
+    "record_table_freshness",
+    "get_table_freshness",
+    "get_all_freshness",
     # 数据库相关
     "SessionLocal",
     "get_db_session",
@@ -0,0 +1,151 @@
+"""
+会话记忆模块
+较早的问答由 deepseek-chat 在后台增量压缩为固定长度的会话摘要，
+AI 分析时只带入「会话摘要 + 最近几条问答」，对话变长时提示词长度与延迟保持稳定
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.cache import redis_client
+from core.config import app_settings
+
+from services.ai.deepseek import DeepseekAgent
+from services.common.chat_service import ChatService
+
+logger = logging.getLogger(__name__)
+
+# 摘要任务的分布式锁过期时间（秒），防止多进程重复摘要同一会话
+SUMMARY_LOCK_EXPIRE = 120
+
+# 摘要输入中每条问答保留的字符数上限
+TURN_MAX_CHARS = 1500
+
+_executor = ThreadPoolExecutor(
+    max_workers=app_settings.chat_summary_workers, thread_name_prefix="chat-summary"
+)
+
+
+def _answer_text(answer: Any) -> str:
+    """提取回答正文（answer 可能是 dict）"""
+    if isinstance(answer, dict):
+        return str(answer.get("text") or answer.get("advice") or answer)
+    return str(answer or "")
+
+
+def _format_turns(turns: List[Dict[str, Any]]) -> str:
+    """将问答记录格式化为摘要输入"""
+    lines = []
+    for item in turns:
+        question = str(item.get("question", ""))[:TURN_MAX_CHARS]
+        answer = _answer_text(item.get("answer"))[:TURN_MAX_CHARS]
+        lines.append(f"User: {question}\nAssistant: {answer}")
+    return "\n\n".join(lines)
+
+
+def _summarize(previous: str, turns: List[Dict[str, Any]]) -> Optional[str]:
+    """用 deepseek-chat 将新的问答合并进已有摘要，调用失败时返回 None"""
+    max_chars = app_settings.chat_summary_max_chars
+    prompt = (
+        f"请将以下新增对话合并进已有的对话摘要，输出更新后的完整摘要，不超过{max_chars}字。"
+        "保留用户关注的股票/板块、提出过的问题、分析得出的关键结论和数据，"
+        "省略寒暄和重复内容，只输出摘要正文。\n\n"
+        f"### 已有摘要\n{previous or '（无）'}\n\n"
+        f"### 新增对话\n{_format_turns(turns)}"
+    )
+    summary, usage = DeepseekAgent.chat(
+        user_message=prompt,
+        system_message="你是一名专业金融分析师，善于提炼对话要点。",
+        stream=False,
+        max_tokens=app_settings.chat_summary_max_tokens,
+        temperature=0.3,
+        return_usage=True,
+    )
+    # chat() 调用失败时返回错误文本且没有用量信息
+    if not usage or not summary:
+        return None
+    return summary.strip()[:max_chars]
+
+
+def _refresh_summary(user_id: int, conversation_id: Optional[str]) -> None:
+    """将最近问答之外、尚未摘要的问答合并进会话摘要（在后台线程中执行）"""
+    lock_key = f"{ChatService._summary_key(user_id, conversation_id)}:lock"
+    if not redis_client.set(lock_key, "1", nx=True, ex=SUMMARY_LOCK_EXPIRE):
+        return
+    try:
+        total = ChatService.get_turn_count(user_id, conversation_id)
+        summary, covered = ChatService.get_summary(user_id, conversation_id)
+        end = total - app_settings.chat_history_context_entries
+        if end - covered < app_settings.chat_summary_batch:
+            return
+
+        # 列表只保留最近的记录，按累计条数换算出待摘要记录在列表中的位置
+        entries = ChatService.get_history(user_id, conversation_id)
+        first = total - len(entries)
+        turns = entries[max(covered - first, 0) : end - first]
+        if not turns:
+            return
+
+        updated = _summarize(summary, turns)
+        if updated is None:
+            logger.warning(f"会话摘要生成失败: 用户ID {user_id}, 会话 {conversation_id}")
+            return
+        # 摘要期间会话被清除或替换时丢弃结果
+        if ChatService.get_turn_count(user_id, conversation_id) < total:
+            return
+        ChatService.save_summary(user_id, updated, end, conversation_id)
+        logger.info(f"会话摘要已更新: 用户ID {user_id}, 会话 {conversation_id}, 覆盖 {end} 条问答")
+    except Exception as e:
+        logger.error(f"会话摘要更新失败: 用户ID {user_id}, 会话 {conversation_id}, 错误: {e}")
+    finally:
+        redis_client.delete(lock_key)
+
+
+class ConversationMemory:
+    """会话记忆服务类"""
+
+    @staticmethod
+    def load(
+        user_id: int, conversation_id: Optional[str] = None
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        加载 AI 分析所需的会话上下文
+
+        Args:
+            user_id: 用户ID
+            conversation_id: 会话ID，默认会话为 default
+
+        Returns:
+            (会话摘要, 摘要之后的问答记录)；后台摘要尚未追上时多带入几条原文，不丢失上下文
+
+        Raises:
+            ValidationException: 如果会话ID格式无效
+        """
+        summary, covered = ChatService.get_summary(user_id, conversation_id)
+        total = ChatService.get_turn_count(user_id, conversation_id)
+        limit = min(
+            total - covered,
+            app_settings.chat_history_context_entries + app_settings.chat_summary_batch,
+        )
+        if limit <= 0:
+            return summary, []
+        return summary, ChatService.get_history(user_id, conversation_id, limit=limit)
+
+    @staticmethod
+    def schedule_update(user_id: int, conversation_id: Optional[str], total: int) -> bool:
+        """
+        追加问答后调用：最近问答之外累计了足够多的问答时，提交后台增量摘要
+
+        Args:
+            user_id: 用户ID
+            conversation_id: 会话ID
+            total: ChatService.append 返回的累计问答条数
+
+        Returns:
+            是否已提交摘要任务
+        """
+        if total - app_settings.chat_history_context_entries < app_settings.chat_summary_batch:
+            return False
+        _executor.submit(_refresh_summary, user_id, conversation_id)
+        return True
@@ -11,8 +11,11 @@ DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 
 # 从配置中获取DeepSeek参数设置
 try:
-    from core.config import deepseek_settings
+    from core.config import app_settings, deepseek_settings
 
+    # 会话记忆带入的最近问答条数上限（摘要未追上时会多带入 chat_summary_batch 条）
+    HISTORY_MAX_ITEMS = app_settings.chat_history_context_entries + app_settings.chat_summary_batch
+    HISTORY_TURN_MAX_CHARS = app_settings.chat_history_turn_max_chars
     DEFAULT_MAX_TOKENS = deepseek_settings.max_tokens
     DEFAULT_TEMPERATURE = deepseek_settings.temperature
     DEFAULT_TOP_P = deepseek_settings.top_p
@@ -20,6 +23,8 @@ try:
     DEFAULT_PRESENCE_PENALTY = deepseek_settings.presence_penalty
 except ImportError:
     # 如果配置模块不可用，使用默认值
+    HISTORY_MAX_ITEMS = 5
+    HISTORY_TURN_MAX_CHARS = 1500
     DEFAULT_MAX_TOKENS = 8192
     DEFAULT_TEMPERATURE = 0.7
     DEFAULT_TOP_P = 0.95
@@ -29,7 +34,7 @@ except ImportError:
 
 class DeepseekAgent:
     @staticmethod
-    def clean_history(history, max_items=5):
+    def clean_history(history, max_items=HISTORY_MAX_ITEMS):
         """
         清理历史对话，只保留最近的几条有效对话
         """
@@ -59,9 +64,11 @@ class DeepseekAgent:
         return valid_history[-max_items:] if valid_history else None
 
     @staticmethod
-    def build_prompt(flow_data, user_message, history=None, style="专业"):
+    def build_prompt(flow_data, user_message, history=None, style="专业", summary=None):
         """
         优化的prompt构建：优先回答用户的具体问题，然后结合资金流数据给出分析
+
+        summary: 可选，较早对话的摘要（由会话记忆服务生成），与最近对话一起作为上下文
         """
         # 清理历史对话
         cleaned_history = DeepseekAgent.clean_history(history)
@@ -96,25 +103,26 @@ class DeepseekAgent:
    - 避免堆砌过于晦涩的术语，必要时进行解释。
 """
 
+        # 添加较早对话的摘要
+        if summary:
+            prompt += f"\n### 🧠 早期对话摘要\n{summary}\n"
+
         # 添加历史对话上下文
         if cleaned_history:
-            # 只保留关键信息，减少token消耗
+            # 最近问答原文带入（更早的对话已压缩为摘要），超长的单条问答截断
+            def clip(text):
+                if len(text) > HISTORY_TURN_MAX_CHARS:
+                    return text[:HISTORY_TURN_MAX_CHARS] + "..."
+                return text
+
             history_summary = []
             for item in cleaned_history:
-                q = (
-                    item.get("question", "")[:100] + "..."
-                    if len(item.get("question", "")) > 100
-                    else item.get("question", "")
-                )
+                q = clip(str(item.get("question", "")))
                 a = item.get("answer", "")
                 # 处理 answer 可能是 dict 的情况
                 if isinstance(a, dict):
-                    advice = a.get("text") or a.get("advice") or str(a)
-                    a_text = str(advice)[:200]
-                else:
-                    a_text = str(a)[:200]
-
-                history_summary.append(f"User: {q}\nAssistant: {a_text}...")
+                    a = a.get("text") or a.get("advice") or a
+                history_summary.append(f"User: {q}\nAssistant: {clip(str(a))}")
 
             prompt += "\n### 🕒 最近对话上下文\n" + "\n".join(history_summary)
 
@@ -139,6 +147,7 @@ class DeepseekAgent:
         top_p=None,
         frequency_penalty=None,
         presence_penalty=None,
+        return_usage=False,
     ):
         """
         使用 deepseek-chat 模型进行快速对话（非推理模型，速度更快）
@@ -153,9 +162,10 @@ class DeepseekAgent:
             top_p: 核采样参数，控制采样的多样性（0-1，默认0.95）
             frequency_penalty: 频率惩罚，减少重复内容（-2到2，默认0.0）
             presence_penalty: 存在惩罚，鼓励新话题（-2到2，默认0.0）
+            return_usage: 非流式时是否同时返回token用量
 
         Returns:
-            如果 stream=False: 返回完整文本字符串
+            如果 stream=False: 返回完整文本字符串（return_usage=True 时返回 (文本, 用量字典)）
             如果 stream=True: 返回生成器，每次yield文本内容
         """
         client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL)
@@ -211,7 +221,15 @@ class DeepseekAgent:
             else:
                 # 非流式输出，直接返回完整结果
                 response = client.chat.completions.create(**request_payload)
-                return response.choices[0].message.content
+                content = response.choices[0].message.content
+                if return_usage:
+                    usage = response.usage
+                    return content, {
+                        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+                        "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+                    }
+                return content
         except Exception as e:
             import traceback
 
@@ -223,6 +241,8 @@ class DeepseekAgent:
                     yield f"AI服务调用失败: {str(err)}"
 
                 return error_gen()
+            elif return_usage:
+                return f"AI服务调用失败: {str(e)}", {}
             else:
                 return f"AI服务调用失败: {str(e)}"
 
@@ -237,6 +257,7 @@ class DeepseekAgent:
         top_p=None,
         frequency_penalty=None,
         presence_penalty=None,
+        summary=None,
     ):
         """
         非流式分析，直接返回完整结果
@@ -252,6 +273,7 @@ class DeepseekAgent:
             top_p: 核采样参数，控制采样的多样性（0-1，默认0.95）
             frequency_penalty: 频率惩罚，减少重复内容（-2到2，默认0.0）
             presence_penalty: 存在惩罚，鼓励新话题（-2到2，默认0.0）
+            summary: 较早对话的摘要（可选）
         """
         full_text = ""
         full_thinking = ""
@@ -268,6 +290,7 @@ class DeepseekAgent:
                 top_p,
                 frequency_penalty,
                 presence_penalty,
+                summary,
             )
 
             for chunk in stream:
@@ -294,6 +317,7 @@ class DeepseekAgent:
         top_p=None,
         frequency_penalty=None,
         presence_penalty=None,
+        summary=None,
     ):
         """
         流式分析，支持区分 Thinking 和 text
@@ -310,8 +334,9 @@ class DeepseekAgent:
             top_p: 核采样参数，控制采样的多样性（0-1，默认0.95）
             frequency_penalty: 频率惩罚，减少重复内容（-2到2，默认0.0）
             presence_penalty: 存在惩罚，鼓励新话题（-2到2，默认0.0）
+            summary: 较早对话的摘要（可选）
         """
-        prompt = DeepseekAgent.build_prompt(flow_data, user_message, history, style)
+        prompt = DeepseekAgent.build_prompt(flow_data, user_message, history, style, summary)
 
         # 使用配置的默认值或传入的参数
         if max_tokens is None:
@@ -0,0 +1,195 @@
+"""
+多表联合分析模块
+并发加载多张资金流表，并行构建每张表的摘要，必要时对摘要做 map-reduce 以控制上下文长度
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from core.config import app_settings
+
+from services.ai.deepseek import DeepseekAgent
+from services.flow.flow_data_query import load_table_data
+
+logger = logging.getLogger(__name__)
+
+# 单表摘要交给 deepseek-chat 压缩时的输出上限，保证汇总阶段的输入足够小
+MAP_MAX_TOKENS = 600
+
+
+def slim_flow_data(flow_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    只保留核心字段，防止token溢出
+
+    Args:
+        flow_data: load_table_data 返回的结构化数据
+
+    Returns:
+        精简后的数据列表
+    """
+    slim_data = []
+    for d in flow_data:
+        item_data = d.get("data", {})
+        slim_data.append(
+            {
+                "type": d.get("type"),
+                "flow_type": d.get("flow_type"),
+                "market_type": d.get("market_type"),
+                "period": d.get("period"),
+                "data": {
+                    "code": item_data.get("code"),
+                    "name": item_data.get("name"),
+                    "main_flow_net_amount": item_data.get("main_flow_net_amount"),
+                    "main_flow_net_percentage": item_data.get("main_flow_net_percentage"),
+                    "change_percentage": item_data.get("change_percentage"),
+                    "crawl_time": item_data.get("crawl_time"),
+                },
+            }
+        )
+    return slim_data
+
+
+def build_table_digest(
+    table_name: str, flow_data: List[Dict[str, Any]], top_n: int = 5
+) -> Dict[str, Any]:
+    """
+    构建单张表的统计摘要
+
+    Args:
+        table_name: 表名
+        flow_data: 该表的结构化数据
+        top_n: 保留主力净流入/净流出前N名
+
+    Returns:
+        摘要字典；表不存在或无数据时 missing 为 True
+    """
+    if not flow_data:
+        return {"table": table_name, "missing": True}
+
+    first = flow_data[0]
+    items = [d.get("data", {}) for d in flow_data]
+
+    def net(item: Dict[str, Any]) -> float:
+        return item.get("main_flow_net_amount") or 0.0
+
+    def brief(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "code": item.get("code"),
+            "name": item.get("name"),
+            "main_flow_net_amount": item.get("main_flow_net_amount"),
+            "main_flow_net_percentage": item.get("main_flow_net_percentage"),
+            "change_percentage": item.get("change_percentage"),
+        }
+
+    changes = [item.get("change_percentage") or 0.0 for item in items]
+    ranked = sorted(items, key=net, reverse=True)
+
+    return {
+        "table": table_name,
+        "missing": False,
+        "flow_type": first.get("flow_type"),
+        "market_type": first.get("market_type"),
+        "period": first.get("period"),
+        "count": len(items),
+        "crawl_time": max(str(item.get("crawl_time") or "") for item in items),
+        "total_inflow": round(sum(net(i) for i in items if net(i) > 0), 2),
+        "total_outflow": round(sum(net(i) for i in items if net(i) < 0), 2),
+        "inflow_count": sum(1 for i in items if net(i) > 0),
+        "avg_change_percentage": round(sum(changes) / len(changes), 2),
+        "top_inflow": [brief(i) for i in ranked[:top_n] if net(i) > 0],
+        "top_outflow": [brief(i) for i in reversed(ranked[-top_n:]) if net(i) < 0],
+    }
+
+
+def _load_digest(table_name: str, limit: int, top_n: int) -> Dict[str, Any]:
+    """加载单张表并构建摘要（在工作线程中执行）"""
+    try:
+        flow_data = load_table_data(table_name, limit=limit)
+    except Exception as e:
+        logger.error(f"加载表 {table_name} 失败: {e}", exc_info=True)
+        flow_data = []
+    return build_table_digest(table_name, flow_data, top_n=top_n)
+
+
+def load_table_digests(
+    table_names: List[str], limit: Optional[int] = None, top_n: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    并发加载多张表并构建摘要（fan-out/fan-in），结果顺序与 table_names 一致
+
+    Args:
+        table_names: 表名列表
+        limit: 每张表加载条数，默认使用配置值
+        top_n: 摘要保留前N名，默认使用配置值
+
+    Returns:
+        摘要列表
+    """
+    if not table_names:
+        return []
+    limit = limit or app_settings.ai_multi_table_row_limit
+    top_n = top_n or app_settings.ai_multi_table_top_n
+    workers = max(1, min(len(table_names), app_settings.ai_multi_table_workers))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-table") as pool:
+        return list(pool.map(lambda t: _load_digest(t, limit, top_n), table_names))
+
+
+def _summarize_digest(digest: Dict[str, Any]) -> Dict[str, Any]:
+    """map 阶段：用 deepseek-chat 将单表摘要压缩为简短结论"""
+    if digest.get("missing"):
+        return digest
+    prompt = (
+        "请用不超过300字概括以下资金流表摘要的关键结论，"
+        "包括整体资金方向、主力流入/流出最集中的标的及涨跌表现，只输出结论正文：\n"
+        + json.dumps(digest, ensure_ascii=False)
+    )
+    summary = DeepseekAgent.chat(
+        user_message=prompt,
+        system_message="你是一名专业金融分析师，善于提炼资金流数据要点。",
+        stream=False,
+        max_tokens=MAP_MAX_TOKENS,
+    )
+    return {
+        **{
+            key: digest[key]
+            for key in ("table", "missing", "flow_type", "market_type", "period", "crawl_time")
+        },
+        "summary": summary,
+    }
+
+
+def map_table_digests(digests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    并发对每张表的摘要做 map 压缩，结果顺序与输入一致
+
+    Args:
+        digests: load_table_digests 返回的摘要列表
+
+    Returns:
+        压缩后的摘要列表
+    """
+    if not digests:
+        return []
+    workers = max(1, min(len(digests), app_settings.ai_multi_table_workers))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-map") as pool:
+        return list(pool.map(_summarize_digest, digests))
+
+
+def should_map_reduce(digests: List[Dict[str, Any]]) -> bool:
+    """摘要总长度超过配置阈值时需要先做 map 压缩"""
+    size = len(json.dumps(digests, ensure_ascii=False))
+    return size > app_settings.ai_multi_table_max_chars
+
+
+def build_multi_table_message(user_message: Optional[str], table_names: List[str]) -> str:
+    """构建多表对比分析的用户问题"""
+    tables = "、".join(table_names)
+    instruction = (
+        f"以下数据为 {tables} 共 {len(table_names)} 张资金流表的摘要，"
+        "请对比各市场/周期的资金方向、主力动向与涨跌表现的异同，并给出综合结论。"
+    )
+    if user_message:
+        return f"{user_message}\n\n{instruction}"
+    return instruction
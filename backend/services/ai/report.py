@@ -1,8 +1,6 @@
-import json
-import os
 from datetime import datetime, timedelta, timezone
 
-from core.storage import minio_storage
+from core.storage import IterableReader, minio_storage
 
 from services.ai.deepseek import DeepseekAgent
 
@@ -34,7 +32,29 @@ def chat_history_to_markdown(chat_history):
     return md
 
 
-def generate_report(table_name, chat_history, user_id=None):
+def generate_report(table_name, chat_history, user_id=None, on_progress=None, on_token=None):
+    """
+    流式生成报告并直接以分片上传写入MinIO（不产生临时文件）
+
+    deepseek-chat 的流式输出经 IterableReader 直接被 put_object 拉取上传，
+    每个 token 同时通过 on_token 回调转发，客户端可在对象写入期间实时看到内容。
+
+    Args:
+        table_name: 表名
+        chat_history: 聊天历史
+        user_id: 用户ID（可选，仅用于日志；报告记录由调用方通过 ReportService.add_report 写入）
+        on_progress: 进度回调（可选），依次以 prompting/generating/uploading 调用
+        on_token: token回调（可选），每收到一段生成内容调用一次
+
+    Returns:
+        (file_name, file_url)
+    """
+
+    def report_progress(stage):
+        if on_progress:
+            on_progress(stage)
+
+    report_progress("prompting")
     # 整理对话为md
     md_content = chat_history_to_markdown(chat_history)
     # 新prompt：直接生成最终结构化投资分析报告，不再要求补充，不嵌套markdown
@@ -46,39 +66,24 @@ def generate_report(table_name, chat_history, user_id=None):
     )
     # 使用 deepseek-chat 模型加快响应速度（非推理模型，速度更快）
     system_message = "你是一名专业金融分析师，善于资金流分析和投资建议。"
-    summary_md = DeepseekAgent.chat(
-        user_message=summary_prompt, system_message=system_message, stream=False
-    )
-    # 合并原始对话和AI总结
-    final_md = f"{md_content}\n---\n{summary_md}"
     # 使用东八区时间
     beijing_tz = timezone(timedelta(hours=8))
     now = datetime.now(beijing_tz).strftime("%Y%m%d_%H%M%S")
     file_name = f"report_{table_name}_{now}.md"
-    file_path = os.path.join("/tmp", file_name)
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(final_md)
-    # 上传到MinIO
-    object_name = minio_storage.upload_image(file_path, file_name)
-    file_url = minio_storage.get_image_url(object_name)
-    # 存储到Redis（如有user_id）
-    try:
-        if user_id:
-            from redis import Redis
 
-            redis_kwargs = {
-                "host": os.getenv("REDIS_HOST", "redis"),
-                "port": int(os.getenv("REDIS_PORT", 6379)),
-                "decode_responses": True,
-            }
-            redis_pwd = os.getenv("REDIS_PASSWORD")
-            if redis_pwd:
-                redis_kwargs["password"] = redis_pwd
-            r = Redis(**redis_kwargs)
-            r.lpush(
-                f"report:{user_id}",
-                json.dumps({"url": file_url, "file_name": file_name, "created_at": now}),
-            )
-    except Exception as e:
-        print(f"[report.py] Redis存储报告路径失败: {e}")
-    return file_path, file_name, final_md, file_url
+    def report_chunks():
+        # 先输出原始对话，再输出AI总结
+        yield f"{md_content}\n---\n"
+        report_progress("generating")
+        yield from DeepseekAgent.chat(
+            user_message=summary_prompt, system_message=system_message, stream=True
+        )
+        # 生成结束，剩余缓冲作为最后一个分片提交
+        report_progress("uploading")
+
+    reader = IterableReader(report_chunks(), on_chunk=on_token)
+    object_name = minio_storage.upload_stream(
+        reader, file_name, content_type="text/markdown; charset=utf-8"
+    )
+    file_url = minio_storage.get_image_url(object_name)
+    return file_name, file_url
@@ -0,0 +1,209 @@
+"""
+邮件发送队列模块
+接口只负责入队，后台发送线程复用持久 SMTP 连接批量发送，失败时按指数退避重试
+"""
+
+import logging
+import queue
+import smtplib
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from core.config import app_settings, smtp_settings
+
+from services.exceptions import EmailServiceException
+
+logger = logging.getLogger(__name__)
+
+
+class _OutgoingMail:
+    """待发送的邮件"""
+
+    __slots__ = ("recipient", "content", "attempts")
+
+    def __init__(self, recipient: str, content: str):
+        self.recipient = recipient
+        self.content = content
+        self.attempts = 0
+
+
+class _SMTPConnection:
+    """发送线程持有的持久 SMTP 连接（按需建立，出错或空闲超时后关闭）"""
+
+    def __init__(self):
+        self.server: Optional[smtplib.SMTP] = None
+        self.last_used = 0.0
+
+    def _open(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(
+            smtp_settings.server, smtp_settings.port, timeout=smtp_settings.timeout
+        )
+        if smtp_settings.starttls:
+            server.starttls()
+        server.ehlo()
+        # 本地测试 SMTP 通常不支持 AUTH，此时跳过登录
+        if smtp_settings.user and smtp_settings.password and server.has_extn("auth"):
+            server.login(smtp_settings.user, smtp_settings.password)
+        return server
+
+    def send(self, mail: _OutgoingMail) -> None:
+        if self.server is None:
+            self.server = self._open()
+        try:
+            self.server.sendmail(smtp_settings.user, [mail.recipient], mail.content)
+        except smtplib.SMTPServerDisconnected:
+            # 服务器可能已主动关闭空闲连接，重连后再试一次
+            self.close()
+            self.server = self._open()
+            self.server.sendmail(smtp_settings.user, [mail.recipient], mail.content)
+        self.last_used = time.monotonic()
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_used
+
+    def close(self) -> None:
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            self.server.close()
+        self.server = None
+
+
+def _is_permanent(error: Exception) -> bool:
+    """是否为重试也无法成功的错误（收件人被拒、5xx 响应）"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class EmailQueue:
+    """邮件发送队列（首次入队时启动发送线程）"""
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=app_settings.email_queue_max_size)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stats = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def start(self) -> None:
+        """启动发送线程（重复调用无副作用）"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(app_settings.email_sender_workers):
+                thread = threading.Thread(
+                    target=self._worker, name=f"email-sender-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, recipient: str, content: str) -> None:
+        """
+        将邮件放入发送队列，立即返回
+
+        Args:
+            recipient: 收件人邮箱
+            content: 完整的邮件内容（msg.as_string()）
+
+        Raises:
+            EmailServiceException: 如果发送队列已满
+        """
+        self.start()
+        try:
+            self._queue.put_nowait(_OutgoingMail(recipient, content))
+        except queue.Full as e:
+            raise EmailServiceException("邮件发送繁忙，请稍后再试") from e
+        self._count("enqueued")
+
+    def _requeue(self, mail: _OutgoingMail) -> None:
+        if self._stopping.is_set():
+            return
+        try:
+            self._queue.put_nowait(mail)
+        except queue.Full:
+            self._count("failed")
+            logger.error(f"邮件重试入队失败（队列已满）: {mail.recipient}")
+
+    def _worker(self) -> None:
+        connection = _SMTPConnection()
+        while not self._stopping.is_set():
+            try:
+                batch = [self._queue.get(timeout=1.0)]
+            except queue.Empty:
+                if connection.server is not None and (
+                    connection.idle_for() > app_settings.email_connection_idle_timeout
+                ):
+                    connection.close()
+                continue
+            # 取出已排队的邮件，在同一个连接上连续发送
+            while len(batch) < app_settings.email_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for mail in batch:
+                self._deliver(connection, mail)
+        connection.close()
+
+    def _deliver(self, connection: _SMTPConnection, mail: _OutgoingMail) -> None:
+        mail.attempts += 1
+        try:
+            connection.send(mail)
+            self._count("sent")
+            logger.info(f"验证码邮件已发送: {mail.recipient}")
+            return
+        except Exception as e:
+            # 连接状态未知，下一封邮件重新建立连接
+            connection.close()
+            error = e
+
+        if _is_permanent(error) or mail.attempts >= app_settings.email_max_attempts:
+            self._count("failed")
+            logger.error(
+                f"邮件发送失败: {mail.recipient}, 已尝试 {mail.attempts} 次, 错误: {error}"
+            )
+            return
+        delay = app_settings.email_retry_backoff * 2 ** (mail.attempts - 1)
+        self._count("retried")
+        logger.warning(f"邮件发送失败，{delay:.1f}秒后重试: {mail.recipient}, 错误: {error}")
+        timer = threading.Timer(delay, self._requeue, args=(mail,))
+        timer.daemon = True
+        timer.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止发送线程并关闭连接（应用关闭时调用），未发送的邮件将被丢弃"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if not threads:
+            return
+        self._stopping.set()
+        for thread in threads:
+            thread.join(timeout=timeout)
+        if not self._queue.empty():
+            logger.warning(f"邮件发送队列关闭，丢弃未发送邮件 {self._queue.qsize()} 封")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取队列指标（排队数、已发送、重试、失败次数）"""
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "workers": len(self._threads),
+                **self._stats,
+            }
+
+
+email_queue = EmailQueue()
+
+
+def shutdown_email_queue() -> None:
+    """关闭邮件发送队列（应用关闭时调用）"""
+    email_queue.stop()
@@ -5,12 +5,13 @@
 
 import logging
 import random
-import smtplib
 import string
 from email.header import Header
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import formataddr
+from functools import lru_cache
+from typing import Tuple
 
 from core.cache import redis_client
 from core.config import (
@@ -19,10 +20,17 @@ from core.config import (
     validate_smtp_config,
 )
 
+from services.auth.email_queue import email_queue
 from services.exceptions import EmailServiceException
 
 logger = logging.getLogger(__name__)
 
+# Header().encode() 会将中文正确编码为符合 RFC2047 的格式
+_SENDER_NAME = Header("金融分析小助手", "utf-8").encode()
+
+# 模板骨架中验证码的占位符
+_CODE_MARKER = "\x00CODE\x00"
+
 
 class EmailService:
     """邮件服务类"""
@@ -30,24 +38,21 @@ class EmailService:
     @staticmethod
     def send_code(email: str, code: str) -> None:
         """
-        发送验证码邮件
+        发送验证码邮件（异步：放入发送队列后立即返回）
 
         Args:
             email: 收件人邮箱
             code: 验证码
 
         Raises:
-            EmailServiceException: 如果SMTP配置不完整或发送失败
+            EmailServiceException: 如果SMTP配置不完整或发送队列已满
         """
         # 验证配置
         is_valid, error_msg = validate_smtp_config()
         if not is_valid:
             raise EmailServiceException(error_msg)
 
-        smtp_server = SMTP_CONFIG["server"]
-        smtp_port = SMTP_CONFIG["port"]
         smtp_user = SMTP_CONFIG["user"]
-        smtp_password = SMTP_CONFIG["password"]
 
         # 构建邮件内容 (MIMEMultipart alternative allows both text and html)
         msg = MIMEMultipart("alternative")
@@ -61,8 +66,6 @@ class EmailService:
             f"—— 金融分析小助手\n"
         )
 
-        # HTML version
-
         # HTML version
         html_content = EmailService.get_email_template(code)
 
@@ -73,37 +76,18 @@ class EmailService:
         msg.attach(part2)
 
         # 使用 formataddr 正确格式化 From 头，符合 RFC5322 标准
-        # Header().encode() 会将中文正确编码为符合 RFC2047 的格式
-        encoded_sender_name = Header("金融分析小助手", "utf-8").encode()
-        msg["From"] = formataddr((encoded_sender_name, smtp_user))
+        msg["From"] = formataddr((_SENDER_NAME, smtp_user))
         msg["To"] = email
         msg["Subject"] = Header("智能金融数据采集分析平台验证码", "utf-8")
 
-        try:
-            server = smtplib.SMTP(smtp_server, smtp_port, timeout=10)
-            server.set_debuglevel(0)
-            server.starttls()
-            server.login(smtp_user, smtp_password)
-            server.sendmail(smtp_user, [email], msg.as_string())
-            server.quit()
-            logger.info(f"验证码邮件已发送: {email}")
-        except smtplib.SMTPAuthenticationError as e:
-            raise EmailServiceException(
-                f"SMTP认证失败，请检查用户名和密码（授权码）是否正确: {e}"
-            ) from e
-        except smtplib.SMTPConnectError as e:
-            raise EmailServiceException(
-                f"无法连接到SMTP服务器 {smtp_server}:{smtp_port}，请检查服务器地址和端口: {e}"
-            ) from e
-        except smtplib.SMTPException as e:
-            raise EmailServiceException(f"SMTP错误: {e}") from e
-        except Exception as e:
-            raise EmailServiceException(f"邮件发送失败: {e}") from e
+        # 放入发送队列后立即返回，由后台线程复用 SMTP 连接发送并在失败时重试
+        email_queue.enqueue(email, msg.as_string())
+        logger.debug(f"验证码邮件已入队: {email}")
 
     @staticmethod
     def get_email_template(code: str) -> str:
         """
-        获取邮件HTML模板
+        获取邮件HTML模板（模板骨架只渲染一次并缓存，之后只拼接验证码）
 
         Args:
             code: 验证码
@@ -111,6 +95,12 @@ class EmailService:
         Returns:
             生成的HTML内容
         """
+        prefix, suffix = _email_template_parts()
+        return f"{prefix}{code}{suffix}"
+
+    @staticmethod
+    def _render_email_template(code: str) -> str:
+        """渲染完整的邮件HTML模板"""
         return f"""
 <!DOCTYPE html>
 <html>
@@ -204,3 +194,10 @@ class EmailService:
         else:
             logger.warning(f"验证码验证失败: {email}")
         return is_valid
+
+
+@lru_cache(maxsize=1)
+def _email_template_parts() -> Tuple[str, str]:
+    """渲染邮件模板骨架，按验证码位置拆分为前后两段"""
+    prefix, suffix = EmailService._render_email_template(_CODE_MARKER).split(_CODE_MARKER, 1)
+    return prefix, suffix
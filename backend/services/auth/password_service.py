@@ -0,0 +1,240 @@
+"""
+密码哈希服务模块
+bcrypt 哈希/校验在独立的有界线程池中执行，避免登录高峰占满请求线程池；
+排队超限或等待超时时快速失败，工作因子可配置，修改后在用户登录时自动重新哈希
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict
+
+import bcrypt
+from core.config import app_settings
+
+from services.exceptions import ServiceBusyException
+
+logger = logging.getLogger(__name__)
+
+# bcrypt 只使用密码的前 72 字节
+BCRYPT_MAX_BYTES = 72
+
+BUSY_MESSAGE = "密码校验请求繁忙，请稍后再试"
+
+_executor = ThreadPoolExecutor(
+    max_workers=app_settings.password_hash_workers, thread_name_prefix="password-hash"
+)
+
+
+class _HashStats:
+    """哈希线程池指标（排队深度、拒绝/超时次数、排队与执行耗时）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.run_total = 0.0
+
+
+_stats = _HashStats()
+
+
+# ==================== 线程池中执行的函数 ====================
+
+
+def _encode(password: str) -> bytes:
+    """编码密码，超过 72 字节时截断（bcrypt 限制）"""
+    password_bytes = password.encode("utf-8")
+    if len(password_bytes) > BCRYPT_MAX_BYTES:
+        logger.warning(
+            f"密码超过 {BCRYPT_MAX_BYTES} 字节限制（当前 {len(password_bytes)} 字节），将截断"
+        )
+        password_bytes = password_bytes[:BCRYPT_MAX_BYTES]
+    return password_bytes
+
+
+def _hash(password: str, rounds: int) -> str:
+    """生成 bcrypt 哈希"""
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def _check(password: str, password_hash: str) -> bool:
+    """校验密码，哈希格式无效时返回 False"""
+    try:
+        return bcrypt.checkpw(_encode(password), password_hash.encode("utf-8"))
+    except Exception:
+        return False
+
+
+# ==================== 服务 ====================
+
+
+def _submit(fn: Callable[..., Any], *args: Any) -> Future:
+    """
+    提交任务到哈希线程池
+
+    Raises:
+        ServiceBusyException: 如果排队任务已达上限
+    """
+    with _stats.lock:
+        if _stats.pending >= app_settings.password_hash_max_pending:
+            _stats.rejected += 1
+            raise ServiceBusyException(BUSY_MESSAGE)
+        _stats.pending += 1
+    enqueued = time.perf_counter()
+
+    def run():
+        start = time.perf_counter()
+        with _stats.lock:
+            _stats.running += 1
+            _stats.queue_wait_total += start - enqueued
+            _stats.queue_wait_max = max(_stats.queue_wait_max, start - enqueued)
+        try:
+            return fn(*args)
+        finally:
+            with _stats.lock:
+                _stats.running -= 1
+                _stats.pending -= 1
+                _stats.completed += 1
+                _stats.run_total += time.perf_counter() - start
+
+    try:
+        return _executor.submit(run)
+    except Exception:
+        with _stats.lock:
+            _stats.pending -= 1
+        raise
+
+
+def _on_timeout(future: Future) -> ServiceBusyException:
+    """等待超时：尚未开始执行的任务直接取消，避免继续占用线程池"""
+    with _stats.lock:
+        _stats.timeouts += 1
+    if future.cancel():
+        with _stats.lock:
+            _stats.pending -= 1
+    return ServiceBusyException(BUSY_MESSAGE)
+
+
+def _wait(future: Future) -> Any:
+    """同步等待任务结果（超时抛出 ServiceBusyException）"""
+    try:
+        return future.result(timeout=app_settings.password_hash_timeout)
+    except FutureTimeoutError:
+        raise _on_timeout(future) from None
+
+
+async def _await(future: Future) -> Any:
+    """异步等待任务结果，不占用事件循环和请求线程池（超时抛出 ServiceBusyException）"""
+    try:
+        return await asyncio.wait_for(
+            asyncio.wrap_future(future), timeout=app_settings.password_hash_timeout
+        )
+    except asyncio.TimeoutError:
+        raise _on_timeout(future) from None
+
+
+class PasswordService:
+    """密码哈希服务类"""
+
+    @staticmethod
+    def hash_password(password: str) -> str:
+        """
+        使用当前配置的工作因子生成 bcrypt 哈希
+
+        Args:
+            password: 原始密码
+
+        Returns:
+            哈希后的密码字符串
+
+        Raises:
+            ServiceBusyException: 如果哈希线程池繁忙
+        """
+        return _wait(_submit(_hash, password, app_settings.password_bcrypt_rounds))
+
+    @staticmethod
+    def verify_password(password: str, password_hash: str) -> bool:
+        """
+        校验密码
+
+        Raises:
+            ServiceBusyException: 如果哈希线程池繁忙
+        """
+        return _wait(_submit(_check, password, password_hash))
+
+    @staticmethod
+    async def averify_password(password: str, password_hash: str) -> bool:
+        """
+        校验密码（异步版本）
+
+        Raises:
+            ServiceBusyException: 如果哈希线程池繁忙
+        """
+        return await _await(_submit(_check, password, password_hash))
+
+    @staticmethod
+    def needs_rehash(password_hash: str) -> bool:
+        """哈希的工作因子是否与当前配置不同（$2b$<rounds>$...）"""
+        try:
+            return int(password_hash.split("$")[2]) != app_settings.password_bcrypt_rounds
+        except (IndexError, ValueError):
+            return False
+
+    @staticmethod
+    def schedule_rehash(password: str, on_done: Callable[[str], None]) -> bool:
+        """
+        后台使用当前工作因子重新哈希，完成后在线程池中调用 on_done(新哈希)
+
+        线程池繁忙时跳过（下次登录再处理），不影响本次登录
+
+        Returns:
+            是否已提交
+        """
+
+        def rehash():
+            try:
+                on_done(_hash(password, app_settings.password_bcrypt_rounds))
+            except Exception as e:
+                logger.warning(f"密码重新哈希失败: {e}")
+
+        try:
+            _submit(rehash)
+        except ServiceBusyException:
+            return False
+        return True
+
+    @staticmethod
+    def get_metrics() -> Dict[str, Any]:
+        """
+        获取哈希线程池指标
+
+        Returns:
+            包含 workers、queue_depth、running、completed、rejected、timeouts、平均/最大排队时间的字典
+        """
+        with _stats.lock:
+            return {
+                "workers": app_settings.password_hash_workers,
+                "rounds": app_settings.password_bcrypt_rounds,
+                "queue_depth": _stats.pending - _stats.running,
+                "running": _stats.running,
+                "max_pending": app_settings.password_hash_max_pending,
+                "completed": _stats.completed,
+                "rejected": _stats.rejected,
+                "timeouts": _stats.timeouts,
+                "queue_wait_avg_ms": round(_stats.queue_wait_total / _stats.completed * 1000, 3)
+                if _stats.completed
+                else 0,
+                "queue_wait_max_ms": round(_stats.queue_wait_max * 1000, 3),
+                "run_avg_ms": round(_stats.run_total / _stats.completed * 1000, 3)
+                if _stats.completed
+                else 0,
+            }
@@ -3,42 +3,78 @@
 处理用户注册、登录、密码管理等业务逻辑
 """
 
+import json
 import logging
-from typing import Optional
-
-import bcrypt
-from core.database import get_db_session
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from core.cache import redis_client
+from core.config import app_settings
+from core.database import get_async_db_session, get_db_session
 from models.models import User
+from sqlalchemy import select, update
 
+from services.auth.password_service import PasswordService
 from services.exceptions import UserServiceException
 
 logger = logging.getLogger(__name__)
 
 
-def _hash_password(password: str) -> str:
-    """
-    对密码进行 bcrypt 哈希
-
-    Args:
-        password: 原始密码
-
-    Returns:
-        哈希后的密码字符串
-
-    Note:
-        bcrypt 限制密码不能超过 72 字节，如果超过会自动截断
-    """
-    # bcrypt 限制密码不能超过 72 字节
-    password_bytes = password.encode("utf-8")
-    if len(password_bytes) > 72:
-        logger.warning(f"密码超过 72 字节限制（当前 {len(password_bytes)} 字节），将截断到 72 字节")
-        password_bytes = password_bytes[:72]
+# 登录身份缓存保存的用户字段（不含密码哈希）
+_PRINCIPAL_FIELDS = ("id", "email", "username", "is_admin", "is_active", "created_at")
+
+
+class _PrincipalCache:
+    """进程内登录身份 TTL 缓存（JWT subject -> 用户字段）"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.items: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.items.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        with self.lock:
+            if len(self.items) >= self.max_entries:
+                # 先清理过期条目，仍然超限时淘汰最早写入的条目
+                for k in [k for k, (expires, _) in self.items.items() if expires < now]:
+                    del self.items[k]
+                while len(self.items) >= self.max_entries:
+                    del self.items[next(iter(self.items))]
+            self.items[key] = (now + self.ttl, value)
+
+    def pop(self, key: str) -> None:
+        with self.lock:
+            self.items.pop(key, None)
+
+
+_principal_cache = _PrincipalCache(
+    app_settings.auth_principal_local_ttl, app_settings.auth_principal_local_max_entries
+)
+
+# 仅当代数与读取数据库前一致时写入，避免在 invalidate_principal 之后写回旧身份；
+# 已有缓存时不覆盖（NX）。返回 1 写入，0 已存在，-1 代数已变化
+# KEYS[1]: 身份缓存 key, KEYS[2]: 代数 key；ARGV: 读取前的代数, 过期秒数, 身份 JSON
+_SET_PRINCIPAL_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return -1
+end
+if redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[2], 'NX') then
+    return 1
+end
+return 0
+"""
 
-    # 直接使用 bcrypt 库生成哈希，避免 passlib 初始化问题
-    salt = bcrypt.gensalt()
-    password_hash = bcrypt.hashpw(password_bytes, salt)
-    # bcrypt.hashpw 返回 bytes，需要解码为字符串
-    return password_hash.decode("utf-8")
+_set_principal = redis_client.register_script(_SET_PRINCIPAL_SCRIPT)
 
 
 class UserService:
@@ -63,7 +99,7 @@ class UserService:
             if session.query(User).filter_by(email=email).first():
                 raise UserServiceException("邮箱已注册")
 
-            password_hash = _hash_password(password)
+            password_hash = PasswordService.hash_password(password)
             user = User(email=email, password_hash=password_hash)
             session.add(user)
             logger.info(f"用户注册成功: {email}")
@@ -72,7 +108,7 @@ class UserService:
     @staticmethod
     def verify_password(email: str, password: str) -> bool:
         """
-        验证用户密码
+        验证用户密码（bcrypt 校验在密码哈希线程池中执行）
 
         Args:
             email: 用户邮箱
@@ -80,32 +116,70 @@ class UserService:
 
         Returns:
             True if password is correct, False otherwise
+
+        Raises:
+            ServiceBusyException: 如果密码哈希线程池繁忙
         """
-        with get_db_session() as session:
-            user = session.query(User).filter_by(email=email).first()
-            if not user:
-                return False
-            # 使用 bcrypt 库验证密码
-            password_bytes = password.encode("utf-8")
-            if len(password_bytes) > 72:
-                password_bytes = password_bytes[:72]
-            try:
-                return bcrypt.checkpw(password_bytes, user.password_hash.encode("utf-8"))
-            except Exception:
-                return False
+        with get_db_session(auto_commit=False) as session:
+            row = session.query(User.id, User.password_hash).filter_by(email=email).first()
+        if not row:
+            return False
+        ok = PasswordService.verify_password(password, row.password_hash)
+        if ok:
+            UserService._rehash_if_needed(row.id, password, row.password_hash)
+        return ok
 
     @staticmethod
-    def get_user(email: str) -> Optional[User]:
+    async def averify_password(email: str, password: str) -> bool:
+        """
+        验证用户密码（异步版本，等待校验结果时不占用请求线程）
+
+        Raises:
+            ServiceBusyException: 如果密码哈希线程池繁忙
+        """
+        async with get_async_db_session(auto_commit=False) as session:
+            result = await session.execute(
+                select(User.id, User.password_hash).filter_by(email=email).limit(1)
+            )
+            row = result.first()
+        if not row:
+            return False
+        ok = await PasswordService.averify_password(password, row.password_hash)
+        if ok:
+            UserService._rehash_if_needed(row.id, password, row.password_hash)
+        return ok
+
+    @staticmethod
+    def _rehash_if_needed(user_id: int, password: str, password_hash: str) -> None:
+        """工作因子配置变更后，登录成功时在后台使用新的工作因子重新哈希"""
+        if not PasswordService.needs_rehash(password_hash):
+            return
+
+        def store(new_hash: str) -> None:
+            # 仅当哈希未被其他请求（如重置密码）修改时才更新
+            with get_db_session() as session:
+                session.execute(
+                    update(User)
+                    .where(User.id == user_id, User.password_hash == password_hash)
+                    .values(password_hash=new_hash)
+                )
+            logger.info(f"用户密码已按新的工作因子重新哈希: 用户ID {user_id}")
+
+        PasswordService.schedule_rehash(password, store)
+
+    @staticmethod
+    def get_user(email: str, use_replica: bool = True) -> Optional[User]:
         """
         根据邮箱获取用户
 
         Args:
             email: 用户邮箱
+            use_replica: 是否允许从只读副本读取（刚写入后需要读到最新数据时传 False）
 
         Returns:
             User object or None
         """
-        with get_db_session() as session:
+        with get_db_session(readonly=use_replica) as session:
             user = session.query(User).filter_by(email=email).first()
             if user:
                 # 在 Session 关闭前访问属性，确保它们被加载
@@ -118,6 +192,93 @@ class UserService:
                 session.expunge(user)
             return user
 
+    @staticmethod
+    def _principal_key(email: str) -> str:
+        """Redis 中登录身份缓存的 key"""
+        return f"auth:principal:{email}"
+
+    @staticmethod
+    def _principal_gen_key(email: str) -> str:
+        """登录身份缓存的代数 key，每次失效时递增"""
+        return f"auth:principal:{email}:gen"
+
+    @staticmethod
+    def get_principal(email: str) -> Optional[User]:
+        """
+        解析登录身份（JWT subject），依次读取进程内缓存、Redis、主库
+
+        Args:
+            email: 用户邮箱（JWT 的 sub）
+
+        Returns:
+            与 Session 无关的 User 对象（只包含身份字段），用户不存在时返回 None
+        """
+        data = _principal_cache.get(email)
+        if data is None:
+            key = UserService._principal_key(email)
+            gen_key = UserService._principal_gen_key(email)
+            generation = None
+            try:
+                # 代数须在读取数据库之前获取，期间发生的失效会使后续写入被拒绝
+                cached, generation = redis_client.mget(key, gen_key)
+                data = json.loads(cached) if cached else None
+            except Exception as e:
+                logger.warning(f"读取登录身份缓存失败: {email}, 错误: {e}")
+            if data is None:
+                # 结果会被缓存，读主库避免把副本延迟期间的旧数据固化
+                user = UserService.get_user(email, use_replica=False)
+                if user is None:
+                    return None
+                data = {field: getattr(user, field) for field in _PRINCIPAL_FIELDS}
+                data["created_at"] = user.created_at.isoformat() if user.created_at else None
+                try:
+                    stored = _set_principal(
+                        keys=[key, gen_key],
+                        args=[
+                            generation or "0",
+                            app_settings.auth_principal_cache_expire,
+                            json.dumps(data),
+                        ],
+                    )
+                    if stored == -1:
+                        # 读取期间身份已失效：本次结果仅用于当前请求，不写入任何缓存
+                        return UserService._principal_from_data(data)
+                except Exception as e:
+                    logger.warning(f"写入登录身份缓存失败: {email}, 错误: {e}")
+            _principal_cache.put(email, data)
+
+        return UserService._principal_from_data(data)
+
+    @staticmethod
+    def _principal_from_data(data: Dict[str, Any]) -> User:
+        """由缓存的身份字段构造与 Session 无关的 User 对象"""
+        created_at = data["created_at"]
+        return User(
+            **{
+                **data,
+                "created_at": datetime.fromisoformat(created_at) if created_at else None,
+            }
+        )
+
+    @staticmethod
+    def invalidate_principal(email: str) -> None:
+        """
+        使登录身份缓存失效（用户名变更、删除、权限变更后调用）
+
+        当前进程立即生效；其他进程的进程内缓存最迟在 auth_principal_local_ttl 秒后失效。
+        同时递增代数，失效前已开始读取数据库的请求不会把旧身份写回 Redis
+        """
+        _principal_cache.pop(email)
+        try:
+            gen_key = UserService._principal_gen_key(email)
+            pipe = redis_client.pipeline()
+            pipe.delete(UserService._principal_key(email))
+            pipe.incr(gen_key)
+            pipe.expire(gen_key, app_settings.auth_principal_cache_expire)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"清除登录身份缓存失败: {email}, 错误: {e}")
+
     @staticmethod
     def set_password(email: str, new_password: str) -> bool:
         """
@@ -138,7 +299,7 @@ class UserService:
             if not user:
                 raise UserServiceException("用户不存在")
 
-            user.password_hash = _hash_password(new_password)
+            user.password_hash = PasswordService.hash_password(new_password)
             logger.info(f"用户密码已更新: {email}")
             return True
 
@@ -180,9 +341,12 @@ class UserService:
 
             # TODO: 考虑关联数据的处理，目前采用级联删除或置空
             # 如果配置了数据库外键级联删除，这里只需要删除用户
+            email = user.email
             session.delete(user)
-            logger.info(f"用户已删除: ID {user_id}")
-            return True
+        # 提交后再清除缓存，避免并发请求把删除前的数据重新写入缓存
+        UserService.invalidate_principal(email)
+        logger.info(f"用户已删除: ID {user_id}")
+        return True
 
     @staticmethod
     def update_username(user_id: int, username: str | None) -> bool:
@@ -215,8 +379,10 @@ class UserService:
                     raise UserServiceException("用户名已被使用")
 
             user.username = username if username else None
-            logger.info(f"用户名已更新: 用户ID {user_id}, 新用户名: {username or '(清空)'}")
-            return True
+            email = user.email
+        UserService.invalidate_principal(email)
+        logger.info(f"用户名已更新: 用户ID {user_id}, 新用户名: {username or '(清空)'}")
+        return True
 
     @staticmethod
     def user_to_dict(user: User) -> dict:
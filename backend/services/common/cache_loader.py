@@ -0,0 +1,254 @@
+"""
+缓存加载模块
+在 CacheService 之上提供防击穿的读取：进程内 single-flight 合并并发未命中，
+Redis 锁保证多进程同一时刻只有一个加载；临近过期时按概率提前刷新（XFetch），
+过期后在宽限期内先返回旧值并在后台刷新（stale-while-revalidate）；
+加载结果为空时不缓存，只写入短期标记让等待锁的进程立即返回
+"""
+
+import asyncio
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core.cache import redis_client
+from core.config import app_settings
+
+from services.common.cache_service import deserialize_value, serialize_value
+
+logger = logging.getLogger(__name__)
+
+# 释放锁时校验持有者，避免误删其他进程在锁过期后重新获取的锁
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 等待其他进程加载时的轮询间隔（秒）
+LOCK_POLL_INTERVAL = 0.05
+
+# 读取结果状态
+HIT = "hit"
+STALE = "stale"
+MISS = "miss"
+
+
+class _LoaderStats:
+    """缓存加载指标"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "loads": 0,
+            "early_refreshes": 0,
+            "background_refreshes": 0,
+            "load_errors": 0,
+        }
+
+    def incr(self, name: str) -> None:
+        with self.lock:
+            self.counts[name] += 1
+
+
+_stats = _LoaderStats()
+_release_lock = redis_client.register_script(_RELEASE_LOCK_SCRIPT)
+
+# 进程内 single-flight：key -> 正在进行的加载任务（同时持有任务引用，避免被回收）
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+def _read(key: str) -> Optional[Dict[str, Any]]:
+    """读取缓存信封 {"v": 值, "t": 写入时间, "d": 加载耗时}，Redis 异常时视为未命中"""
+    try:
+        raw = redis_client.get(key)
+        return deserialize_value(raw) if raw else None
+    except Exception as e:
+        logger.warning(f"读取缓存失败: {key}, 错误: {e}")
+        return None
+
+
+def _write(key: str, value: Any, delta: float, ttl: int, stale_ttl: int) -> None:
+    """写入缓存信封，Redis 过期时间为 新鲜期 + 宽限期"""
+    envelope = {"v": value, "t": time.time(), "d": delta}
+    try:
+        redis_client.setex(key, ttl + stale_ttl, serialize_value(envelope))
+    except Exception as e:
+        logger.warning(f"写入缓存失败: {key}, 错误: {e}")
+
+
+def _empty_key(key: str) -> str:
+    return f"{key}:empty"
+
+
+def _read_empty(key: str) -> Optional[Dict[str, Any]]:
+    """读取空结果标记 {"v": 空值, "t": 写入时间}，Redis 异常时视为不存在"""
+    try:
+        raw = redis_client.get(_empty_key(key))
+        return deserialize_value(raw) if raw else None
+    except Exception as e:
+        logger.warning(f"读取空结果标记失败: {key}, 错误: {e}")
+        return None
+
+
+def _write_empty(key: str, value: Any) -> None:
+    """
+    写入短期空结果标记：空结果不进入缓存信封（避免覆盖旧值或固定临时状态），
+    但需告知等待锁的其他进程本次加载已完成，避免其轮询到超时后再各自查询数据库
+    """
+    envelope = {"v": value, "t": time.time()}
+    try:
+        redis_client.setex(
+            _empty_key(key), app_settings.flow_cache_empty_ttl, serialize_value(envelope)
+        )
+    except Exception as e:
+        logger.warning(f"写入空结果标记失败: {key}, 错误: {e}")
+
+
+def _should_refresh_early(envelope: Dict[str, Any], ttl: int) -> bool:
+    """
+    XFetch：离过期越近、加载越慢，越可能提前刷新
+    条件为 now - d * beta * ln(rand) >= 写入时间 + ttl
+    """
+    beta = app_settings.flow_cache_early_refresh_beta
+    if beta <= 0:
+        return False
+    gap = -envelope.get("d", 0.0) * beta * math.log(1.0 - random.random())
+    return time.time() + gap >= envelope["t"] + ttl
+
+
+async def _load_and_store(
+    key: str, loader: Callable[[], Awaitable[Any]], ttl: int, stale_ttl: int
+) -> Any:
+    """
+    持有 Redis 锁时执行加载并写入缓存；锁被其他进程持有时等待其结果，超时后自行加载
+    """
+    lock_key = f"{key}:lock"
+    token = uuid.uuid4().hex
+    timeout = app_settings.flow_cache_lock_timeout
+    try:
+        locked = redis_client.set(lock_key, token, nx=True, px=int(timeout * 1000))
+    except Exception as e:
+        logger.warning(f"获取缓存锁失败，直接加载: {key}, 错误: {e}")
+        locked = True
+        token = None
+
+    if not locked:
+        started = time.time()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            envelope = _read(key)
+            if envelope is not None and time.time() - envelope["t"] < ttl:
+                return envelope["v"]
+            # 持锁进程加载结果为空：只接受开始等待之后写入的标记
+            empty = _read_empty(key)
+            if empty is not None and empty["t"] >= started:
+                return empty["v"]
+        logger.warning(f"等待其他进程加载缓存超时，直接加载: {key}")
+
+    try:
+        _stats.incr("loads")
+        start = time.perf_counter()
+        value = await loader()
+        # 空结果（表不存在/采集中）不缓存，避免把临时状态固定下来；仅写入短期标记通知等待者
+        if value:
+            _write(key, value, time.perf_counter() - start, ttl, stale_ttl)
+        else:
+            _write_empty(key, value)
+        return value
+    finally:
+        if locked and token:
+            try:
+                _release_lock(keys=[lock_key], args=[token])
+            except Exception as e:
+                logger.warning(f"释放缓存锁失败: {lock_key}, 错误: {e}")
+
+
+def _start_load(
+    key: str, loader: Callable[[], Awaitable[Any]], ttl: int, stale_ttl: int
+) -> asyncio.Task:
+    """
+    进程内 single-flight：同一 key 同时只有一个加载任务，其余请求等待同一任务
+    加载在独立任务中执行，发起请求被取消（客户端断开）时不影响其他等待者
+    """
+    task = _inflight.get(key)
+    if task is not None:
+        _stats.incr("coalesced")
+        return task
+
+    task = asyncio.get_running_loop().create_task(_load_and_store(key, loader, ttl, stale_ttl))
+    _inflight[key] = task
+
+    def done(finished: asyncio.Task) -> None:
+        _inflight.pop(key, None)
+        if not finished.cancelled() and finished.exception() is not None:
+            _stats.incr("load_errors")
+            logger.warning(f"加载缓存失败: {key}, 错误: {finished.exception()}")
+
+    task.add_done_callback(done)
+    return task
+
+
+class CacheLoader:
+    """防击穿缓存加载类"""
+
+    @staticmethod
+    async def aget_or_load(
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+    ) -> Tuple[Any, str]:
+        """
+        读取缓存，未命中时加载；数据库在每个 key 的每次过期中只会收到一次刷新查询
+
+        Args:
+            key: 缓存 key
+            loader: 异步加载函数（通常为数据库查询）
+            ttl: 新鲜期（秒），默认 flow_cache_ttl
+            stale_ttl: 过期后仍可返回旧值的宽限期（秒），默认 flow_cache_stale_ttl
+
+        Returns:
+            (值, 状态)，状态为 hit / stale / miss
+        """
+        ttl = ttl or app_settings.flow_cache_ttl
+        stale_ttl = app_settings.flow_cache_stale_ttl if stale_ttl is None else stale_ttl
+
+        envelope = _read(key)
+        if envelope is not None:
+            if time.time() - envelope["t"] < ttl:
+                _stats.incr("hits")
+                if key not in _inflight and _should_refresh_early(envelope, ttl):
+                    _stats.incr("early_refreshes")
+                    _start_load(key, loader, ttl, stale_ttl)
+                return envelope["v"], HIT
+            # 已过新鲜期但仍在宽限期内：先返回旧值，后台刷新（失败时继续使用旧值）
+            _stats.incr("stale_hits")
+            if key not in _inflight:
+                _stats.incr("background_refreshes")
+                _start_load(key, loader, ttl, stale_ttl)
+            return envelope["v"], STALE
+
+        _stats.incr("misses")
+        return await asyncio.shield(_start_load(key, loader, ttl, stale_ttl)), MISS
+
+    @staticmethod
+    def invalidate(key: str) -> None:
+        """删除缓存（数据更新后调用）"""
+        redis_client.delete(key, _empty_key(key))
+
+    @staticmethod
+    def get_metrics() -> Dict[str, Any]:
+        """获取缓存加载指标（命中、旧值命中、未命中、合并、实际加载次数等）"""
+        with _stats.lock:
+            return {**_stats.counts, "inflight": len(_inflight)}
@@ -1,18 +1,55 @@
 """
 缓存服务模块
 处理Redis缓存操作
+批量接口使用 pipeline / MGET / HMGET，成千上万个代码的写入和读取只需少量往返
 """
 
+import hashlib
 import json
 import logging
-from typing import Optional
+import time
+from typing import Any, Dict, Iterable, List, Optional
 
 from core.cache import redis_client
-from core.config import CACHE_EXPIRE
+from core.config import CACHE_EXPIRE, app_settings
+
+try:
+    import orjson
+except ImportError:
+    # orjson 为可选依赖，未安装时使用标准库 json（两者输出互相兼容）
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
 
+def serialize_value(data: Any) -> str:
+    """序列化缓存值（紧凑格式，datetime 等非 JSON 类型转为字符串）"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def deserialize_value(value: str) -> Any:
+    """反序列化缓存值"""
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
+
+
+def _flow_key(code: str, flow_type: str, market_type: str, period: str) -> str:
+    return f"flow:{code}:{flow_type}:{market_type}:{period}"
+
+
+def _flow_group_key(flow_type: str, market_type: str, period: str) -> str:
+    """按市场/周期分组的 hash key（field 为代码）"""
+    return f"flowgrp:{flow_type}:{market_type}:{period}"
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
 class CacheService:
     """缓存服务类"""
 
@@ -36,9 +73,9 @@ class CacheService:
             data: 数据字典
             expire: 过期时间（秒），默认使用配置值
         """
-        key = f"flow:{code}:{flow_type}:{market_type}:{period}"
+        key = _flow_key(code, flow_type, market_type, period)
         expire_seconds = expire or CACHE_EXPIRE["flow_data"]
-        redis_client.setex(key, expire_seconds, json.dumps(data))
+        redis_client.setex(key, expire_seconds, serialize_value(data))
         logger.debug(f"资金流数据已缓存: {key}")
 
     @staticmethod
@@ -57,16 +94,109 @@ class CacheService:
         Returns:
             数据字典或None
         """
-        key = f"flow:{code}:{flow_type}:{market_type}:{period}"
+        key = _flow_key(code, flow_type, market_type, period)
         value = redis_client.get(key)
         if value:
             try:
-                return json.loads(value)
-            except json.JSONDecodeError:
+                return deserialize_value(value)
+            except ValueError:
                 logger.error(f"缓存数据JSON解析失败: {key}")
                 return None
         return None
 
+    @staticmethod
+    def cache_flow_data_many(
+        items: List[Dict[str, Any]], expire: Optional[int] = None, grouped: bool = False
+    ) -> int:
+        """
+        批量缓存资金流数据（pipeline 分批发送，每批一次往返）
+
+        Args:
+            items: 数据字典列表，每项需包含 code、flow_type、market_type、period
+            expire: 过期时间（秒），默认使用配置值
+            grouped: 是否按市场/周期写入同一个 hash（每组一条 HSET，整组同时过期）
+
+        Returns:
+            缓存的条数
+        """
+        if not items:
+            return 0
+        expire_seconds = expire or CACHE_EXPIRE["flow_data"]
+        batch_size = app_settings.cache_pipeline_batch_size
+
+        if grouped:
+            groups: Dict[str, Dict[str, str]] = {}
+            for item in items:
+                key = _flow_group_key(item["flow_type"], item["market_type"], item["period"])
+                groups.setdefault(key, {})[item["code"]] = serialize_value(item)
+            # MULTI 中整组替换，读取方不会看到清空后尚未写入的中间状态
+            pipe = redis_client.pipeline()
+            for key, mapping in groups.items():
+                # 删除上一轮采集中已不存在的代码
+                pipe.delete(key)
+                for chunk in _chunks(list(mapping.items()), batch_size):
+                    pipe.hset(key, mapping=dict(chunk))
+                pipe.expire(key, expire_seconds)
+            pipe.execute()
+            logger.debug(f"资金流数据已分组缓存: {len(items)} 条, {len(groups)} 组")
+            return len(items)
+
+        for chunk in _chunks(items, batch_size):
+            pipe = redis_client.pipeline(transaction=False)
+            for item in chunk:
+                key = _flow_key(
+                    item["code"], item["flow_type"], item["market_type"], item["period"]
+                )
+                pipe.setex(key, expire_seconds, serialize_value(item))
+            pipe.execute()
+        logger.debug(f"资金流数据已批量缓存: {len(items)} 条")
+        return len(items)
+
+    @staticmethod
+    def get_cached_flow_data_many(
+        codes: Optional[List[str]],
+        flow_type: str,
+        market_type: str,
+        period: str,
+        grouped: bool = False,
+    ) -> Dict[str, dict]:
+        """
+        批量获取缓存的资金流数据（MGET / HMGET，每批一次往返）
+
+        Args:
+            codes: 股票代码列表；grouped=True 时可传 None 读取整组
+            flow_type: 资金流类型
+            market_type: 市场类型
+            period: 周期
+            grouped: 是否从按市场/周期分组的 hash 读取
+
+        Returns:
+            {代码: 数据字典}，未命中的代码不包含在结果中
+        """
+        if grouped:
+            key = _flow_group_key(flow_type, market_type, period)
+            if codes is None:
+                values = redis_client.hgetall(key)
+            else:
+                values = {}
+                for chunk in _chunks(list(codes), app_settings.cache_pipeline_batch_size):
+                    values.update(zip(chunk, redis_client.hmget(key, chunk)))
+        else:
+            values = {}
+            for chunk in _chunks(list(codes or []), app_settings.cache_pipeline_batch_size):
+                keys = [_flow_key(code, flow_type, market_type, period) for code in chunk]
+                values.update(zip(chunk, redis_client.mget(keys)))
+
+        result = {}
+        for code, value in values.items():
+            if not value:
+                continue
+            try:
+                result[code] = deserialize_value(value)
+            except ValueError:
+                logger.error(f"缓存数据JSON解析失败: {code} {flow_type}:{market_type}:{period}")
+        return result
+
     @staticmethod
     def cache_image_url(
         code: str,
@@ -111,25 +241,128 @@ class CacheService:
         key = f"flowimg:{code}:{flow_type}:{market_type}:{period}"
         return redis_client.get(key)
 
+    @staticmethod
+    def cache_image_urls(entries: List[Dict[str, str]], expire: Optional[int] = None) -> None:
+        """
+        批量缓存图片URL（一次 pipeline 往返）
+
+        Args:
+            entries: 列表项需包含 code、flow_type、market_type、period、image_url
+            expire: 过期时间（秒），默认使用配置值
+        """
+        if not entries:
+            return
+        expire_seconds = expire or CACHE_EXPIRE["image_url"]
+        pipe = redis_client.pipeline(transaction=False)
+        for entry in entries:
+            key = (
+                f"flowimg:{entry['code']}:{entry['flow_type']}:"
+                f"{entry['market_type']}:{entry['period']}"
+            )
+            pipe.setex(key, expire_seconds, entry["image_url"])
+        pipe.execute()
+        logger.debug(f"图片URL已批量缓存: {len(entries)} 条")
+
+
+# ==================== 数据新鲜度登记 ====================
+
+# 每个采集组合（即一张资金流表）一个 hash：version、hash、rows、crawled_at、changed_at
+FRESHNESS_KEY_PREFIX = "freshness:"
+# 已登记的表名集合
+FRESHNESS_INDEX_KEY = "freshness:tables"
+
+# 内容哈希变化时版本号加一；内容不变只更新采集时间和行数
+# KEYS[1]: 表的新鲜度 key, KEYS[2]: 表名集合；ARGV: 内容哈希, 行数, 采集时间戳, 表名
+_RECORD_FRESHNESS_SCRIPT = """
+local version = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+if redis.call('HGET', KEYS[1], 'hash') ~= ARGV[1] then
+    version = version + 1
+    redis.call('HSET', KEYS[1], 'hash', ARGV[1], 'version', version, 'changed_at', ARGV[3])
+end
+redis.call('HSET', KEYS[1], 'rows', ARGV[2], 'crawled_at', ARGV[3])
+redis.call('SADD', KEYS[2], ARGV[4])
+return version
+"""
 
-def set_data_ready(flag: bool) -> None:
+_record_freshness = redis_client.register_script(_RECORD_FRESHNESS_SCRIPT)
+
+
+def content_hash(rows: List[Dict[str, Any]]) -> str:
+    """计算表内容哈希（忽略 crawl_time，内容相同的重复采集哈希不变）"""
+    normalized = [{k: v for k, v in row.items() if k != "crawl_time"} for row in rows]
+    payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _freshness_entry(table_name: str, data: Dict[str, str]) -> Dict[str, Any]:
+    """将 Redis 中的新鲜度记录转换为接口返回格式"""
+    version = int(data["version"])
+    crawled_at = float(data["crawled_at"])
+    changed_at = float(data.get("changed_at", crawled_at))
+    return {
+        "table": table_name,
+        "version": version,
+        "hash": data["hash"],
+        "rows": int(data.get("rows", 0)),
+        "crawled_at": crawled_at,
+        "changed_at": changed_at,
+        # 强 ETag：版本号 + 内容哈希 + 采集时间（响应中的 crawl_time 每次采集都会变化；
+        # Redis 数据丢失后版本号重置也不会与旧 ETag 冲突）
+        "etag": f'"{version}-{data["hash"][:16]}-{int(crawled_at * 1000)}"',
+    }
+
+
+def record_table_freshness(table_name: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    设置数据就绪状态
+    登记一次成功的采集（采集入库后调用）
 
     Args:
-        flag: True表示数据就绪，False表示未就绪
+        table_name: 资金流表名（{flow_type}_{market_type}_{period}）
+        rows: 本次采集入库的数据
+
+    Returns:
+        更新后的新鲜度记录
     """
-    expire_seconds = CACHE_EXPIRE["data_ready"]
-    redis_client.setex("DATA_READY", expire_seconds, "1" if flag else "0")
-    logger.info(f"数据就绪状态已更新: {flag}")
+    key = f"{FRESHNESS_KEY_PREFIX}{table_name}"
+    digest = content_hash(rows)
+    version = _record_freshness(
+        keys=[key, FRESHNESS_INDEX_KEY], args=[digest, len(rows), time.time(), table_name]
+    )
+    logger.debug(f"数据新鲜度已登记: {table_name}, 版本 {version}, {len(rows)} 行")
+    return _freshness_entry(table_name, redis_client.hgetall(key))
+
+
+def get_table_freshness(table_name: str) -> Optional[Dict[str, Any]]:
+    """
+    获取单张表的新鲜度记录
+
+    Returns:
+        包含 version、hash、rows、crawled_at、changed_at（时间戳）、etag 的字典，未登记时返回 None
+    """
+    data = redis_client.hgetall(f"{FRESHNESS_KEY_PREFIX}{table_name}")
+    return _freshness_entry(table_name, data) if data.get("version") else None
+
+
+def get_all_freshness() -> Dict[str, Dict[str, Any]]:
+    """获取所有已登记表的新鲜度记录 {表名: 记录}（一次 pipeline 往返）"""
+    tables = sorted(redis_client.smembers(FRESHNESS_INDEX_KEY))
+    if not tables:
+        return {}
+    pipe = redis_client.pipeline(transaction=False)
+    for table_name in tables:
+        pipe.hgetall(f"{FRESHNESS_KEY_PREFIX}{table_name}")
+    return {
+        table_name: _freshness_entry(table_name, data)
+        for table_name, data in zip(tables, pipe.execute())
+        if data.get("version")
+    }
 
 
 def get_data_ready() -> bool:
     """
-    获取数据就绪状态
+    获取数据就绪状态（兼容旧接口：任意一张表完成过采集即视为就绪）
 
     Returns:
         True if data is ready, False otherwise
     """
-    value = redis_client.get("DATA_READY")
-    return value == "1"
+    return bool(redis_client.scard(FRESHNESS_INDEX_KEY))
@@ -1,64 +1,185 @@
 """
 聊天服务模块
 处理聊天历史记录的存储和查询
+每个会话的历史保存为一个 Redis 列表（每条问答一个元素），追加为 O(1) 并按上限截断；
+较早的问答由 services.ai.conversation_memory 增量摘要后保存在会话摘要中
 """
 
 import json
 import logging
-from typing import Any, Dict, List
+import re
+from typing import Any, Dict, List, Optional, Tuple
 
 from core.cache import redis_client
-from core.config import CACHE_EXPIRE
+from core.config import CACHE_EXPIRE, app_settings
+
+from services.exceptions import ValidationException
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONVERSATION = "default"
+
+_CONVERSATION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
 
 class ChatService:
     """聊天服务类"""
 
     @staticmethod
-    def save_history(user_id: int, history: List[Dict[str, Any]]) -> None:
+    def _conversation(user_id: int, conversation_id: Optional[str] = None) -> str:
+        """
+        会话标识（user_id:conversation_id），用于拼接各类 key
+
+        Raises:
+            ValidationException: 如果会话ID格式无效
+        """
+        conversation_id = conversation_id or DEFAULT_CONVERSATION
+        if not _CONVERSATION_ID_PATTERN.match(conversation_id):
+            raise ValidationException("无效的会话ID")
+        return f"{user_id}:{conversation_id}"
+
+    @staticmethod
+    def _key(user_id: int, conversation_id: Optional[str] = None) -> str:
+        """会话历史列表的 key"""
+        return f"chat:messages:{ChatService._conversation(user_id, conversation_id)}"
+
+    @staticmethod
+    def _turns_key(user_id: int, conversation_id: Optional[str] = None) -> str:
+        """会话累计问答条数的 key（列表会被截断，摘要进度按累计条数记录）"""
+        return f"chat:turns:{ChatService._conversation(user_id, conversation_id)}"
+
+    @staticmethod
+    def _summary_key(user_id: int, conversation_id: Optional[str] = None) -> str:
+        """会话摘要的 key（hash：text 摘要正文，covered 已摘要的累计条数）"""
+        return f"chat:summary:{ChatService._conversation(user_id, conversation_id)}"
+
+    @staticmethod
+    def append(user_id: int, entry: Dict[str, Any], conversation_id: Optional[str] = None) -> int:
+        """
+        追加一条问答记录（超过上限时丢弃最早的记录）
+
+        Args:
+            user_id: 用户ID
+            entry: 问答记录，格式为 {"question": ..., "answer": ...}
+            conversation_id: 会话ID，默认会话为 default
+
+        Returns:
+            会话累计问答条数（包含已被截断的记录）
+        """
+        key = ChatService._key(user_id, conversation_id)
+        turns_key = ChatService._turns_key(user_id, conversation_id)
+        expire = CACHE_EXPIRE["chat_history"]
+        pipe = redis_client.pipeline()
+        pipe.rpush(key, json.dumps(entry, ensure_ascii=False))
+        pipe.ltrim(key, -app_settings.chat_history_max_entries, -1)
+        pipe.expire(key, expire)
+        pipe.incr(turns_key)
+        pipe.expire(turns_key, expire)
+        turns = pipe.execute()[3]
+        logger.debug(f"聊天记录已追加: 用户ID {user_id}, 会话 {conversation_id}")
+        return int(turns)
+
+    @staticmethod
+    def save_history(
+        user_id: int, history: List[Dict[str, Any]], conversation_id: Optional[str] = None
+    ) -> None:
         """
-        保存聊天历史
+        整体替换聊天历史
 
         Args:
             user_id: 用户ID
             history: 聊天历史记录列表
+            conversation_id: 会话ID，默认会话为 default
         """
-        key = f"chat:history:{user_id}"
-        expire_seconds = CACHE_EXPIRE["chat_history"]
-        redis_client.setex(key, expire_seconds, json.dumps(history))
+        key = ChatService._key(user_id, conversation_id)
+        turns_key = ChatService._turns_key(user_id, conversation_id)
+        entries = history[-app_settings.chat_history_max_entries :]
+        pipe = redis_client.pipeline()
+        # 历史整体替换后原有摘要不再对应，重新累计
+        pipe.delete(key, turns_key, ChatService._summary_key(user_id, conversation_id))
+        if entries:
+            pipe.rpush(key, *(json.dumps(item, ensure_ascii=False) for item in entries))
+            pipe.expire(key, CACHE_EXPIRE["chat_history"])
+            pipe.set(turns_key, len(entries), ex=CACHE_EXPIRE["chat_history"])
+        pipe.execute()
         logger.debug(f"聊天历史已保存: 用户ID {user_id}")
 
     @staticmethod
-    def get_history(user_id: int) -> List[Dict[str, Any]]:
+    def get_history(
+        user_id: int, conversation_id: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
         """
         获取聊天历史
 
         Args:
             user_id: 用户ID
+            conversation_id: 会话ID，默认会话为 default
+            limit: 只返回最近的 N 条，None 表示全部
 
         Returns:
-            聊天历史记录列表
+            聊天历史记录列表（按时间顺序）
         """
-        key = f"chat:history:{user_id}"
-        data = redis_client.get(key)
-        if data:
+        key = ChatService._key(user_id, conversation_id)
+        items = redis_client.lrange(key, -limit if limit else 0, -1)
+        history = []
+        for item in items:
             try:
-                return json.loads(data)
+                history.append(json.loads(item))
             except json.JSONDecodeError:
-                logger.error(f"聊天历史JSON解析失败: 用户ID {user_id}")
-                return []
-        return []
+                logger.error(f"聊天记录JSON解析失败: 用户ID {user_id}")
+        return history
+
+    @staticmethod
+    def get_turn_count(user_id: int, conversation_id: Optional[str] = None) -> int:
+        """获取会话累计问答条数（包含已被截断的记录）"""
+        pipe = redis_client.pipeline()
+        pipe.get(ChatService._turns_key(user_id, conversation_id))
+        pipe.llen(ChatService._key(user_id, conversation_id))
+        turns, length = pipe.execute()
+        return max(int(turns or 0), length)
+
+    @staticmethod
+    def get_summary(user_id: int, conversation_id: Optional[str] = None) -> Tuple[str, int]:
+        """
+        获取会话摘要
+
+        Returns:
+            (摘要正文, 已摘要的累计问答条数)，无摘要时返回 ("", 0)
+        """
+        data = redis_client.hgetall(ChatService._summary_key(user_id, conversation_id))
+        return data.get("text", ""), int(data.get("covered", 0))
+
+    @staticmethod
+    def save_summary(
+        user_id: int, summary: str, covered: int, conversation_id: Optional[str] = None
+    ) -> None:
+        """
+        保存会话摘要
+
+        Args:
+            user_id: 用户ID
+            summary: 摘要正文
+            covered: 摘要已覆盖的累计问答条数
+            conversation_id: 会话ID，默认会话为 default
+        """
+        key = ChatService._summary_key(user_id, conversation_id)
+        pipe = redis_client.pipeline()
+        pipe.hset(key, mapping={"text": summary, "covered": covered})
+        pipe.expire(key, CACHE_EXPIRE["chat_history"])
+        pipe.execute()
 
     @staticmethod
-    def clear_history(user_id: int) -> None:
+    def clear_history(user_id: int, conversation_id: Optional[str] = None) -> None:
         """
-        清除聊天历史
+        清除聊天历史（包括会话摘要）
 
         Args:
             user_id: 用户ID
+            conversation_id: 会话ID，默认会话为 default
         """
-        key = f"chat:history:{user_id}"
-        redis_client.delete(key)
+        redis_client.delete(
+            ChatService._key(user_id, conversation_id),
+            ChatService._turns_key(user_id, conversation_id),
+            ChatService._summary_key(user_id, conversation_id),
+        )
         logger.info(f"聊天历史已清除: 用户ID {user_id}")
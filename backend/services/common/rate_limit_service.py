@@ -0,0 +1,165 @@
+"""
+接口限流服务模块
+Redis Lua 脚本实现原子的滑动窗口计数（多进程/多实例共享预算），
+进程内令牌桶作为快速路径：本地已超限或已知处于封禁期的请求无需访问 Redis 直接拒绝
+"""
+
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from core.cache import redis_client
+from core.config import app_settings
+
+logger = logging.getLogger(__name__)
+
+# 滑动窗口（有序集合记录窗口内每次请求的时间戳，毫秒）
+# KEYS[1]: 限流 key；ARGV: 窗口毫秒数, 次数上限, 本次请求成员
+# 返回 {是否允许, 剩余次数, 需等待毫秒数}
+_SLIDING_WINDOW_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return {1, limit - count - 1, 0}
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, 0, tonumber(oldest[2]) + window - now}
+"""
+
+
+def parse_rule(rule: str) -> Tuple[int, float]:
+    """
+    解析限流规则
+
+    Args:
+        rule: '次数/窗口秒数'，如 '5/60'
+
+    Returns:
+        (次数上限, 窗口秒数)
+
+    Raises:
+        ValueError: 如果规则格式无效
+    """
+    limit_text, window_text = rule.split("/", 1)
+    limit, window = int(limit_text), float(window_text)
+    if limit <= 0 or window <= 0:
+        raise ValueError(f"无效的限流规则: {rule}")
+    return limit, window
+
+
+_RULES: Dict[str, Tuple[int, float]] = {
+    path: parse_rule(rule) for path, rule in app_settings.rate_limit_rules.items()
+}
+_EMAIL_RULES: Dict[str, Tuple[int, float]] = {
+    path: parse_rule(rule) for path, rule in app_settings.rate_limit_email_rules.items()
+}
+
+
+class _LocalBuckets:
+    """进程内令牌桶（容量 = 窗口内次数上限，按 上限/窗口 的速率补充），并记录 Redis 返回的封禁截止时间"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # key -> [令牌数, 上次补充时间, 封禁截止时间]
+        self.buckets: Dict[str, list] = {}
+        self.lock = threading.Lock()
+
+    def take(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        """
+        尝试取出一个令牌
+
+        Returns:
+            (是否允许, 需等待秒数)
+        """
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= self.max_keys:
+                    self._prune(now, window)
+                bucket = self.buckets[key] = [float(limit), now, 0.0]
+            if bucket[2] > now:
+                return False, bucket[2] - now
+            rate = limit / window
+            bucket[0] = min(float(limit), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                return False, (1 - bucket[0]) / rate
+            bucket[0] -= 1
+            return True, 0.0
+
+    def block(self, key: str, seconds: float) -> None:
+        """记录 Redis 判定的封禁期，期间本地直接拒绝"""
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket[2] = time.monotonic() + seconds
+
+    def _prune(self, now: float, window: float) -> None:
+        """清理已补满且不在封禁期的桶，仍然超限时淘汰最早创建的桶"""
+        for k in [k for k, b in self.buckets.items() if b[2] <= now and now - b[1] >= window]:
+            del self.buckets[k]
+        while len(self.buckets) >= self.max_keys:
+            del self.buckets[next(iter(self.buckets))]
+
+
+_local_buckets = _LocalBuckets(app_settings.rate_limit_local_max_keys)
+_sliding_window = redis_client.register_script(_SLIDING_WINDOW_SCRIPT)
+
+
+class RateLimitService:
+    """接口限流服务类"""
+
+    @staticmethod
+    def get_rule(path: str) -> Optional[Tuple[int, float]]:
+        """获取路径对应的限流规则 (次数上限, 窗口秒数)，未配置时返回 None"""
+        return _RULES.get(path)
+
+    @staticmethod
+    def get_email_rule(path: str) -> Optional[Tuple[int, float]]:
+        """获取路径按提交邮箱计数的限流规则，未配置时返回 None"""
+        return _EMAIL_RULES.get(path)
+
+    @staticmethod
+    def hit(
+        path: str, identity: str, rule: Optional[Tuple[int, float]] = None
+    ) -> Tuple[bool, int, float]:
+        """
+        记录一次请求并判断是否允许
+
+        Args:
+            path: 请求路径（须已配置限流规则）
+            identity: 计数对象标识（user:<subject>、ip:<地址> 或 email:<邮箱>）
+            rule: 使用的限流规则，默认为该路径按调用方的规则
+
+        Returns:
+            (是否允许, 剩余次数, 需等待秒数)
+        """
+        limit, window = rule or _RULES[path]
+        key = f"ratelimit:{path}:{identity}"
+
+        allowed, wait = _local_buckets.take(key, limit, window)
+        if not allowed:
+            return False, 0, wait
+
+        try:
+            allowed, remaining, wait_ms = _sliding_window(
+                keys=[key], args=[int(window * 1000), limit, uuid.uuid4().hex]
+            )
+        except Exception as e:
+            # Redis 不可用时仅依靠进程内令牌桶限流，不影响正常请求
+            logger.warning(f"限流检查失败，使用本地令牌桶: {key}, 错误: {e}")
+            return True, 0, 0.0
+
+        if not allowed:
+            _local_buckets.block(key, wait_ms / 1000)
+            return False, 0, wait_ms / 1000
+        return True, int(remaining), 0.0
@@ -32,3 +32,9 @@ class ValidationException(ServiceException):
     """数据验证异常"""
 
     pass
+
+
+class ServiceBusyException(ServiceException):
+    """服务繁忙异常（排队已满或等待超时）"""
+
+    pass
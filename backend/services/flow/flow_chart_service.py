@@ -0,0 +1,216 @@
+"""
+资金流图表服务模块
+每次采集后按 市场/周期 在服务端绘制各档位（超大/大/中/小单）资金净流入柱状图，
+轻量客户端和报告PDF可直接获取图片而无需下载全部数据
+"""
+
+import hashlib
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import app_settings
+from core.storage import minio_storage
+
+from services.common.cache_service import CacheService
+from services.flow.flow_image_service import FlowImageService
+
+logger = logging.getLogger(__name__)
+
+# 图表格式变更时递增，使已缓存的图表失效
+CHART_VERSION = "1"
+
+CHART_FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+CHART_OBJECT_PREFIX = "flow_charts"
+
+# 各档位资金净流入字段及图例
+ORDER_SIZE_FIELDS = (
+    ("extra_large_order_flow_net_amount", "超大单"),
+    ("large_order_flow_net_amount", "大单"),
+    ("medium_order_flow_net_amount", "中单"),
+    ("small_order_flow_net_amount", "小单"),
+)
+
+_chart_pool: Optional[ProcessPoolExecutor] = None
+
+
+# ==================== 进程池中执行的纯函数 ====================
+
+
+def _render_flow_chart(title: str, labels: List[str], series: List[List[float]], fmt: str) -> bytes:
+    """绘制各档位资金净流入堆叠横向柱状图，返回图片字节"""
+    import io
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.rcParams["font.sans-serif"] = [
+        "Noto Sans CJK SC",
+        "WenQuanYi Micro Hei",
+        "SimHei",
+        "DejaVu Sans",
+    ]
+    plt.rcParams["axes.unicode_minus"] = False
+
+    colors = ["#b91c1c", "#ef4444", "#f59e0b", "#10b981"]
+    fig, ax = plt.subplots(figsize=(9, max(3, len(labels) * 0.35)))
+    positions = list(range(len(labels)))[::-1]
+    pos_left = [0.0] * len(labels)
+    neg_left = [0.0] * len(labels)
+    for (_, legend), values, color in zip(ORDER_SIZE_FIELDS, series, colors):
+        lefts = [pos_left[i] if v >= 0 else neg_left[i] for i, v in enumerate(values)]
+        ax.barh(positions, values, left=lefts, color=color, label=legend)
+        for i, v in enumerate(values):
+            if v >= 0:
+                pos_left[i] += v
+            else:
+                neg_left[i] += v
+    ax.set_yticks(positions)
+    ax.set_yticklabels(labels)
+    ax.axvline(0, color="#6b7280", linewidth=0.8)
+    ax.set_title(title)
+    ax.legend(loc="lower right", fontsize=8)
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=100)
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+# ==================== 服务 ====================
+
+
+def _get_chart_pool() -> ProcessPoolExecutor:
+    """延迟创建图表渲染进程池"""
+    global _chart_pool
+    if _chart_pool is None:
+        _chart_pool = ProcessPoolExecutor(max_workers=app_settings.flow_chart_workers)
+    return _chart_pool
+
+
+def shutdown_chart_pool() -> None:
+    """关闭图表渲染进程池（应用关闭时调用）"""
+    global _chart_pool
+    if _chart_pool is not None:
+        _chart_pool.shutdown(wait=False, cancel_futures=True)
+        _chart_pool = None
+
+
+class FlowChartService:
+    """资金流图表服务类"""
+
+    @staticmethod
+    def chart_code(fmt: str) -> str:
+        """图表在 FlowImage 中使用的 code（区分个股图片与市场级图表）"""
+        return f"chart_{fmt}"
+
+    @staticmethod
+    def _build_series(
+        rows: List[Dict[str, Any]], top_n: int
+    ) -> Tuple[List[str], List[List[float]]]:
+        """按主力净流入绝对值取前 top_n 个标的，返回 (标签, 各档位数值)"""
+        top = sorted(rows, key=lambda r: abs(r.get("main_flow_net_amount") or 0.0), reverse=True)[
+            :top_n
+        ]
+        labels = [r.get("name") or r.get("code") or "" for r in top]
+        series = [[r.get(field) or 0.0 for r in top] for field, _ in ORDER_SIZE_FIELDS]
+        return labels, series
+
+    @staticmethod
+    def render_table_charts(
+        table_name: str, flow_type: str, market_type: str, period: str, rows: List[Dict[str, Any]]
+    ) -> Dict[str, str]:
+        """
+        为一张资金流表渲染图表（已存在同版本图表时跳过渲染）
+
+        Args:
+            table_name: 表名（用作图表标题和对象名）
+            flow_type: 资金流类型
+            market_type: 市场类型
+            period: 周期（与 /flow 接口的 period 参数一致，如 Today、3_Day）
+            rows: 采集到的数据行
+
+        Returns:
+            {格式: 图片URL}
+        """
+        if not rows:
+            return {}
+        labels, series = FlowChartService._build_series(rows, app_settings.flow_chart_top_n)
+        payload = json.dumps([labels, series, CHART_VERSION], ensure_ascii=False)
+        version = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+        pool = _get_chart_pool()
+        pending = {}
+        object_names = {}
+        for fmt in app_settings.flow_chart_formats:
+            object_name = f"{CHART_OBJECT_PREFIX}/{table_name}_{version}.{fmt}"
+            object_names[fmt] = object_name
+            if not minio_storage.object_exists(object_name):
+                pending[fmt] = pool.submit(_render_flow_chart, table_name, labels, series, fmt)
+
+        for fmt, future in pending.items():
+            minio_storage.upload_bytes(
+                future.result(), object_names[fmt], content_type=CHART_FORMATS[fmt]
+            )
+
+        urls = {fmt: minio_storage.get_image_url(name) for fmt, name in object_names.items()}
+        images = [
+            {
+                "code": FlowChartService.chart_code(fmt),
+                "flow_type": flow_type,
+                "market_type": market_type,
+                "period": period,
+                "image_url": url,
+            }
+            for fmt, url in urls.items()
+        ]
+        FlowImageService.record_images(images)
+        CacheService.cache_image_urls(images)
+        logger.info(f"资金流图表已更新: {table_name} (版本 {version}, 新渲染 {len(pending)} 张)")
+        return urls
+
+    @staticmethod
+    def render_after_crawl(results: List[Dict[str, Any]]) -> int:
+        """
+        采集完成后批量渲染图表，单张表失败不影响其他表
+
+        Args:
+            results: run_collect 的返回结果列表（包含 table、data）
+
+        Returns:
+            成功渲染的表数量
+        """
+        done = 0
+        for res in results:
+            rows = res.get("data") or []
+            if not rows:
+                continue
+            flow_type = rows[0]["flow_type"]
+            market_type = rows[0]["market_type"]
+            # 表名格式：{flow_type}_{market_type}_{period}
+            period = res["table"][len(f"{flow_type}_{market_type}_") :]
+            try:
+                FlowChartService.render_table_charts(
+                    res["table"], flow_type, market_type, period, rows
+                )
+                done += 1
+            except Exception as e:
+                logger.error(f"渲染资金流图表失败: {res['table']}, 错误: {e}", exc_info=True)
+        return done
+
+    @staticmethod
+    def get_chart_url(
+        flow_type: str, market_type: str, period: str, fmt: str = "png"
+    ) -> Optional[str]:
+        """获取最新的图表URL（优先读取缓存）"""
+        code = FlowChartService.chart_code(fmt)
+        return CacheService.get_cached_image_url(
+            code, flow_type, market_type, period
+        ) or FlowImageService.get_latest_image_url(code, flow_type, market_type, period)
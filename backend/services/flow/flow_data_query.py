@@ -1,16 +1,28 @@
 """
 资金流数据查询模块
-使用SQLAlchemy统一管理数据库连接
+使用SQLAlchemy统一管理数据库连接，查询走只读副本（不可用时回退到主库）
 """
 
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
-from core.database import get_db_session
+from core.database import get_async_db_session, get_db_session
 from sqlalchemy import inspect, text
 
+from services.common.cache_service import CacheService
+
 logger = logging.getLogger(__name__)
 
+# 资金流分表查询列（顺序与 _row_to_dict 对应）
+_SELECT_COLUMNS = (
+    "code, name, flow_type, market_type, period, latest_price, "
+    "change_percentage, main_flow_net_amount, main_flow_net_percentage, "
+    "extra_large_order_flow_net_amount, extra_large_order_flow_net_percentage, "
+    "large_order_flow_net_amount, large_order_flow_net_percentage, "
+    "medium_order_flow_net_amount, medium_order_flow_net_percentage, "
+    "small_order_flow_net_amount, small_order_flow_net_percentage, crawl_time"
+)
+
 
 def _row_to_dict(row: tuple) -> Dict[str, Any]:
     """将查询结果行转换为字典格式"""
@@ -39,12 +51,77 @@ def _row_to_dict(row: tuple) -> Dict[str, Any]:
     }
 
 
+# 表名周期后缀 -> 采集数据中的 period 值
+_PERIOD_SUFFIXES = {"Today": "today", "3_Day": "3d", "5_Day": "5d", "10_Day": "10d"}
+
+
+def parse_table_name(table_name: str) -> Optional[Tuple[str, str, str]]:
+    """
+    将表名解析为采集数据中的 (flow_type, market_type, period)
+
+    如 Stock_Flow_SH_A_Shares_3_Day -> ("Stock_Flow", "SH_A_Shares", "3d")，无法识别时返回 None
+    """
+    for flow_type in ("Stock_Flow", "Sector_Flow"):
+        prefix = f"{flow_type}_"
+        if not table_name.startswith(prefix):
+            continue
+        rest = table_name[len(prefix) :]
+        for suffix, period in _PERIOD_SUFFIXES.items():
+            if rest.endswith(f"_{suffix}") and len(rest) > len(suffix) + 1:
+                return flow_type, rest[: -len(suffix) - 1], period
+    return None
+
+
+def query_cached_table_data(table_name: str, limit: int = 50) -> Optional[List[Dict[str, Any]]]:
+    """
+    从采集后写入的分组缓存（每个市场/周期一个 hash）读取整表数据，一次 HGETALL 往返
+
+    Args:
+        table_name: 表名
+        limit: 返回条数限制
+
+    Returns:
+        与 query_table_data 结构一致的数据列表（按主力净流入降序，与采集排序一致）；
+        缓存未命中或读取失败时返回 None
+    """
+    parsed = parse_table_name(table_name)
+    if parsed is None:
+        return None
+    try:
+        cached = CacheService.get_cached_flow_data_many(None, *parsed, grouped=True)
+    except Exception as e:
+        logger.warning(f"读取资金流分组缓存失败: {table_name}, 错误: {e}")
+        return None
+    if not cached:
+        return None
+
+    items = sorted(
+        cached.values(),
+        key=lambda item: item.get("main_flow_net_amount") or 0,
+        reverse=True,
+    )
+    columns = [column.strip() for column in _SELECT_COLUMNS.split(",")]
+    return [_row_to_dict(tuple(item.get(column) for column in columns)) for item in items[:limit]]
+
+
+def load_table_data(table_name: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """读取表数据：优先分组缓存，未命中时查询数据库"""
+    cached = query_cached_table_data(table_name, limit=limit)
+    return cached if cached is not None else query_table_data(table_name, limit=limit)
+
+
+async def aload_table_data(table_name: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """load_table_data 的异步版本（缓存未命中时走异步引擎查询）"""
+    cached = query_cached_table_data(table_name, limit=limit)
+    return cached if cached is not None else await aquery_table_data(table_name, limit=limit)
+
+
 def get_all_latest_flow_data() -> List[Dict[str, Any]]:
     """
     遍历所有Stock_Flow_%和Sector_Flow_%分表，合并所有数据，返回结构化列表。
     """
     results = []
-    with get_db_session() as session:
+    with get_db_session(readonly=True) as session:
         # 使用SQLAlchemy inspector获取表名
         inspector_obj = inspect(session.bind)
         all_table_names = inspector_obj.get_table_names()
@@ -89,7 +166,7 @@ def query_table_data(table_name: str, limit: int = 50) -> List[Dict[str, Any]]:
         资金流数据列表
     """
     results = []
-    with get_db_session() as session:
+    with get_db_session(readonly=True) as session:
         try:
             # 检查表是否存在
             inspector_obj = inspect(session.bind)
@@ -99,13 +176,7 @@ def query_table_data(table_name: str, limit: int = 50) -> List[Dict[str, Any]]:
 
             # 使用text()执行原生SQL查询
             query = text(
-                f"SELECT code, name, flow_type, market_type, period, latest_price, "
-                f"change_percentage, main_flow_net_amount, main_flow_net_percentage, "
-                f"extra_large_order_flow_net_amount, extra_large_order_flow_net_percentage, "
-                f"large_order_flow_net_amount, large_order_flow_net_percentage, "
-                f"medium_order_flow_net_amount, medium_order_flow_net_percentage, "
-                f"small_order_flow_net_amount, small_order_flow_net_percentage, crawl_time "
-                f"FROM `{table_name}` ORDER BY crawl_time DESC LIMIT :limit"
+                f"SELECT {_SELECT_COLUMNS} FROM `{table_name}` ORDER BY crawl_time DESC LIMIT :limit"
             )
             result = session.execute(query, {"limit": limit})
             rows = result.fetchall()
@@ -118,6 +189,38 @@ def query_table_data(table_name: str, limit: int = 50) -> List[Dict[str, Any]]:
     return results
 
 
+async def aquery_table_data(table_name: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    query_table_data 的异步版本（异步引擎，不阻塞事件循环）
+
+    Args:
+        table_name: 表名
+        limit: 查询条数限制，默认50
+
+    Returns:
+        资金流数据列表
+    """
+    async with get_async_db_session(readonly=True) as session:
+        try:
+            # 检查表是否存在（inspector 只能在同步连接上运行）
+            connection = await session.connection()
+            exists = await connection.run_sync(
+                lambda sync_conn: inspect(sync_conn).has_table(table_name)
+            )
+            if not exists:
+                logger.warning(f"表不存在: {table_name}")
+                return []
+
+            query = text(
+                f"SELECT {_SELECT_COLUMNS} FROM `{table_name}` ORDER BY crawl_time DESC LIMIT :limit"
+            )
+            result = await session.execute(query, {"limit": limit})
+            return [_row_to_dict(row) for row in result.fetchall()]
+        except Exception as e:
+            logger.error(f"查询表 {table_name} 出错: {e}", exc_info=True)
+            return []
+
+
 def query_stock_flow_data(stock_name: str, limit: int = 100) -> List[Dict[str, Any]]:
     """
     遍历所有Stock_Flow_%和Sector_Flow_%分表，查找包含该股票名的最新N条数据。
@@ -130,7 +233,7 @@ def query_stock_flow_data(stock_name: str, limit: int = 100) -> List[Dict[str, A
         资金流数据列表，按时间降序排列
     """
     results = []
-    with get_db_session() as session:
+    with get_db_session(readonly=True) as session:
         # 使用SQLAlchemy inspector获取表名
         inspector_obj = inspect(session.bind)
         all_table_names = inspector_obj.get_table_names()
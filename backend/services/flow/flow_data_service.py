@@ -4,9 +4,11 @@
 """
 
 import logging
+import time
 from typing import Any, Dict, List, Optional
 
-from core.database import get_db_session
+from core.config import app_settings
+from core.database import bulk_upsert, get_db_session
 from models.models import FlowData
 from utils.utils import get_now
 
@@ -14,47 +16,82 @@ from services.flow.flow_data_query import get_all_latest_flow_data
 
 logger = logging.getLogger(__name__)
 
+# 唯一索引 idx_code_type_period_task 的列
+FLOW_KEY_COLUMNS = ("code", "flow_type", "market_type", "period", "task_id")
+
+# 可更新的数值字段
+FLOW_VALUE_FIELDS = (
+    "latest_price",
+    "change_percentage",
+    "main_flow_net_amount",
+    "main_flow_net_percentage",
+    "extra_large_order_flow_net_amount",
+    "extra_large_order_flow_net_percentage",
+    "large_order_flow_net_amount",
+    "large_order_flow_net_percentage",
+    "medium_order_flow_net_amount",
+    "medium_order_flow_net_percentage",
+    "small_order_flow_net_amount",
+    "small_order_flow_net_percentage",
+)
+
 
 class FlowDataService:
     """资金流数据服务类"""
 
     @staticmethod
-    def save_flow_data(data_list: List[Dict[str, Any]], task_id: int) -> None:
+    def save_flow_data(data_list: List[Dict[str, Any]], task_id: int) -> Dict[str, Any]:
         """
-        保存资金流数据列表
+        批量保存资金流数据（INSERT ... ON DUPLICATE KEY UPDATE，按 idx_code_type_period_task 去重）
+
+        每批一条多行语句，替代逐行 merge（每行一次 SELECT + 一次 INSERT/UPDATE）
 
         Args:
             data_list: 资金流数据列表
             task_id: 关联的任务ID
+
+        Returns:
+            写入统计：rows、statements、elapsed_ms、rows_per_second
         """
+        start = time.perf_counter()
+        now = get_now()
+        rows = [
+            {
+                "code": data["code"],
+                "name": data["name"],
+                "flow_type": data["flow_type"],
+                "market_type": data["market_type"],
+                "period": data["period"],
+                **{field: data.get(field) for field in FLOW_VALUE_FIELDS},
+                "crawl_time": now,
+                "task_id": task_id,
+            }
+            for data in data_list
+        ]
+        batch_size = app_settings.flow_data_upsert_batch_size
         with get_db_session() as session:
-            for data in data_list:
-                flow_data = FlowData(
-                    code=data["code"],
-                    name=data["name"],
-                    flow_type=data["flow_type"],
-                    market_type=data["market_type"],
-                    period=data["period"],
-                    latest_price=data.get("latest_price"),
-                    change_percentage=data.get("change_percentage"),
-                    main_flow_net_amount=data.get("main_flow_net_amount"),
-                    main_flow_net_percentage=data.get("main_flow_net_percentage"),
-                    extra_large_order_flow_net_amount=data.get("extra_large_order_flow_net_amount"),
-                    extra_large_order_flow_net_percentage=data.get(
-                        "extra_large_order_flow_net_percentage"
-                    ),
-                    large_order_flow_net_amount=data.get("large_order_flow_net_amount"),
-                    large_order_flow_net_percentage=data.get("large_order_flow_net_percentage"),
-                    medium_order_flow_net_amount=data.get("medium_order_flow_net_amount"),
-                    medium_order_flow_net_percentage=data.get("medium_order_flow_net_percentage"),
-                    small_order_flow_net_amount=data.get("small_order_flow_net_amount"),
-                    small_order_flow_net_percentage=data.get("small_order_flow_net_percentage"),
-                    crawl_time=get_now(),
-                    task_id=task_id,
-                )
-                session.merge(flow_data)  # merge可避免唯一索引冲突
-
-            logger.info(f"已保存 {len(data_list)} 条资金流数据，任务ID: {task_id}")
+            bulk_upsert(
+                session,
+                FlowData,
+                rows,
+                conflict_columns=FLOW_KEY_COLUMNS,
+                update_columns=("name", *FLOW_VALUE_FIELDS, "crawl_time"),
+                batch_size=batch_size,
+            )
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            "rows": len(rows),
+            "statements": -(-len(rows) // batch_size),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "rows_per_second": round(len(rows) / elapsed, 1) if elapsed > 0 else 0,
+        }
+        logger.info(
+            f"已保存 {stats['rows']} 条资金流数据，任务ID: {task_id}，"
+            f"{stats['statements']} 条语句，耗时 {stats['elapsed_ms']}ms，"
+            f"{stats['rows_per_second']} 行/秒"
+        )
+        return stats
 
     @staticmethod
     def _flow_data_to_dict(flow_data: FlowData) -> Dict[str, Any]:
@@ -3,19 +3,165 @@
 处理图片上传和元数据管理
 """
 
+import hashlib
 import logging
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
-from core.database import get_db_session
+from core.config import app_settings
+from core.database import bulk_upsert, get_db_session
 from core.storage import minio_storage
 from models.models import FlowImage
+from sqlalchemy import tuple_
 from utils.utils import get_now
 
 logger = logging.getLogger(__name__)
 
+# 内容寻址的对象名前缀：相同内容只存储一份
+IMAGE_OBJECT_PREFIX = "flow_images"
+
+_IMAGE_KEY_COLUMNS = ("code", "flow_type", "market_type", "period", "task_id")
+
 
 class FlowImageService:
     """图片服务类"""
 
+    @staticmethod
+    def _read_image(image: Dict[str, Any]) -> Tuple[bytes, str]:
+        """读取图片内容，返回 (字节内容, 扩展名)"""
+        if image.get("content") is not None:
+            return image["content"], image.get("ext") or ".png"
+        file_path = image["file_path"]
+        with open(file_path, "rb") as f:
+            content = f.read()
+        return content, os.path.splitext(file_path)[1] or ".png"
+
+    @staticmethod
+    def object_name_for(content: bytes, ext: str = ".png") -> str:
+        """根据内容哈希生成对象名"""
+        digest = hashlib.sha256(content).hexdigest()
+        return f"{IMAGE_OBJECT_PREFIX}/{digest[:2]}/{digest}{ext}"
+
+    @staticmethod
+    def _upload_if_missing(object_name: str, content: bytes, content_type: str) -> bool:
+        """对象不存在时上传，返回是否实际上传"""
+        if minio_storage.object_exists(object_name):
+            return False
+        minio_storage.upload_bytes(content, object_name, content_type=content_type)
+        return True
+
+    @staticmethod
+    def record_images(images: List[Dict[str, Any]]) -> int:
+        """
+        批量写入图片元数据（按 code/flow_type/market_type/period/task_id 插入或更新）
+
+        Args:
+            images: 元数据列表，每项包含 code/flow_type/market_type/period/image_url，可选 task_id
+
+        Returns:
+            写入的行数
+        """
+        now = get_now()
+        rows = [
+            {
+                "code": image["code"],
+                "flow_type": image["flow_type"],
+                "market_type": image["market_type"],
+                "period": image["period"],
+                "task_id": image.get("task_id"),
+                "image_url": image["image_url"],
+                "crawl_time": now,
+            }
+            for image in images
+        ]
+        # 唯一索引中 task_id 为 NULL 的行不会触发冲突，先删除同键的旧记录
+        untracked = [
+            (r["code"], r["flow_type"], r["market_type"], r["period"])
+            for r in rows
+            if r["task_id"] is None
+        ]
+        with get_db_session() as session:
+            if untracked:
+                session.query(FlowImage).filter(
+                    FlowImage.task_id.is_(None),
+                    tuple_(
+                        FlowImage.code, FlowImage.flow_type, FlowImage.market_type, FlowImage.period
+                    ).in_(untracked),
+                ).delete(synchronize_session=False)
+            return bulk_upsert(
+                session,
+                FlowImage,
+                rows,
+                conflict_columns=_IMAGE_KEY_COLUMNS,
+                update_columns=("image_url", "crawl_time"),
+            )
+
+    @staticmethod
+    def get_latest_image_url(
+        code: str, flow_type: str, market_type: str, period: str
+    ) -> Optional[str]:
+        """获取最新的图片URL"""
+        with get_db_session(auto_commit=False) as session:
+            row = (
+                session.query(FlowImage.image_url)
+                .filter_by(code=code, flow_type=flow_type, market_type=market_type, period=period)
+                .order_by(FlowImage.crawl_time.desc())
+                .first()
+            )
+            return row.image_url if row else None
+
+    @staticmethod
+    def save_images(images: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量保存图片：按内容哈希去重，并发上传到MinIO，元数据一次批量写入
+
+        Args:
+            images: 图片列表，每项包含 content(字节) 或 file_path，
+                以及 code/flow_type/market_type/period/task_id，可选 ext
+
+        Returns:
+            与输入顺序一致的图片URL列表
+        """
+        if not images:
+            return []
+
+        # 1. 读取并计算内容寻址的对象名，同一批内相同内容只上传一次
+        object_names = []
+        uploads: Dict[str, Tuple[bytes, str]] = {}
+        for image in images:
+            content, ext = FlowImageService._read_image(image)
+            object_name = FlowImageService.object_name_for(content, ext)
+            object_names.append(object_name)
+            if object_name not in uploads:
+                content_type = mimetypes.guess_type(object_name)[0] or "application/octet-stream"
+                uploads[object_name] = (content, content_type)
+
+        # 2. 并发检查/上传（已存在的对象直接跳过）
+        with ThreadPoolExecutor(
+            max_workers=min(app_settings.flow_image_upload_workers, len(uploads)),
+            thread_name_prefix="flow-image",
+        ) as pool:
+            uploaded = sum(
+                pool.map(
+                    lambda item: FlowImageService._upload_if_missing(item[0], *item[1]),
+                    uploads.items(),
+                )
+            )
+
+        # 3. 一次批量写入元数据
+        url_prefix = minio_storage.get_image_url("")
+        image_urls = [url_prefix + object_name for object_name in object_names]
+        FlowImageService.record_images(
+            [{**image, "image_url": image_url} for image, image_url in zip(images, image_urls)]
+        )
+
+        logger.info(
+            f"已保存 {len(images)} 张图片（去重后 {len(uploads)} 个对象，新上传 {uploaded} 个）"
+        )
+        return image_urls
+
     @staticmethod
     def save_image(
         file_path: str, code: str, flow_type: str, market_type: str, period: str, task_id: int
@@ -34,22 +180,15 @@ class FlowImageService:
         Returns:
             图片URL
         """
-        # 上传图片到MinIO
-        object_name = minio_storage.upload_image(file_path)
-        image_url = minio_storage.get_image_url(object_name)
-
-        # 保存元数据到数据库
-        with get_db_session() as session:
-            flow_image = FlowImage(
-                code=code,
-                flow_type=flow_type,
-                market_type=market_type,
-                period=period,
-                image_url=image_url,
-                crawl_time=get_now(),
-                task_id=task_id,
-            )
-            session.merge(flow_image)
-            logger.info(f"图片已保存: {image_url} (任务ID: {task_id})")
-
-        return image_url
+        return FlowImageService.save_images(
+            [
+                {
+                    "file_path": file_path,
+                    "code": code,
+                    "flow_type": flow_type,
+                    "market_type": market_type,
+                    "period": period,
+                    "task_id": task_id,
+                }
+            ]
+        )[0]
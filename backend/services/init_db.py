@@ -7,39 +7,15 @@ import contextlib
 import logging
 import time
 
-import bcrypt
 from core.config import ADMIN_CONFIG
 from core.database import engine, get_db_session
 from models.models import Base, User
 from sqlalchemy import inspect, text
 
-logger = logging.getLogger(__name__)
-
-
-def _hash_password(password: str) -> str:
-    """
-    对密码进行 bcrypt 哈希
-
-    Args:
-        password: 原始密码
-
-    Returns:
-        哈希后的密码字符串
+from services.auth.password_service import PasswordService
+from services.auth.user_service import UserService
 
-    Note:
-        bcrypt 限制密码不能超过 72 字节，如果超过会自动截断
-    """
-    # bcrypt 限制密码不能超过 72 字节
-    password_bytes = password.encode("utf-8")
-    if len(password_bytes) > 72:
-        logger.warning(f"密码超过 72 字节限制（当前 {len(password_bytes)} 字节），将截断到 72 字节")
-        password_bytes = password_bytes[:72]
-
-    # 直接使用 bcrypt 库生成哈希，避免 passlib 初始化问题
-    salt = bcrypt.gensalt()
-    password_hash = bcrypt.hashpw(password_bytes, salt)
-    # bcrypt.hashpw 返回 bytes，需要解码为字符串
-    return password_hash.decode("utf-8")
+logger = logging.getLogger(__name__)
 
 
 def check_database_connection() -> bool:
@@ -109,6 +85,22 @@ def apply_migrations() -> None:
                         except Exception as e:
                             logger.warning(f"修改 report.file_url 字段类型时出错: {e}")
                     break
+
+            # 补充报告列表分页所需的索引
+            existing = {idx["name"] for idx in inspector.get_indexes("report")}
+            for name, columns in (
+                ("idx_report_user_created", "user_id, created_at"),
+                ("idx_report_created", "created_at"),
+            ):
+                if name in existing:
+                    continue
+                logger.info(f"正在为 report 表创建索引 {name}...")
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(text(f"CREATE INDEX {name} ON report({columns})"))
+                    logger.info(f"成功创建索引 {name}")
+                except Exception as e:
+                    logger.warning(f"创建索引 {name} 时出错: {e}")
     except Exception as e:
         logger.warning(f"执行数据库迁移时出错: {e}")
 
@@ -129,7 +121,7 @@ def setup_admin_account() -> None:
 
             if not user:
                 # 创建新管理员账号
-                password_hash = _hash_password(admin_password)
+                password_hash = PasswordService.hash_password(admin_password)
                 user = User(
                     email=admin_email,
                     username=admin_username,
@@ -150,6 +142,8 @@ def setup_admin_account() -> None:
                     updated = True
                 if updated:
                     logger.info(f"已更新用户 {admin_email} 为管理员")
+        # 权限可能已变更，清除该用户的登录身份缓存
+        UserService.invalidate_principal(admin_email)
     except Exception as e:
         logger.error(f"设置管理员账号时出错: {e}")
         raise
@@ -0,0 +1,249 @@
+"""
+每日报告服务模块
+共享市场分析只计算一次，按用户低成本个性化后并发写入MinIO，支持断点续跑
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.cache import redis_client
+from core.config import app_settings
+from core.database import get_db_session
+from core.storage import minio_storage
+from models.models import User
+
+from services.ai.deepseek import DeepseekAgent
+from services.ai.multi_table import load_table_digests
+from services.report.report_service import ReportService
+
+logger = logging.getLogger(__name__)
+
+
+class _RateLimiter:
+    """简单的线程安全限速器：相邻两次放行至少间隔 1/rate 秒"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_seconds = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+
+class DailyReportService:
+    """每日报告服务类"""
+
+    @staticmethod
+    def _today() -> str:
+        """东八区日期字符串"""
+        return datetime.now(timezone(timedelta(hours=8))).strftime("%Y%m%d")
+
+    @staticmethod
+    def _key(date: str, suffix: str) -> str:
+        return f"daily_report:{date}:{suffix}"
+
+    @staticmethod
+    def get_shared_analysis(date: str) -> Dict[str, Any]:
+        """
+        获取当日共享市场分析（断点续跑时直接复用已缓存的结果）
+
+        Args:
+            date: 日期（YYYYMMDD）
+
+        Returns:
+            包含 analysis、usage、latency_ms 的字典
+        """
+        key = DailyReportService._key(date, "analysis")
+        cached = redis_client.get(key)
+        if cached:
+            logger.info(f"复用已缓存的共享市场分析: {date}")
+            return json.loads(cached)
+
+        start = time.perf_counter()
+        digests = [
+            d for d in load_table_digests(app_settings.daily_report_tables) if not d["missing"]
+        ]
+        prompt = f"""
+你是一个专业的金融智能分析助手。请根据以下各市场/板块的资金流摘要，生成一份结构化、详实、专业的每日金融分析报告正文，内容包括但不限于：市场综述、个股表现、主力资金流向、风险提示、投资建议等。
+
+【业务数据】
+{json.dumps(digests, ensure_ascii=False)}
+
+【要求】
+- 报告格式：Markdown，分章节，必要时使用表格
+- 语言：中文
+- 不要输出报告标题和问候语（标题由系统按用户生成）
+
+请直接返回Markdown格式的报告正文。
+"""
+        analysis, usage = DeepseekAgent.chat(
+            user_message=prompt,
+            system_message="你是一名专业金融分析师，善于资金流分析和投资建议。",
+            stream=False,
+            return_usage=True,
+        )
+        if not usage:
+            # 调用失败时 usage 为空，不缓存错误结果，避免所有用户收到错误报告
+            raise RuntimeError(analysis)
+        result = {
+            "analysis": analysis,
+            "usage": usage,
+            "tables": [d["table"] for d in digests],
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        redis_client.setex(
+            key, app_settings.daily_report_checkpoint_expire, json.dumps(result, ensure_ascii=False)
+        )
+        logger.info(f"共享市场分析已生成: {date}, 耗时 {result['latency_ms']}ms, token用量 {usage}")
+        return result
+
+    @staticmethod
+    def render_report(user: Dict[str, Any], date: str, shared: Dict[str, Any]) -> str:
+        """
+        基于共享分析为用户渲染个性化报告（纯模板，不调用大模型）
+
+        Args:
+            user: 用户信息字典（id/email/username）
+            date: 日期（YYYYMMDD）
+            shared: 共享市场分析
+
+        Returns:
+            Markdown 文本
+        """
+        display_name = user.get("username") or user["email"]
+        date_text = f"{date[:4]}-{date[4:6]}-{date[6:]}"
+        tables = "、".join(shared.get("tables") or []) or "暂无"
+        return (
+            f"# {display_name} 的每日分析报告（{date_text}）\n\n"
+            f"> 数据来源：{tables}\n\n"
+            f"{shared['analysis']}\n"
+        )
+
+    @staticmethod
+    def _iter_user_batches(batch_size: int):
+        """按主键分批加载激活用户（只取需要的列），避免一次性加载全部用户"""
+        last_id = 0
+        while True:
+            with get_db_session(auto_commit=False) as session:
+                rows = (
+                    session.query(User.id, User.email, User.username)
+                    .filter(User.id > last_id, User.is_active == 1)
+                    .order_by(User.id)
+                    .limit(batch_size)
+                    .all()
+                )
+            if not rows:
+                return
+            yield [{"id": r.id, "email": r.email, "username": r.username} for r in rows]
+            last_id = rows[-1].id
+
+    @staticmethod
+    def _generate_for_user(
+        user: Dict[str, Any], date: str, shared: Dict[str, Any], limiter: _RateLimiter
+    ) -> Tuple[int, float, int]:
+        """为单个用户生成并上传报告，返回 (用户ID, 耗时毫秒, 报告字节数)"""
+        start = time.perf_counter()
+        limiter.wait()
+        file_name = f"daily_report_{date}_{user['id']}.md"
+        content = DailyReportService.render_report(user, date, shared).encode("utf-8")
+        object_name = minio_storage.upload_bytes(
+            content, file_name, content_type="text/markdown; charset=utf-8"
+        )
+        # 断点续跑时对象会被覆盖，数据库记录只写一次
+        if not ReportService.get_report_by_filename(file_name):
+            file_url = minio_storage.get_image_url(object_name)
+            ReportService.add_report(user["id"], "markdown", file_url, file_name)
+        return user["id"], round((time.perf_counter() - start) * 1000, 1), len(content)
+
+    @staticmethod
+    def run(date: Optional[str] = None) -> Dict[str, Any]:
+        """
+        执行每日报告批处理
+
+        1. 共享市场分析只生成一次并缓存（崩溃重启后复用）
+        2. 分批加载用户，跳过已完成的用户（Redis 集合记录断点）
+        3. 有界线程池并发生成，限速写入
+        4. 记录每份报告的耗时与大小，token 用量只来自共享分析，按报告数分摊
+
+        Args:
+            date: 日期（YYYYMMDD），默认今天
+
+        Returns:
+            运行统计
+        """
+        date = date or DailyReportService._today()
+        expire = app_settings.daily_report_checkpoint_expire
+        done_key = DailyReportService._key(date, "done")
+        metrics_key = DailyReportService._key(date, "metrics")
+
+        shared = DailyReportService.get_shared_analysis(date)
+        limiter = _RateLimiter(app_settings.daily_report_rate_per_second)
+        latencies: List[float] = []
+        users_done: List[int] = []
+        failed = skipped = 0
+
+        with ThreadPoolExecutor(
+            max_workers=app_settings.daily_report_workers, thread_name_prefix="daily-report"
+        ) as pool:
+            for batch in DailyReportService._iter_user_batches(
+                app_settings.daily_report_batch_size
+            ):
+                done_flags = redis_client.smismember(done_key, [u["id"] for u in batch])
+                pending = [u for u, done in zip(batch, done_flags) if not done]
+                skipped += len(batch) - len(pending)
+                futures = {
+                    pool.submit(DailyReportService._generate_for_user, u, date, shared, limiter): u
+                    for u in pending
+                }
+                for future in as_completed(futures):
+                    user = futures[future]
+                    try:
+                        user_id, latency_ms, size = future.result()
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"生成每日报告失败: 用户 {user['email']}, 错误: {e}")
+                        continue
+                    latencies.append(latency_ms)
+                    users_done.append(user_id)
+                    pipe = redis_client.pipeline()
+                    pipe.sadd(done_key, user_id)
+                    pipe.hset(
+                        metrics_key, user_id, json.dumps({"latency_ms": latency_ms, "bytes": size})
+                    )
+                    pipe.expire(done_key, expire)
+                    pipe.expire(metrics_key, expire)
+                    pipe.execute()
+
+        # 共享分析的 token 用量按本次生成的报告数分摊
+        usage = shared.get("usage") or {}
+        total_tokens = usage.get("total_tokens", 0)
+        latencies.sort()
+        stats = {
+            "date": date,
+            "generated": len(users_done),
+            "skipped": skipped,
+            "failed": failed,
+            "shared_latency_ms": shared.get("latency_ms"),
+            "avg_latency_ms": round(sum(latencies) / len(latencies), 1) if latencies else 0,
+            "p95_latency_ms": latencies[int(len(latencies) * 0.95)] if latencies else 0,
+            "total_tokens": total_tokens,
+            "tokens_per_report": round(total_tokens / len(users_done), 1) if users_done else 0,
+        }
+        redis_client.setex(
+            DailyReportService._key(date, "stats"), expire, json.dumps(stats, ensure_ascii=False)
+        )
+        logger.info(f"每日报告批处理完成: {stats}")
+        return stats
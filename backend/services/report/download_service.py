@@ -0,0 +1,191 @@
+"""
+报告下载服务模块
+为下载代理提供对象元数据、Range 解析、小对象内存缓存与内容压缩
+"""
+
+import gzip
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+from core.config import app_settings
+from core.storage import minio_storage
+
+try:
+    import brotli
+except ImportError:
+    # brotli 为可选依赖，未安装时仅提供 gzip 压缩
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 可压缩的文本类型（Markdown/HTML 等）
+COMPRESSIBLE_SUFFIXES = (".md", ".html", ".txt", ".json")
+
+# 支持的压缩编码（choose_encoding 可能返回的值）
+CONTENT_ENCODINGS = ("br", "gzip")
+
+
+class _ObjectCache:
+    """按总字节数限制的线程安全 LRU 缓存，key 中包含 ETag，对象变化后自然失效"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items: OrderedDict[Tuple[str, str, str], bytes] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[bytes]:
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple[str, str, str], value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+_cache = _ObjectCache(app_settings.report_download_cache_max_bytes)
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 HTTP Range 头（bytes=start-end / bytes=start- / bytes=-suffix）
+
+    Args:
+        range_header: Range 请求头
+        size: 对象总大小
+
+    Returns:
+        (start, end) 闭区间；无 Range 或格式不支持时返回 None（按完整内容响应）
+
+    Raises:
+        ValueError: 如果范围无法满足（应返回 416）
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes=") :].strip()
+    if "," in spec or "-" not in spec:
+        # 多段 Range 不支持，按完整内容返回
+        return None
+    start_text, end_text = (part.strip() for part in spec.split("-", 1))
+    try:
+        if not start_text:
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise ValueError("无效的Range")
+            return max(0, size - suffix), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError as e:
+        raise ValueError("无效的Range") from e
+    if start >= size or start > end:
+        raise ValueError("Range超出文件范围")
+    return start, min(end, size - 1)
+
+
+def choose_encoding(accept_encoding: Optional[str], file_name: str) -> Optional[str]:
+    """根据 Accept-Encoding 和文件类型选择压缩算法（优先 br，其次 gzip）"""
+    if not accept_encoding or not file_name.lower().endswith(COMPRESSIBLE_SUFFIXES):
+        return None
+    accepted = {item.split(";")[0].strip().lower() for item in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class ReportDownloadService:
+    """报告下载服务类"""
+
+    @staticmethod
+    def stat(file_name: str) -> Dict[str, object]:
+        """
+        获取对象元数据
+
+        Args:
+            file_name: 对象名
+
+        Returns:
+            包含 etag/size/last_modified/content_type 的字典
+        """
+        stat = minio_storage.client.stat_object(minio_storage.bucket, file_name)
+        return {
+            "etag": stat.etag,
+            "size": stat.size,
+            "last_modified": stat.last_modified,
+            "content_type": stat.content_type,
+        }
+
+    @staticmethod
+    def is_cacheable(size: int) -> bool:
+        """对象是否足够小，可以整体缓存在内存中"""
+        return size <= app_settings.report_download_cache_object_max_bytes
+
+    @staticmethod
+    def get_content(file_name: str, etag: str, encoding: Optional[str] = None) -> bytes:
+        """
+        获取小对象的完整内容（可选压缩），结果按 (对象名, ETag, 编码) 缓存在内存
+
+        Args:
+            file_name: 对象名
+            etag: 对象ETag
+            encoding: 压缩算法（br/gzip），None 表示原始内容
+
+        Returns:
+            字节内容
+        """
+        key = (file_name, etag, encoding or "identity")
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+
+        raw_key = (file_name, etag, "identity")
+        raw = _cache.get(raw_key)
+        if raw is None:
+            raw = minio_storage.get_bytes(file_name)
+            _cache.put(raw_key, raw)
+        if encoding is None:
+            return raw
+
+        if encoding == "br":
+            content = brotli.compress(raw, quality=5)
+        else:
+            content = gzip.compress(raw, compresslevel=6)
+        _cache.put(key, content)
+        return content
+
+    @staticmethod
+    def iter_object(file_name: str, offset: int = 0, length: int = 0) -> Iterator[bytes]:
+        """
+        分块读取对象内容，读取完成或客户端断开时关闭响应并归还连接
+
+        Args:
+            file_name: 对象名
+            offset: 起始偏移
+            length: 读取长度，0 表示读到末尾
+
+        Yields:
+            数据块
+        """
+        response = minio_storage.client.get_object(
+            minio_storage.bucket, file_name, offset=offset, length=length
+        )
+        try:
+            yield from response.stream(app_settings.report_download_chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
@@ -0,0 +1,254 @@
+"""
+报告渲染服务模块
+Markdown -> HTML -> PDF，内嵌由已存储资金流数据绘制的图表
+CPU 密集的渲染在独立进程池中执行；编译后的模板、图表和渲染结果按数据版本缓存
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from core.cache import redis_client
+from core.config import app_settings
+from core.storage import minio_storage
+from minio.error import S3Error
+
+from services.exceptions import ServiceException
+from services.flow.flow_data_query import query_table_data
+
+logger = logging.getLogger(__name__)
+
+# 模板变更时递增，使已缓存的渲染结果失效
+TEMPLATE_VERSION = "2"
+
+RENDER_FORMATS = {
+    "html": "text/html; charset=utf-8",
+    "pdf": "application/pdf",
+}
+
+# 报告文件名格式：report_{table_name}_{YYYYmmdd_HHMMSS}.md
+_REPORT_NAME_PATTERN = re.compile(r"^report_(?P<table>.+)_\d{8}_\d{6}\.md$")
+
+_REPORT_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{{ title }}</title>
+<style>
+  body { font-family: {{ font_family }}; color: #1f2937; line-height: 1.6; margin: 24px; }
+  h1, h2, h3 { color: #1e3a8a; }
+  table { border-collapse: collapse; width: 100%; margin: 12px 0; }
+  th, td { border: 1px solid #d1d5db; padding: 4px 8px; text-align: left; }
+  th { background: #eff6ff; }
+  code { background: #f3f4f6; padding: 0 4px; }
+  .chart { text-align: center; margin: 16px 0; }
+  .chart img { max-width: 100%; }
+</style>
+</head>
+<body>
+<h1>{{ title }}</h1>
+{% if chart %}
+<div class="chart"><img src="data:image/png;base64,{{ chart }}" alt="资金流图表"></div>
+{% endif %}
+{{ body | safe }}
+</body>
+</html>
+"""
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+
+# ==================== 进程池中执行的纯函数 ====================
+
+
+@lru_cache(maxsize=1)
+def _get_template():
+    """编译报告模板（每个渲染进程只编译一次）"""
+    from jinja2 import Environment
+
+    # 模板变量默认转义；正文为净化后的 HTML，单独标记为 safe
+    return Environment(autoescape=True).from_string(_REPORT_TEMPLATE)
+
+
+def _render_chart_png(title: str, labels: list, values: list) -> bytes:
+    """绘制主力净流入横向柱状图，返回PNG字节"""
+    import io
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.rcParams["font.sans-serif"] = [
+        "Noto Sans CJK SC",
+        "WenQuanYi Micro Hei",
+        "SimHei",
+        "DejaVu Sans",
+    ]
+    plt.rcParams["axes.unicode_minus"] = False
+
+    fig, ax = plt.subplots(figsize=(8, max(3, len(labels) * 0.35)))
+    colors = ["#dc2626" if v >= 0 else "#16a34a" for v in values]
+    ax.barh(labels[::-1], values[::-1], color=colors[::-1])
+    ax.set_title(title)
+    ax.set_xlabel("main_flow_net_amount")
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=100)
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def _render_document(markdown_text: str, title: str, chart_b64: Optional[str], fmt: str) -> bytes:
+    """Markdown 转 HTML（可选再转 PDF），返回渲染后的字节内容"""
+    import markdown
+    import nh3
+
+    # 报告正文包含用户聊天内容和模型输出，Markdown 允许内嵌原始 HTML，
+    # 转换后按白名单净化，去掉 script、事件属性、javascript: 链接等
+    body = nh3.clean(markdown.markdown(markdown_text, extensions=["tables", "fenced_code"]))
+    if fmt == "html":
+        html = _get_template().render(
+            title=title, body=body, chart=chart_b64, font_family="-apple-system, sans-serif"
+        )
+        return html.encode("utf-8")
+
+    import io
+
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from xhtml2pdf import pisa
+
+    # 使用 reportlab 内置的中文 CID 字体，无需额外字体文件
+    pdfmetrics.registerFont(UnicodeCIDFont("STSong-Light"))
+    html = _get_template().render(
+        title=title, body=body, chart=chart_b64, font_family="STSong-Light"
+    )
+    buffer = io.BytesIO()
+    result = pisa.CreatePDF(html, dest=buffer, encoding="utf-8")
+    if result.err:
+        raise RuntimeError(f"PDF渲染失败，错误数: {result.err}")
+    return buffer.getvalue()
+
+
+# ==================== 服务 ====================
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """延迟创建渲染进程池"""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=app_settings.report_render_workers)
+    return _render_pool
+
+
+def shutdown_render_pool() -> None:
+    """关闭渲染进程池（应用关闭时调用）"""
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+class ReportRenderService:
+    """报告渲染服务类"""
+
+    @staticmethod
+    def table_from_file_name(file_name: str) -> Optional[str]:
+        """从报告文件名解析对应的数据表名"""
+        match = _REPORT_NAME_PATTERN.match(file_name)
+        return match.group("table") if match else None
+
+    @staticmethod
+    def get_chart(table_name: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        获取表数据的图表（base64 PNG），按数据版本缓存在Redis
+
+        Args:
+            table_name: 表名
+
+        Returns:
+            (数据版本, base64图表)，表不存在或无数据时返回 (None, None)
+        """
+        top_n = app_settings.report_render_chart_top_n
+        rows = query_table_data(table_name, limit=top_n)
+        if not rows:
+            return None, None
+
+        points = [
+            (r["data"]["name"] or r["data"]["code"], r["data"]["main_flow_net_amount"] or 0.0)
+            for r in rows
+        ]
+        payload = json.dumps(points, ensure_ascii=False).encode("utf-8")
+        version = hashlib.sha1(payload).hexdigest()[:16]
+        key = f"report:chart:{table_name}:{version}"
+        cached = redis_client.get(key)
+        if cached:
+            return version, cached
+
+        png = (
+            _get_render_pool()
+            .submit(
+                _render_chart_png,
+                table_name,
+                [p[0] for p in points],
+                [p[1] for p in points],
+            )
+            .result()
+        )
+        chart_b64 = base64.b64encode(png).decode("ascii")
+        redis_client.setex(key, app_settings.report_render_chart_expire, chart_b64)
+        return version, chart_b64
+
+    @staticmethod
+    def render(file_name: str, fmt: str = "html") -> Tuple[bytes, str, str]:
+        """
+        渲染报告为 HTML 或 PDF，渲染结果按（报告内容、图表数据、模板）版本缓存在MinIO
+
+        Args:
+            file_name: 报告文件名（Markdown）
+            fmt: 输出格式 html/pdf
+
+        Returns:
+            (渲染后的内容, Content-Type, 输出文件名)
+
+        Raises:
+            ServiceException: 如果格式不支持
+        """
+        if fmt not in RENDER_FORMATS:
+            raise ServiceException(f"不支持的渲染格式: {fmt}")
+
+        markdown_bytes = minio_storage.get_bytes(file_name)
+        table_name = ReportRenderService.table_from_file_name(file_name)
+        chart_version, chart_b64 = (
+            ReportRenderService.get_chart(table_name) if table_name else (None, None)
+        )
+
+        stem = file_name.rsplit(".", 1)[0]
+        content_hash = hashlib.sha1(markdown_bytes).hexdigest()
+        version_key = f"{content_hash}:{chart_version or ''}:{TEMPLATE_VERSION}:{fmt}"
+        version = hashlib.sha1(version_key.encode("utf-8")).hexdigest()[:16]
+        cache_object = f"rendered/{stem}_{version}.{fmt}"
+        output_name = f"{stem}.{fmt}"
+
+        try:
+            return minio_storage.get_bytes(cache_object), RENDER_FORMATS[fmt], output_name
+        except S3Error:
+            logger.debug(f"渲染缓存未命中: {cache_object}")
+
+        content = (
+            _get_render_pool()
+            .submit(_render_document, markdown_bytes.decode("utf-8"), stem, chart_b64, fmt)
+            .result()
+        )
+        try:
+            minio_storage.upload_bytes(content, cache_object, content_type=RENDER_FORMATS[fmt])
+        except Exception as e:
+            logger.warning(f"保存渲染缓存失败: {cache_object}, 错误: {e}")
+        logger.info(f"报告已渲染: {file_name} -> {fmt} ({len(content)} 字节)")
+        return content, RENDER_FORMATS[fmt], output_name
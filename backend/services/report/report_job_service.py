@@ -0,0 +1,237 @@
+"""
+报告生成任务服务模块
+将报告生成放入有界线程池后台执行，任务状态保存在Redis中供轮询/SSE查询
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from core.cache import redis_client
+from core.config import app_settings
+from utils.utils import get_now
+
+from services.exceptions import ServiceException
+from services.report.report_service import ReportService
+
+logger = logging.getLogger(__name__)
+
+# 任务状态：queued -> prompting -> generating -> uploading -> done / failed
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_DONE = "done"
+JOB_STATUS_FAILED = "failed"
+JOB_TERMINAL_STATUSES = (JOB_STATUS_DONE, JOB_STATUS_FAILED)
+
+# 各阶段对应的大致进度百分比
+JOB_PROGRESS = {
+    JOB_STATUS_QUEUED: 0,
+    "prompting": 10,
+    "generating": 30,
+    "uploading": 90,
+    JOB_STATUS_DONE: 100,
+    JOB_STATUS_FAILED: 100,
+}
+
+# 有界执行器：max_workers 即同时调用 DeepSeek 生成报告的上限，其余任务排队
+_executor = ThreadPoolExecutor(
+    max_workers=app_settings.report_job_max_concurrency, thread_name_prefix="report-job"
+)
+_pending_lock = threading.Lock()
+_pending_count = 0
+
+# token 缓冲：攒够字符数或间隔时间后批量写入Redis，避免每个 token 一次往返
+TOKEN_FLUSH_CHARS = 256
+TOKEN_FLUSH_INTERVAL = 0.2
+
+
+class _TokenBuffer:
+    """将生成的 token 批量追加到任务的 Redis token 列表"""
+
+    def __init__(self, job_id: str):
+        self.key = ReportJobService._tokens_key(job_id)
+        self.parts: List[str] = []
+        self.size = 0
+        self.last_flush = time.monotonic()
+
+    def append(self, token: str) -> None:
+        self.parts.append(token)
+        self.size += len(token)
+        if (
+            self.size >= TOKEN_FLUSH_CHARS
+            or time.monotonic() - self.last_flush >= TOKEN_FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.parts:
+            return
+        pipe = redis_client.pipeline()
+        pipe.rpush(self.key, "".join(self.parts))
+        pipe.expire(self.key, app_settings.report_job_expire_seconds)
+        pipe.execute()
+        self.parts = []
+        self.size = 0
+        self.last_flush = time.monotonic()
+
+
+class ReportJobService:
+    """报告生成任务服务类"""
+
+    # 本进程内提交的任务 Future，用于同步等待（兼容旧的同步接口）
+    _futures: Dict[str, Future] = {}
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"report:job:{job_id}"
+
+    @staticmethod
+    def _tokens_key(job_id: str) -> str:
+        return f"report:job:{job_id}:tokens"
+
+    @staticmethod
+    def get_tokens(job_id: str, start: int = 0) -> List[str]:
+        """
+        获取任务已生成的内容片段
+
+        Args:
+            job_id: 任务ID
+            start: 起始下标（客户端已读取的片段数）
+
+        Returns:
+            从 start 开始的内容片段列表
+        """
+        return redis_client.lrange(ReportJobService._tokens_key(job_id), start, -1)
+
+    @staticmethod
+    def _save(job_id: str, **fields: Any) -> None:
+        """写入任务状态字段并刷新过期时间"""
+        key = ReportJobService._key(job_id)
+        mapping = {k: "" if v is None else str(v) for k, v in fields.items()}
+        if "status" in fields:
+            mapping["progress"] = str(JOB_PROGRESS.get(fields["status"], 0))
+        mapping["updated_at"] = str(get_now())
+        pipe = redis_client.pipeline()
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, app_settings.report_job_expire_seconds)
+        pipe.execute()
+
+    @staticmethod
+    def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务状态
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            任务状态字典，不存在则返回None
+        """
+        job = redis_client.hgetall(ReportJobService._key(job_id))
+        if not job:
+            return None
+        job["progress"] = int(job.get("progress") or 0)
+        job["user_id"] = int(job["user_id"]) if job.get("user_id") else None
+        return job
+
+    @staticmethod
+    def submit(table_name: str, chat_history: List[Dict[str, Any]], user_id: int) -> str:
+        """
+        提交报告生成任务
+
+        Args:
+            table_name: 表名
+            chat_history: 聊天历史
+            user_id: 用户ID
+
+        Returns:
+            任务ID
+
+        Raises:
+            ServiceException: 如果排队任务已达上限
+        """
+        global _pending_count
+        with _pending_lock:
+            if _pending_count >= app_settings.report_job_max_pending:
+                raise ServiceException("报告生成任务繁忙，请稍后再试")
+            _pending_count += 1
+
+        job_id = uuid.uuid4().hex
+        ReportJobService._save(
+            job_id,
+            user_id=user_id,
+            table_name=table_name,
+            status=JOB_STATUS_QUEUED,
+            created_at=get_now(),
+        )
+        try:
+            future = _executor.submit(
+                ReportJobService._run, job_id, table_name, chat_history, user_id
+            )
+        except Exception:
+            with _pending_lock:
+                _pending_count -= 1
+            raise
+        ReportJobService._futures[job_id] = future
+        future.add_done_callback(lambda _: ReportJobService._futures.pop(job_id, None))
+        logger.info(f"报告任务已提交: {job_id} (用户ID: {user_id}, 表: {table_name})")
+        return job_id
+
+    @staticmethod
+    def wait(job_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        等待本进程提交的任务完成并返回结果
+
+        Args:
+            job_id: 任务ID
+            timeout: 超时时间（秒）
+
+        Returns:
+            包含 file_url 和 file_name 的字典
+        """
+        future = ReportJobService._futures.get(job_id)
+        if future is not None:
+            return future.result(timeout=timeout)
+        job = ReportJobService.get_job(job_id) or {}
+        if job.get("status") != JOB_STATUS_DONE:
+            raise ServiceException(job.get("error") or "报告任务不存在或未完成")
+        return {"file_url": job.get("file_url"), "file_name": job.get("file_name")}
+
+    @staticmethod
+    def _run(
+        job_id: str, table_name: str, chat_history: List[Dict[str, Any]], user_id: int
+    ) -> Dict[str, Any]:
+        """在工作线程中执行报告生成"""
+        global _pending_count
+        from services.ai import report
+
+        tokens = _TokenBuffer(job_id)
+
+        def on_progress(stage: str) -> None:
+            tokens.flush()
+            ReportJobService._save(job_id, status=stage)
+
+        try:
+            file_name, file_url = report.generate_report(
+                table_name,
+                chat_history,
+                user_id=user_id,
+                on_progress=on_progress,
+                on_token=tokens.append,
+            )
+            tokens.flush()
+            ReportService.add_report(user_id, "markdown", file_url, file_name)
+            ReportJobService._save(
+                job_id, status=JOB_STATUS_DONE, file_name=file_name, file_url=file_url
+            )
+            logger.info(f"报告任务完成: {job_id} -> {file_name}")
+            return {"file_url": file_url, "file_name": file_name}
+        except Exception as e:
+            logger.error(f"报告任务失败: {job_id}, 错误: {e}", exc_info=True)
+            ReportJobService._save(job_id, status=JOB_STATUS_FAILED, error=str(e))
+            raise
+        finally:
+            with _pending_lock:
+                _pending_count -= 1
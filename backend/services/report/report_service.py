@@ -1,16 +1,57 @@
 """
 报告服务模块
-处理报告的管理
+处理报告的管理：MySQL 为唯一数据源，Redis 中为每个用户维护一个有上限的有序集合索引
+（追加与重建通过 Lua 脚本原子执行，并以代数计数防止重建写回旧快照）
 """
 
+import json
 import logging
-from typing import List, Optional
+import urllib.parse
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
-from core.database import get_db_session
+from core.cache import redis_client
+from core.config import app_settings
+from core.database import get_async_db_session, get_db_session
+from core.storage import minio_storage
 from models.models import Report, User
+from sqlalchemy import Select, and_, or_, select
+
+from services.exceptions import ServiceException
 
 logger = logging.getLogger(__name__)
 
+# 索引的每次变更（新增/删除报告）都会递增该用户的代数；
+# 重建时只有代数与读取数据库前一致才写入，避免用旧快照覆盖并发新增的报告
+# KEYS[1]: 索引 key, KEYS[2]: 代数 key；ARGV: 分值, 成员, 保留条数, 过期秒数
+_INDEX_ADD_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[3]) - 1)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+# KEYS[1]: 索引 key, KEYS[2]: 代数 key；ARGV: 读取数据库前的代数, 过期秒数, 分值1, 成员1, ...
+_INDEX_REBUILD_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+for i = 3, #ARGV, 2 do
+    redis.call('ZADD', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+_index_add_script = redis_client.register_script(_INDEX_ADD_SCRIPT)
+_index_rebuild_script = redis_client.register_script(_INDEX_REBUILD_SCRIPT)
+
 
 class ReportService:
     """报告服务类"""
@@ -37,40 +78,226 @@ class ReportService:
                 file_name=file_name,
             )
             session.add(report)
-            logger.info(f"报告已添加: {file_name} (用户ID: {user_id})")
-            return True
+            session.flush()
+            created_at = report.created_at
+            item = ReportService._row_to_dict(report, minio_storage.get_image_url(""))
+        logger.info(f"报告已添加: {file_name} (用户ID: {user_id})")
+        ReportService._index_add(user_id, created_at, item)
+        return True
+
+    # ==================== 用户报告索引（Redis 有序集合） ====================
+
+    @staticmethod
+    def _index_key(user_id: int) -> str:
+        return f"report:index:{user_id}"
+
+    @staticmethod
+    def _index_gen_key(user_id: int) -> str:
+        return f"report:index:{user_id}:gen"
+
+    @staticmethod
+    def _score(created_at: Optional[datetime]) -> float:
+        """索引排序分值：按数据库中保存的北京时间墙钟时间计算（忽略时区信息）"""
+        if not created_at:
+            return 0
+        return (created_at.replace(tzinfo=None) - datetime(1970, 1, 1)).total_seconds()
+
+    @staticmethod
+    def _index_add(user_id: int, created_at: Optional[datetime], item: Dict[str, Any]) -> None:
+        """
+        将新报告写入用户索引（Lua 脚本原子执行：仅在索引已存在时追加，不存在时由下次读取从MySQL重建）
+        """
+        try:
+            _index_add_script(
+                keys=[ReportService._index_key(user_id), ReportService._index_gen_key(user_id)],
+                args=[
+                    ReportService._score(created_at),
+                    json.dumps(item, ensure_ascii=False),
+                    app_settings.report_index_max_entries,
+                    app_settings.report_index_expire,
+                ],
+            )
+        except Exception as e:
+            logger.warning(f"更新报告索引失败: 用户ID {user_id}, 错误: {e}")
+
+    @staticmethod
+    def _index_invalidate(user_id: int) -> None:
+        """删除用户索引并递增代数，下次读取时从MySQL重建（进行中的重建不会写回旧数据）"""
+        try:
+            gen_key = ReportService._index_gen_key(user_id)
+            pipe = redis_client.pipeline()
+            pipe.delete(ReportService._index_key(user_id))
+            pipe.incr(gen_key)
+            pipe.expire(gen_key, app_settings.report_index_expire)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"清除报告索引失败: 用户ID {user_id}, 错误: {e}")
 
     @staticmethod
-    def list_reports(user_id: int) -> List[Report]:
+    def get_history(user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
         """
-        获取用户的报告列表
+        获取用户最近的报告（优先读取Redis索引，未命中时从MySQL重建）
 
         Args:
             user_id: 用户ID
+            limit: 返回条数（不超过索引上限）
 
         Returns:
-            报告列表
+            报告字典列表，按创建时间倒序
         """
-        with get_db_session(auto_commit=False) as session:
-            reports = (
-                session.query(Report)
-                .filter_by(user_id=user_id)
-                .order_by(Report.created_at.desc())
-                .all()
-            )
-            return reports
+        key = ReportService._index_key(user_id)
+        gen_key = ReportService._index_gen_key(user_id)
+        cap = app_settings.report_index_max_entries
+        limit = min(limit, cap)
+        generation = None
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.zrevrange(key, 0, limit - 1)
+            pipe.get(gen_key)
+            members, generation = pipe.execute()
+            if members:
+                return [json.loads(m) for m in members]
+        except Exception as e:
+            logger.warning(f"读取报告索引失败: 用户ID {user_id}, 错误: {e}")
+
+        # 重建的索引会被缓存，读主库避免把副本延迟期间的旧数据固化到 Redis
+        items, _ = ReportService.list_reports(user_id=user_id, limit=cap, use_replica=False)
+        if items:
+            args = [generation or "0", app_settings.report_index_expire]
+            for item in items:
+                created_at = item["created_at"]
+                args.append(
+                    ReportService._score(datetime.fromisoformat(created_at) if created_at else None)
+                )
+                args.append(json.dumps(item, ensure_ascii=False))
+            try:
+                # 读取数据库期间索引有变更（代数不同）时放弃写入，由下次读取重建
+                _index_rebuild_script(keys=[key, gen_key], args=args)
+            except Exception as e:
+                logger.warning(f"重建报告索引失败: 用户ID {user_id}, 错误: {e}")
+        return items[:limit]
+
+    @staticmethod
+    def _row_to_dict(row: Any, url_prefix: str, include_user: bool = False) -> Dict[str, Any]:
+        """将报告行（ORM对象或列查询结果）转换为字典"""
+        item = {
+            "id": row.id,
+            "type": row.report_type,
+            "file_name": row.file_name,
+            "url": url_prefix + urllib.parse.quote(row.file_name),
+            "created_at": str(row.created_at.replace(tzinfo=None)) if row.created_at else None,
+        }
+        if include_user:
+            item["user_id"] = row.user_id
+            item["user_email"] = row.email or "未知"
+            item["username"] = row.username
+        return item
+
+    @staticmethod
+    def _encode_cursor(created_at: Optional[datetime], report_id: int) -> str:
+        """将 (created_at, id) 编码为分页游标"""
+        return f"{created_at.isoformat() if created_at else ''}|{report_id}"
 
     @staticmethod
-    def list_all_reports() -> List[Report]:
+    def _decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
         """
-        获取所有用户的报告列表（管理员使用）
+        解析分页游标
+
+        Raises:
+            ServiceException: 如果游标格式无效
+        """
+        try:
+            created_text, id_text = cursor.rsplit("|", 1)
+            created_at = datetime.fromisoformat(created_text) if created_text else None
+            return created_at, int(id_text)
+        except ValueError as e:
+            raise ServiceException("无效的分页游标") from e
+
+    @staticmethod
+    def list_reports(
+        user_id: Optional[int] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include_user: bool = False,
+        use_replica: bool = True,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按创建时间倒序分页获取报告列表（keyset 分页，只查询需要的列）
+
+        Args:
+            user_id: 用户ID，None 表示所有用户（管理员使用）
+            limit: 每页条数
+            cursor: 上一页返回的游标，None 表示第一页
+            include_user: 是否关联查询报告所有者信息
+            use_replica: 是否允许从只读副本读取（结果需要写入缓存时应读主库）
 
         Returns:
-            所有报告列表
+            (报告字典列表, 下一页游标)，没有更多数据时游标为 None
         """
-        with get_db_session(auto_commit=False) as session:
-            reports = session.query(Report).order_by(Report.created_at.desc()).all()
-            return reports
+        stmt = ReportService._list_reports_stmt(user_id, limit, cursor, include_user)
+        with get_db_session(auto_commit=False, readonly=use_replica) as session:
+            rows = session.execute(stmt).all()
+        return ReportService._build_page(rows, limit, include_user)
+
+    @staticmethod
+    async def alist_reports(
+        user_id: Optional[int] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include_user: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """list_reports 的异步版本（从只读副本读取），参数与返回值相同"""
+        stmt = ReportService._list_reports_stmt(user_id, limit, cursor, include_user)
+        async with get_async_db_session(readonly=True) as session:
+            rows = (await session.execute(stmt)).all()
+        return ReportService._build_page(rows, limit, include_user)
+
+    @staticmethod
+    def _list_reports_stmt(
+        user_id: Optional[int], limit: int, cursor: Optional[str], include_user: bool
+    ) -> Select:
+        """构造报告分页查询语句（同步/异步共用），多取一条用于判断是否还有下一页"""
+        columns = [
+            Report.id,
+            Report.user_id,
+            Report.report_type,
+            Report.file_name,
+            Report.created_at,
+        ]
+        if include_user:
+            columns += [User.email, User.username]
+
+        stmt = select(*columns).select_from(Report)
+        if include_user:
+            stmt = stmt.outerjoin(User, User.id == Report.user_id)
+        if user_id is not None:
+            stmt = stmt.where(Report.user_id == user_id)
+        if cursor:
+            created_at, last_id = ReportService._decode_cursor(cursor)
+            if created_at is None:
+                stmt = stmt.where(Report.created_at.is_(None), Report.id < last_id)
+            else:
+                stmt = stmt.where(
+                    or_(
+                        Report.created_at < created_at,
+                        and_(Report.created_at == created_at, Report.id < last_id),
+                    )
+                )
+        return stmt.order_by(Report.created_at.desc(), Report.id.desc()).limit(limit + 1)
+
+    @staticmethod
+    def _build_page(
+        rows: List[Any], limit: int, include_user: bool
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """将查询结果转换为 (报告字典列表, 下一页游标)"""
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        url_prefix = minio_storage.get_image_url("")
+        items = [ReportService._row_to_dict(r, url_prefix, include_user) for r in rows]
+        next_cursor = (
+            ReportService._encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+        )
+        return items, next_cursor
 
     @staticmethod
     def get_report_by_filename(file_name: str) -> Optional[Report]:
@@ -113,50 +340,6 @@ class ReportService:
 
         with get_db_session() as session:
             session.delete(report)
-            logger.info(f"报告已删除: {file_name} (用户ID: {user_id}, 管理员: {is_admin})")
-            return True
-
-    @staticmethod
-    def get_user_info_map(user_ids: set[int]) -> dict[int, dict]:
-        """
-        获取用户信息映射（用于管理员查看报告所有者）
-
-        Args:
-            user_ids: 用户ID集合
-
-        Returns:
-            用户信息字典，key为用户ID，value为用户信息字典
-        """
-        if not user_ids:
-            return {}
-
-        with get_db_session() as session:
-            users = session.query(User).filter(User.id.in_(user_ids)).all()
-            return {u.id: {"id": u.id, "email": u.email, "username": u.username} for u in users}
-
-    @staticmethod
-    def report_to_dict(report: Report, include_user: bool = False, user_map: dict = None) -> dict:
-        """
-        将Report对象转换为字典
-
-        Args:
-            report: Report对象
-            include_user: 是否包含用户信息（管理员模式）
-            user_map: 用户信息映射字典
-
-        Returns:
-            报告信息字典
-        """
-        result = {
-            "id": report.id,
-            "type": report.report_type,
-            "file_url": report.file_url,
-            "file_name": report.file_name,
-            "created_at": str(report.created_at) if report.created_at else None,
-        }
-        if include_user and user_map:
-            owner = user_map.get(report.user_id, {})
-            result["user_id"] = report.user_id
-            result["user_email"] = owner.get("email", "未知")
-            result["username"] = owner.get("username")
-        return result
+        ReportService._index_invalidate(report.user_id)
+        logger.info(f"报告已删除: {file_name} (用户ID: {user_id}, 管理员: {is_admin})")
+        return True
@@ -23,27 +23,52 @@ export function useReports(options: UseReportsOptions = {}) {
   const { autoLoad = true } = options;
   const [reports, setReports] = useState<ReportFile[]>([]);
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
+  // 下一页游标（响应头 X-Next-Cursor），为空表示已加载到最后一页
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
-  // 获取报告列表
+  // 请求一页报告（keyset 分页），返回本页数据和下一页游标
+  const fetchPage = useCallback(async (cursor?: string) => {
+    const response = await axios.get<ApiResponse<ReportFile[]>>('/api/v1/report/minio_list', {
+      params: cursor ? { cursor } : undefined,
+    });
+    const items = response.data?.success && Array.isArray(response.data.data) ? response.data.data : [];
+    return { items, cursor: (response.headers['x-next-cursor'] as string | undefined) || null };
+  }, []);
+
+  // 获取报告列表（重新加载第一页）
   const fetchReports = useCallback(async () => {
     setLoading(true);
     try {
-      const response = await axios.get<ApiResponse<ReportFile[]>>('/api/v1/report/minio_list');
-      if (response.data?.success && Array.isArray(response.data.data)) {
-        // 按创建时间倒序排序
-        const sorted = sortByCreatedAt(response.data.data, 'desc');
-        setReports(sorted);
-      } else {
-        setReports([]);
-      }
+      const page = await fetchPage();
+      // 按创建时间倒序排序
+      setReports(sortByCreatedAt(page.items, 'desc'));
+      setNextCursor(page.cursor);
     } catch (error: any) {
       const errorMsg = getErrorMessage(error, '获取报告列表失败');
       message.error(errorMsg);
       setReports([]);
+      setNextCursor(null);
     } finally {
       setLoading(false);
     }
-  }, [message]);
+  }, [message, fetchPage]);
+
+  // 加载下一页并追加到列表
+  const loadMore = useCallback(async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      setReports(prev => sortByCreatedAt([...prev, ...page.items], 'desc'));
+      setNextCursor(page.cursor);
+    } catch (error: any) {
+      const errorMsg = getErrorMessage(error, '加载更多报告失败');
+      message.error(errorMsg);
+    } finally {
+      setLoadingMore(false);
+    }
+  }, [message, fetchPage, nextCursor]);
 
   // 删除报告
   const deleteReport = useCallback(
@@ -54,8 +79,8 @@ export function useReports(options: UseReportsOptions = {}) {
         });
         if (res.data?.success) {
           message.success(res.data.message || `已删除 ${fileName}`);
-          // 刷新列表
-          await fetchReports();
+          // 从已加载的列表中移除，保留已加载的分页
+          setReports(prev => prev.filter(item => item.file_name !== fileName));
           return true;
         } else {
           // 如果响应格式正确但success为false，直接抛出错误让catch处理
@@ -67,7 +92,7 @@ export function useReports(options: UseReportsOptions = {}) {
         return false;
       }
     },
-    [message, fetchReports]
+    [message]
   );
 
   // 下载报告
@@ -118,7 +143,10 @@ export function useReports(options: UseReportsOptions = {}) {
   return {
     reports,
     loading,
+    loadingMore,
+    hasMore: nextCursor !== null,
     fetchReports,
+    loadMore,
     deleteReport,
     downloadReport,
   };
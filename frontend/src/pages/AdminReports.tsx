@@ -9,7 +9,7 @@ import type { ColumnsType } from 'antd/es/table';
 const { Title, Text } = Typography;
 
 const AdminReports: React.FC = () => {
-  const { reports, loading, fetchReports, deleteReport, downloadReport } = useReports({ autoLoad: true });
+  const { reports, loading, loadingMore, hasMore, fetchReports, loadMore, deleteReport, downloadReport } = useReports({ autoLoad: true });
 
   const handleDelete = async (fileName: string) => {
     await deleteReport(fileName);
@@ -98,7 +98,7 @@ const AdminReports: React.FC = () => {
               刷新列表
             </Button>
             <Text type="secondary">
-              共 {reports.length} 个报告文件
+              已加载 {reports.length} 个报告文件{hasMore ? '，还有更多' : ''}
             </Text>
           </Space>
 
@@ -110,9 +110,17 @@ const AdminReports: React.FC = () => {
             pagination={{
               pageSize: 20,
               showSizeChanger: true,
-              showTotal: (total) => `共 ${total} 个报告`,
+              showTotal: (total) => `已加载 ${total} 个报告`,
             }}
           />
+
+          {hasMore && (
+            <div style={{ textAlign: 'center' }}>
+              <Button onClick={loadMore} loading={loadingMore} disabled={loading}>
+                加载更多
+              </Button>
+            </div>
+          )}
         </Space>
       </Card>
     </div>
@@ -16,6 +16,7 @@ interface ChatProps {
 import { cascaderOptions } from '../utils/constants';
 
 const CHAT_HISTORY_KEY_PREFIX = 'financial_chat_history_';
+const CONVERSATION_ID = 'default';
 const LAST_USER_ID_KEY = 'last_chat_user_id';
 
 // 获取当前用户的对话历史记录key
@@ -113,24 +114,6 @@ const Chat: React.FC<ChatProps> = () => {
     };
   }, []);
 
-  // 清理历史对话，只保留有效的对话
-  const cleanChatHistory = (history: any[]) => {
-    if (!history || history.length === 0) return [];
-
-    // 过滤掉无效对话
-    const validHistory = history.filter(item => {
-      const question = item.question?.trim() || '';
-      return question.length > 3 &&
-        !question.toLowerCase().includes('你好') &&
-        !question.toLowerCase().includes('hello') &&
-        !question.toLowerCase().includes('hi') &&
-        !question.toLowerCase().includes('test');
-    });
-
-    // 只保留最近的10条对话
-    return validHistory.slice(-10);
-  };
-
   // 用于控制中断请求
   const abortControllerRef = useRef<AbortController | null>(null);
 
@@ -193,9 +176,6 @@ const Chat: React.FC<ChatProps> = () => {
     }, 100);
 
     try {
-      // 传递清理后的历史对话（不包含刚添加的临时消息）
-      const cleanedHistory = cleanChatHistory(chatHistory);
-
       // 使用流式请求
       const token = getToken();
       const response = await fetch('/api/v1/ai/advice', {
@@ -207,7 +187,8 @@ const Chat: React.FC<ChatProps> = () => {
         body: JSON.stringify({
           message: question,
           table_name: tableName,
-          history: cleanedHistory,
+          // 历史对话由服务端按会话保存，只需发送新问题
+          conversation_id: CONVERSATION_ID,
           stream: true,
         }),
         signal: abortControllerRef.current?.signal,
@@ -389,6 +370,7 @@ const Chat: React.FC<ChatProps> = () => {
       const historyKey = getChatHistoryKey(currentUserId);
       localStorage.removeItem(historyKey);
     }
+    axios.delete('/api/v1/ai/history', { params: { conversation_id: CONVERSATION_ID } }).catch(() => {});
   };
 
   // Generate Report Handler (simplified)
@@ -4,7 +4,7 @@ import { useReports } from '../hooks/useReports';
 import { formatDateTime } from '../utils/dateUtils';
 
 const Reports: React.FC = () => {
-  const { reports, loading, deleteReport, downloadReport } = useReports({ autoLoad: true });
+  const { reports, loading, loadingMore, hasMore, loadMore, deleteReport, downloadReport } = useReports({ autoLoad: true });
 
   const handleDelete = async (fileName: string) => {
     await deleteReport(fileName);
@@ -17,6 +17,13 @@ const Reports: React.FC = () => {
         bordered
         dataSource={reports}
         loading={loading}
+        loadMore={
+          hasMore && !loading ? (
+            <div style={{ textAlign: 'center', margin: '12px 0' }}>
+              <Button onClick={loadMore} loading={loadingMore}>加载更多</Button>
+            </div>
+          ) : null
+        }
         renderItem={item => (
           <List.Item
             actions={[
@@ -15,12 +15,19 @@ export default defineConfig(({ mode }) => {
         '/api': {
           // 使用环境变量或默认localhost:8000
           // 如果前端在Docker中运行，可以在 .env 中设置 VITE_API_TARGET=http://backend:8000
-          // 如果前端在本地运行，使用 http://localhost:8000（后端端口已映射到主机）
+          // 如果前端在本地运行，使用 http://localhost:8000（本地启动的后端）
           // 注意：Vite 环境变量必须以 VITE_ 开头才能在客户端代码中使用
           // 但在 vite.config.js 中可以使用任何环境变量
           target: env.VITE_API_TARGET || process.env.VITE_API_TARGET || 'http://localhost:8000',
           changeOrigin: true,
           secure: false,
+          // 追加 X-Forwarded-For，后端限流按真实客户端IP计数（后端需开启 RATE_LIMIT_TRUST_PROXY）
+          xfwd: true,
+        },
+        // Docker Compose 下后端端口不映射到主机，API 文档同样经代理访问
+        '^/(docs|redoc|openapi\\.json)': {
+          target: env.VITE_API_TARGET || process.env.VITE_API_TARGET || 'http://localhost:8000',
+          changeOrigin: true,
         },
       }
     },